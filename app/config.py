@@ -48,6 +48,186 @@ class Settings(BaseModel):
         default_factory=lambda: int(os.getenv('APP_PORT', '5050'))
     )
     
+    # 音訊轉送設定
+    inbound_audio_coalesce_ms: int = Field(
+        default_factory=lambda: int(os.getenv('INBOUND_AUDIO_COALESCE_MS', '40'))
+    )
+    inbound_audio_max_delay_ms: int = Field(
+        default_factory=lambda: int(os.getenv('INBOUND_AUDIO_MAX_DELAY_MS', '80'))
+    )
+    relay_queue_max_audio_to_openai: int = Field(
+        default_factory=lambda: int(os.getenv('RELAY_QUEUE_MAX_AUDIO_TO_OPENAI', '100'))
+    )
+    relay_queue_max_audio_to_twilio: int = Field(
+        default_factory=lambda: int(os.getenv('RELAY_QUEUE_MAX_AUDIO_TO_TWILIO', '500'))
+    )
+    
+    # OpenAI Realtime 預熱連線設定
+    realtime_prewarm_enabled: bool = Field(
+        default_factory=lambda: os.getenv('REALTIME_PREWARM_ENABLED', 'true').lower() == 'true'
+    )
+    realtime_prewarm_ttl_sec: float = Field(
+        default_factory=lambda: float(os.getenv('REALTIME_PREWARM_TTL_SEC', '60'))
+    )
+    
+    # Supabase 查詢逾時與同時進行的查詢上限
+    supabase_timeout_sec: float = Field(
+        default_factory=lambda: float(os.getenv('SUPABASE_TIMEOUT_SEC', '5'))
+    )
+    supabase_max_concurrency: int = Field(
+        default_factory=lambda: int(os.getenv('SUPABASE_MAX_CONCURRENCY', '10'))
+    )
+    
+    # Twilio REST API 請求逾時與同時進行的請求上限
+    twilio_timeout_sec: float = Field(
+        default_factory=lambda: float(os.getenv('TWILIO_TIMEOUT_SEC', '10'))
+    )
+    twilio_max_concurrency: int = Field(
+        default_factory=lambda: int(os.getenv('TWILIO_MAX_CONCURRENCY', '20'))
+    )
+    
+    # 外撥名單撥號器：每秒建立的通話數 (Twilio CPS)、允許的突發量與同時通話上限
+    campaign_cps: float = Field(
+        default_factory=lambda: float(os.getenv('CAMPAIGN_CPS', '1'))
+    )
+    campaign_burst: float = Field(
+        default_factory=lambda: float(os.getenv('CAMPAIGN_BURST', '1'))
+    )
+    campaign_max_live_calls: int = Field(
+        default_factory=lambda: int(os.getenv('CAMPAIGN_MAX_LIVE_CALLS', '50'))
+    )
+    campaign_live_call_timeout_sec: float = Field(
+        default_factory=lambda: float(os.getenv('CAMPAIGN_LIVE_CALL_TIMEOUT_SEC', '1800'))
+    )
+    # Twilio 回 429 時的重試次數與第一次退避秒數（之後每次加倍）
+    campaign_max_retries: int = Field(
+        default_factory=lambda: int(os.getenv('CAMPAIGN_MAX_RETRIES', '3'))
+    )
+    campaign_retry_backoff_sec: float = Field(
+        default_factory=lambda: float(os.getenv('CAMPAIGN_RETRY_BACKOFF_SEC', '1'))
+    )
+    # 已結束名單的保留時間與保留筆數上限
+    campaign_retention_sec: float = Field(
+        default_factory=lambda: float(os.getenv('CAMPAIGN_RETENTION_SEC', '3600'))
+    )
+    campaign_max_finished: int = Field(
+        default_factory=lambda: int(os.getenv('CAMPAIGN_MAX_FINISHED', '100'))
+    )
+    
+    # 共用 HTTP client（webhook、OpenAI Chat Completions）的連線池設定
+    http_client_http2: bool = Field(
+        default_factory=lambda: os.getenv('HTTP_CLIENT_HTTP2', 'true').lower() == 'true'
+    )
+    http_client_max_connections: int = Field(
+        default_factory=lambda: int(os.getenv('HTTP_CLIENT_MAX_CONNECTIONS', '100'))
+    )
+    http_client_max_keepalive_connections: int = Field(
+        default_factory=lambda: int(os.getenv('HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS', '20'))
+    )
+    http_client_keepalive_expiry_sec: float = Field(
+        default_factory=lambda: float(os.getenv('HTTP_CLIENT_KEEPALIVE_EXPIRY_SEC', '30'))
+    )
+    http_client_timeout_sec: float = Field(
+        default_factory=lambda: float(os.getenv('HTTP_CLIENT_TIMEOUT_SEC', '30'))
+    )
+    
+    # Webhook outbox：SQLite 檔案位置、送出 worker 數、最多嘗試次數與指數退避
+    webhook_outbox_path: str = Field(
+        default_factory=lambda: os.getenv('WEBHOOK_OUTBOX_PATH', 'data/webhook_outbox.db')
+    )
+    webhook_outbox_workers: int = Field(
+        default_factory=lambda: int(os.getenv('WEBHOOK_OUTBOX_WORKERS', '4'))
+    )
+    webhook_outbox_max_attempts: int = Field(
+        default_factory=lambda: int(os.getenv('WEBHOOK_OUTBOX_MAX_ATTEMPTS', '10'))
+    )
+    webhook_outbox_backoff_base_sec: float = Field(
+        default_factory=lambda: float(os.getenv('WEBHOOK_OUTBOX_BACKOFF_BASE_SEC', '1'))
+    )
+    webhook_outbox_backoff_max_sec: float = Field(
+        default_factory=lambda: float(os.getenv('WEBHOOK_OUTBOX_BACKOFF_MAX_SEC', '300'))
+    )
+    
+    # Cloud Run ID token 在過期前多少秒於背景重新取得
+    id_token_refresh_margin_sec: float = Field(
+        default_factory=lambda: float(os.getenv('ID_TOKEN_REFRESH_MARGIN_SEC', '300'))
+    )
+    # 需要認證的路由（POST /drain 等）驗證呼叫端 ID token 的 audience（通常為本服務的 URL），
+    # 未設定時 ENV=local 以外一律拒絕
+    auth_audience: str = Field(
+        default_factory=lambda: os.getenv('AUTH_AUDIENCE', '')
+    )
+    
+    # 通話後資訊擷取佇列：worker 數、每分鐘 token 上限、每次回應預留的 token 數，
+    # 以及專案優先序（"project_id:priority,..."，數字越大越先處理，未列出的為 0）
+    extraction_workers: int = Field(
+        default_factory=lambda: int(os.getenv('EXTRACTION_WORKERS', '4'))
+    )
+    extraction_tokens_per_minute: float = Field(
+        default_factory=lambda: float(os.getenv('EXTRACTION_TOKENS_PER_MINUTE', '30000'))
+    )
+    extraction_max_completion_tokens: int = Field(
+        default_factory=lambda: int(os.getenv('EXTRACTION_MAX_COMPLETION_TOKENS', '1000'))
+    )
+    extraction_project_priorities: str = Field(
+        default_factory=lambda: os.getenv('EXTRACTION_PROJECT_PRIORITIES', '')
+    )
+    
+    # 通話中增量擷取：每次回應完成後 debounce 秒內沒有新回應才擷取，掛斷時只處理剩下的對話
+    incremental_extraction_enabled: bool = Field(
+        default_factory=lambda: os.getenv('INCREMENTAL_EXTRACTION_ENABLED', 'false').lower() == 'true'
+    )
+    incremental_extraction_debounce_sec: float = Field(
+        default_factory=lambda: float(os.getenv('INCREMENTAL_EXTRACTION_DEBOUNCE_SEC', '3'))
+    )
+    
+    # 節點親和：session_id 帶入 NODE_ID，NODE_HOSTNAME_TEMPLATE（"{node}" 代入 NODE_ID）為各節點直接連入的 hostname，
+    # 讓同一通電話的 TwiML、media stream 與 status callback 都回到建立通話的節點；NODE_ID 為空時停用
+    node_id: str = Field(
+        default_factory=lambda: os.getenv('NODE_ID', '')
+    )
+    node_hostname_template: str = Field(
+        default_factory=lambda: os.getenv('NODE_HOSTNAME_TEMPLATE', '')
+    )
+    
+    # SessionStore 後端：memory 只適用單一 worker；多 worker / 多節點使用 redis，
+    # key 以 SET ... EX 寫入，TTL 需大於最長的通話時間
+    session_store_backend: str = Field(
+        default_factory=lambda: os.getenv('SESSION_STORE_BACKEND', 'memory').lower()
+    )
+    redis_url: str = Field(
+        default_factory=lambda: os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+    )
+    session_store_ttl_sec: int = Field(
+        default_factory=lambda: int(os.getenv('SESSION_STORE_TTL_SEC', '7200'))
+    )
+    session_store_key_prefix: str = Field(
+        default_factory=lambda: os.getenv('SESSION_STORE_KEY_PREFIX', 'ai-call:')
+    )
+    # memory 後端的 key 數量上限（超過時先移除最快到期的），以及通話結束後記錄保留給擷取的秒數
+    session_store_max_entries: int = Field(
+        default_factory=lambda: int(os.getenv('SESSION_STORE_MAX_ENTRIES', '100000'))
+    )
+    session_store_completed_grace_sec: float = Field(
+        default_factory=lambda: float(os.getenv('SESSION_STORE_COMPLETED_GRACE_SEC', '600'))
+    )
+    
+    # Drain mode：進行中的通話最多等待的秒數，之後通話後擷取與 webhook outbox 最多等待的秒數
+    drain_call_deadline_sec: float = Field(
+        default_factory=lambda: float(os.getenv('DRAIN_CALL_DEADLINE_SEC', '600'))
+    )
+    drain_flush_timeout_sec: float = Field(
+        default_factory=lambda: float(os.getenv('DRAIN_FLUSH_TIMEOUT_SEC', '60'))
+    )
+    
+    # 專案設定快取：TTL 內直接使用快取，過期後 stale 期間內先回傳舊值並在背景更新
+    project_settings_cache_ttl_sec: float = Field(
+        default_factory=lambda: float(os.getenv('PROJECT_SETTINGS_CACHE_TTL_SEC', '60'))
+    )
+    project_settings_stale_ttl_sec: float = Field(
+        default_factory=lambda: float(os.getenv('PROJECT_SETTINGS_STALE_TTL_SEC', '300'))
+    )
+    
     class Config:
         validate_assignment = True
         
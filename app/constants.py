@@ -46,6 +46,9 @@ TWILIO_CALLBACK_EVENT_STATUS = [
     "failed",      # The call could not be completed as dialed
     "canceled"     # The call was canceled before it was answered
 ]
+
+# 通話結束的狀態：之後不會再有 status callback
+TERMINAL_CALL_STATUSES = {"completed", "no-answer", "canceled", "busy", "failed"}
 TWILIO_STATUS_ANSWEREDBY = [
     "human",        # Call answered by a human
     "machine",      # Call answered by an answering machine
@@ -59,13 +62,17 @@ DEFAULT_TIMEZONE = 'Asia/Taipei'
 
 # OpenAI
 OPENAI_MODEL_REALTIME = "gpt-4o-realtime-preview-2024-10-01"
-OPENAI_API_URL_REALTIME = "wss://api.openai.com/v1/realtime"
+# API 端點可由環境變數覆寫（經由 proxy 或接到本機壓測用的假 OpenAI）
+OPENAI_API_URL_REALTIME = os.getenv("OPENAI_API_URL_REALTIME", "wss://api.openai.com/v1/realtime")
 OPENAI_MODEL = "gpt-4o-2024-11-20"
-OPENAI_API_URL = "https://api.openai.com/v1/chat/completions"
+OPENAI_API_URL = os.getenv("OPENAI_API_URL", "https://api.openai.com/v1/chat/completions")
 
 # Get current date message
 WHAT_DATE_IS_TODAY_PROMPTS = f"[今日日期]\n{get_today_formatted_string()}"
 
+# 通話中增量擷取：附上先前的擷取結果，只送新的對話內容
+INCREMENTAL_EXTRACTION_PROMPTS = "[先前對話的擷取結果]\n{previous_result}\n\n以下為之後新增的對話內容，請依新內容更新上述結果，並回傳完整的擷取結果。"
+
 
 # Just for the Example: chat completions settings
 CHAT_COMPLETIONS_SETTINGS_EXAMPLE = {
@@ -1,49 +1,163 @@
+import asyncio
+import base64
+import json
+import time
+from typing import Callable, Dict, Optional
 from fastapi import Request, HTTPException
 from google.auth.transport import requests
 from google.oauth2 import id_token
-import google.auth
-from functools import lru_cache
-from datetime import datetime, timedelta
 from ..utils.log_utils import setup_logger
 from ..config import settings
 
 logger = setup_logger("[Auth]")
 
-# 緩存 token 和過期時間
-class TokenCache:
-    def __init__(self):
-        self.token = None
-        self.expiry = None
+# 讀不到 exp claim 時假設的有效期
+DEFAULT_TOKEN_LIFETIME_SEC = 3600
+# 距離過期不到這個秒數的 token 不再使用，直接等待重新取得
+EXPIRY_SKEW_SEC = 30
+# 背景更新失敗時重試的間隔
+REFRESH_RETRY_SEC = 30
 
-token_cache = TokenCache()
+def token_expiry(token: str) -> Optional[float]:
+    """讀取 JWT payload 中的 exp claim（不驗證簽章）"""
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))['exp'])
+    except Exception:
+        return None
+
+class _TokenEntry:
+    __slots__ = ("token", "expires_at", "refresh_timer")
+
+    def __init__(self, token: str, expires_at: float):
+        self.token = token
+        self.expires_at = expires_at
+        self.refresh_timer: Optional[asyncio.TimerHandle] = None
+
+class IdTokenManager:
+    """
+    以 audience 為 key 的 Google Cloud Run ID token 快取
+
+    依 token 的 exp claim 判斷有效期，在過期前 refresh_margin 秒於背景執行緒重新取得，
+    呼叫端一般不會等待 token 取得。同一個 audience 同時只會有一個取得中的請求（single-flight）。
+    """
+
+    def __init__(self, refresh_margin: float, fetch: Optional[Callable[[str], str]] = None):
+        self.refresh_margin = refresh_margin
+        self._fetch = fetch or self._fetch_id_token
+        self._auth_request = None
+        self._entries: Dict[str, _TokenEntry] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+        # 統計
+        self.hits = 0
+        self.waits = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    def _fetch_id_token(self, audience: str) -> str:
+        """在執行緒中執行的阻塞式取得（metadata server 或 service account）"""
+        if self._auth_request is None:
+            # 共用同一個 requests session，重複取得時沿用連線
+            self._auth_request = requests.Request()
+        return id_token.fetch_id_token(self._auth_request, audience)
+
+    async def get(self, audience: str) -> str:
+        """取得 audience 的 ID token，只有沒有可用的 token 時才會等待"""
+        entry = self._entries.get(audience)
+        if entry is not None and time.time() < entry.expires_at - EXPIRY_SKEW_SEC:
+            self.hits += 1
+            return entry.token
+        self.waits += 1
+        entry = await asyncio.shield(self._refresh(audience))
+        return entry.token
+
+    def prewarm(self, audiences) -> None:
+        """在背景先取得 token，第一次呼叫也不需要等待"""
+        for audience in audiences:
+            if audience not in self._entries:
+                self._background_refresh(audience)
+
+    def _refresh(self, audience: str) -> asyncio.Task:
+        task = self._inflight.get(audience)
+        if task is None:
+            task = self._inflight[audience] = asyncio.ensure_future(self._do_refresh(audience))
+            task.add_done_callback(lambda _: self._inflight.pop(audience, None))
+        return task
+
+    async def _do_refresh(self, audience: str) -> _TokenEntry:
+        started_at = time.monotonic()
+        try:
+            token = await asyncio.to_thread(self._fetch, audience)
+        except Exception as e:
+            self.refresh_errors += 1
+            logger.error(f"Error getting ID token for {audience}: {str(e)}")
+            previous = self._entries.get(audience)
+            if previous is not None and time.time() < previous.expires_at - EXPIRY_SKEW_SEC:
+                # 舊的 token 還能用，稍後再試
+                self._schedule_refresh(audience, previous, REFRESH_RETRY_SEC)
+            raise
+
+        self.refreshes += 1
+        expires_at = token_expiry(token) or time.time() + DEFAULT_TOKEN_LIFETIME_SEC
+        entry = _TokenEntry(token, expires_at)
+        previous = self._entries.get(audience)
+        if previous is not None and previous.refresh_timer is not None:
+            previous.refresh_timer.cancel()
+        self._entries[audience] = entry
+        self._schedule_refresh(audience, entry, max(0.0, expires_at - self.refresh_margin - time.time()))
+        logger.info(
+            f"ID token for {audience} refreshed in {(time.monotonic() - started_at) * 1000:.0f} ms, "
+            f"expires in {expires_at - time.time():.0f} s"
+        )
+        return entry
+
+    def _schedule_refresh(self, audience: str, entry: _TokenEntry, delay: float) -> None:
+        if entry.refresh_timer is not None:
+            entry.refresh_timer.cancel()
+        entry.refresh_timer = asyncio.get_running_loop().call_later(delay, self._background_refresh, audience)
+
+    def _background_refresh(self, audience: str) -> None:
+        task = self._refresh(audience)
+        # 背景更新的例外已記錄在 _do_refresh，這裡只取出避免警告
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    def stats(self) -> dict:
+        now = time.time()
+        return {
+            "audiences": {audience: round(entry.expires_at - now) for audience, entry in self._entries.items()},
+            "hits": self.hits,
+            "waits": self.waits,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+        }
+
+    def close(self) -> None:
+        """取消所有排定的背景更新"""
+        for entry in self._entries.values():
+            if entry.refresh_timer is not None:
+                entry.refresh_timer.cancel()
+        for task in self._inflight.values():
+            task.cancel()
+
+id_token_manager = IdTokenManager(refresh_margin=settings.id_token_refresh_margin_sec)
 
-@lru_cache()
 async def get_id_token(target_audience: str) -> str:
     """獲取 Google Cloud Run 認證的 ID token"""
-    global token_cache
-    
-    # 檢查緩存的 token 是否有效
-    if token_cache.token and token_cache.expiry and datetime.now() < token_cache.expiry:
-        return token_cache.token
-    
-    try:
-        auth_req = requests.Request()
-        credentials, project = google.auth.default()
-        credentials.refresh(auth_req)
-        
-        token = id_token.fetch_id_token(auth_req, target_audience)
-        
-        # 更新緩存
-        token_cache.token = token
-        token_cache.expiry = datetime.now() + timedelta(hours=1)
-        
-        return token
-    except Exception as e:
-        logger.error(f"Error getting ID token: {str(e)}")
-        raise
+    return await id_token_manager.get(target_audience)
+
+_verify_request = None
+
+def _verify_id_token(token: str, audience: str) -> dict:
+    """在執行緒中驗證 Google 簽發的 ID token（簽章、過期時間、issuer 與 audience），回傳 claims"""
+    global _verify_request
+    if _verify_request is None:
+        _verify_request = requests.Request()
+    return id_token.verify_oauth2_token(token, _verify_request, audience)
 
 async def verify_cloud_run_auth(request: Request):
-    """驗證 Cloud Run 的認證中間件"""
+    """驗證 Cloud Run 的認證中間件：Authorization: Bearer 帶入 audience 為 AUTH_AUDIENCE 的 ID token"""
     if settings.environment == "local":
         return True
         
@@ -63,8 +177,16 @@ async def verify_cloud_run_auth(request: Request):
             
         token = auth_header.split("Bearer ")[-1]
         
-        # 在這裡可以添加額外的 token 驗證邏輯
-        # 例如驗證 token 的簽名、過期時間等
+        if not settings.auth_audience:
+            logger.error("AUTH_AUDIENCE is not set, rejecting authenticated route")
+            raise HTTPException(
+                status_code=401, 
+                detail="Authentication failed"
+            )
+        
+        # 取得 Google 公鑰為阻塞式請求，在執行緒中進行
+        claims = await asyncio.to_thread(_verify_id_token, token, settings.auth_audience)
+        logger.info(f"Authenticated {request.url.path} for {claims.get('email') or claims.get('sub')}")
         
         return True
     except HTTPException:
@@ -0,0 +1,95 @@
+from typing import Optional
+
+from fastapi.requests import HTTPConnection
+
+from ..dependencies.auth import IdTokenManager, id_token_manager
+from ..services.call_service import CallService
+from ..services.campaign_service import CampaignDialer, campaign_dialer
+from ..services.drain import DrainController, drain_controller
+from ..services.extraction_queue import ExtractionQueue, extraction_queue
+from ..services.realtime_prewarm import RealtimePrewarmPool, realtime_prewarm
+from ..services.session_store import SessionStore
+from ..services.settings_service import initialize_settings
+from ..services import supabase_service, twilio_service
+from ..services.supabase_service import SupabaseDB
+from ..services.twilio_service import AsyncTwilioRest
+from ..services.webhook_outbox import WebhookOutbox
+from ..services.webhook_service import prewarm_webhook_tokens, webhook_outbox
+from ..services.websocket_service import active_streams
+from ..utils import http_client
+from ..utils.http_client import HttpClientRegistry
+from ..utils.log_utils import setup_logger
+
+logger = setup_logger("[Services]")
+
+class ServiceContainer:
+    """
+    每個 process 一份的服務與 client（Twilio、Supabase、HTTP client、佇列等）
+
+    由 app 的 lifespan 建立並放在 app.state.services，startup / shutdown 依相依順序啟動與關閉；
+    路由透過 Depends(get_call_service) 等取得，不再每個請求建立。
+
+    Twilio、Supabase 與 HTTP client 由容器持有並注入 CallService；未指定時使用 process 共用的 client
+    （webhook outbox、設定載入等模組層級的路徑也使用它們，同一個 process 只有一組連線池）。
+    測試或 benchmark 可傳入替代的 client，或用 app.dependency_overrides 替換。
+    """
+
+    def __init__(
+        self,
+        twilio_rest: Optional[AsyncTwilioRest] = None,
+        supabase_db: Optional[SupabaseDB] = None,
+        http_clients: Optional[HttpClientRegistry] = None
+    ):
+        self.twilio_rest: AsyncTwilioRest = twilio_rest or twilio_service.twilio_rest
+        self.supabase_db: SupabaseDB = supabase_db or supabase_service.supabase_db
+        self.http_clients: HttpClientRegistry = http_clients or http_client.http_clients
+        self.call_service = CallService(
+            twilio_rest=self.twilio_rest,
+            supabase_db=self.supabase_db,
+            http_clients=self.http_clients,
+            session_store=SessionStore,
+            drain=drain_controller,
+            prewarm=realtime_prewarm
+        )
+        self.webhook_outbox: WebhookOutbox = webhook_outbox
+        self.extraction_queue: ExtractionQueue = extraction_queue
+        self.campaign_dialer: CampaignDialer = campaign_dialer
+        self.realtime_prewarm: RealtimePrewarmPool = realtime_prewarm
+        self.id_token_manager: IdTokenManager = id_token_manager
+        self.drain: DrainController = drain_controller
+        self.active_streams = active_streams
+
+    async def startup(self) -> None:
+        await self.http_clients.startup("webhook", "openai")
+        prewarm_webhook_tokens()
+        await self.webhook_outbox.start()
+        await initialize_settings()
+        logger.info("Services started")
+
+    async def shutdown(self) -> None:
+        # 已在 drain 時等它完成；否則至少處理完通話後擷取與 webhook（media stream 此時已被 uvicorn 關閉）
+        if self.drain.draining:
+            await self.drain.wait()
+        else:
+            await self.drain.flush(self)
+        await self.campaign_dialer.close()
+        # 擷取結果會排入 webhook outbox，需在 outbox 與 HTTP client 關閉前處理完
+        await self.extraction_queue.close(timeout=10)
+        await self.realtime_prewarm.close_all()
+        await self.supabase_db.close()
+        await self.twilio_rest.close()
+        await self.webhook_outbox.close()
+        await self.http_clients.close()
+        await SessionStore.close()
+        self.id_token_manager.close()
+        logger.info("Services closed")
+
+def get_services(connection: HTTPConnection) -> ServiceContainer:
+    """FastAPI 相依：目前 app 的服務容器（HTTP 與 WebSocket 路由皆可使用）"""
+    return connection.app.state.services
+
+def get_call_service(connection: HTTPConnection) -> CallService:
+    return get_services(connection).call_service
+
+def get_drain(connection: HTTPConnection) -> DrainController:
+    return get_services(connection).drain
@@ -1,11 +1,15 @@
 from fastapi.responses import JSONResponse
-from app.constants import DEFAULT_TIMEZONE, TWILIO_STATUS_ANSWEREDBY
+from app.constants import DEFAULT_TIMEZONE, TERMINAL_CALL_STATUSES, TWILIO_STATUS_ANSWEREDBY
 from ..services.webhook_service import call_webhook_for_call_status, call_webhook_for_call_result
 from fastapi import Request
 from datetime import datetime
 import pytz
 from app.utils.log_utils import setup_logger
 from ..services.call_service import CallService
+from ..services.campaign_service import campaign_dialer
+from ..services.session_store import SessionStore
+from ..services.realtime_prewarm import realtime_prewarm
+from ..services.drain import drain_controller
 from app.utils.phone_utils import format_phone_number_with_country_code
 from ..services import twilio_service
 from ..constants import TWILIO_VOICE_SETTINGS
@@ -15,7 +19,7 @@ logger = setup_logger(__name__)
 
 TIMEZONE = pytz.timezone(DEFAULT_TIMEZONE)
 
-async def handle_call_status(request: Request):
+async def handle_call_status(request: Request, call_service: CallService):
     """處理 Twilio 通話狀態回調"""
     try:
         form_data = await request.form()
@@ -24,16 +28,17 @@ async def handle_call_status(request: Request):
         call_status = form_data.get("CallStatus")
         
         logger.info(f"Call Status Update - SID: {call_sid}, Status: {call_status}")
+        # 外撥名單的通話結束時釋放撥號器的同時通話名額
+        campaign_dialer.on_call_status(call_sid, call_status)
+        if call_status in TERMINAL_CALL_STATUSES:
+            drain_controller.call_finished(call_sid)
         bool_should_call_webhook = False
 
-        # 使用 call_service 處理業務邏輯
-        call_service = CallService()
-        
         if call_status == "answered":
             answered_by = form_data.get("AnsweredBy", "unknown")
             bool_should_call_webhook = await call_service.handle_answered_call(call_sid, answered_by)
             
-        elif call_status in ["completed", "no-answer", "canceled", "busy", "failed"]:
+        elif call_status in TERMINAL_CALL_STATUSES:
             bool_should_call_webhook = await call_service.handle_call_completion(
                 call_sid, 
                 call_status,
@@ -43,6 +48,10 @@ async def handle_call_status(request: Request):
         if bool_should_call_webhook:
             timestamp = datetime.now(TIMEZONE).isoformat()
             await call_webhook_for_call_status(call_sid, call_status, timestamp)
+
+        # 狀態 webhook 排入 outbox 之後才清理，清理失敗不影響 webhook
+        if call_status in TERMINAL_CALL_STATUSES:
+            await finish_call_session(call_sid, call_status)
             
         return JSONResponse(content={"status": "success"})
             
@@ -50,11 +59,28 @@ async def handle_call_status(request: Request):
         logger.error(f"Error processing call status: {str(e)}")
         return JSONResponse(content={"status": "error", "message": str(e)})
 
+async def finish_call_session(call_sid: str, call_status: str):
+    """
+    通話結束時清理 session 對應與記錄；completed 的記錄保留給仍在排隊的通話後擷取
+
+    未接、忙線等沒有連上 /media-stream 的通話，預熱的 OpenAI 連線不等 TTL 直接關閉。
+    """
+    try:
+        session_id = await SessionStore.finish_call(
+            call_sid,
+            settings.session_store_completed_grace_sec if call_status == "completed" else 0
+        )
+        if session_id:
+            realtime_prewarm.release(session_id)
+    except Exception as e:
+        # 例如 Redis 無法連線；key 仍會在 TTL 後過期
+        logger.error(f"Error cleaning up session store for call_sid {call_sid}: {str(e)}")
+
 async def process_call_result(call_sid: str, result: str, transcript: str):
     """處理通話結果"""
     await call_webhook_for_call_result(call_sid, result, transcript) 
 
-async def handle_outbound_call(request: Request):
+async def handle_outbound_call(request: Request, call_service: CallService):
     """處理外撥通話請求"""
     try:
         # 獲取請求參數
@@ -98,7 +124,6 @@ async def handle_outbound_call(request: Request):
         #logger.info(f"TwiML: {twiml_url}")
         
         # 調用 service 處理通話
-        call_service = CallService()
         result = await call_service.initiate_outbound_call(
             to_number=to_number,
             project_id=project_id,
@@ -115,10 +140,8 @@ async def handle_outbound_call(request: Request):
             status_code=500
         ) 
 
-async def handle_welcome_call(host: str, session_id: str) -> str:
-    call_service = CallService()
+async def handle_welcome_call(host: str, session_id: str, call_service: CallService) -> str:
     return await call_service.handle_welcome_call(host, session_id)
 
-async def handle_incoming_call(host: str, session_id: str) -> str:
-    call_service = CallService()
+async def handle_incoming_call(host: str, session_id: str, call_service: CallService) -> str:
     return await call_service.handle_incoming_call(host, session_id) 
\ No newline at end of file
@@ -0,0 +1,74 @@
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from app.utils.log_utils import setup_logger
+from app.utils.phone_utils import format_phone_number_with_country_code
+from ..services.campaign_service import campaign_dialer
+from ..services.supabase_service import get_projects_settings
+
+logger = setup_logger(__name__)
+
+async def handle_create_campaign(request: Request):
+    """
+    建立外撥名單
+
+    body: {"rows": [{"to_number": "...", "project_id": "..."}, ...], "project_id": "..."}
+    row 沒有 project_id 時使用外層的 project_id；電話號碼格式錯誤的 row 不會排入佇列。
+    """
+    try:
+        body = await request.json()
+        rows = body.get("rows")
+        default_project_id = body.get("project_id")
+
+        if not isinstance(rows, list) or not rows:
+            return JSONResponse(
+                content={"message": "Missing required parameter: rows"},
+                status_code=400
+            )
+
+        accepted = []
+        rejected = []
+        for index, row in enumerate(rows):
+            to_number = row.get("to_number") if isinstance(row, dict) else None
+            project_id = (row.get("project_id") if isinstance(row, dict) else None) or default_project_id
+            if not to_number or not project_id:
+                rejected.append({"index": index, "message": "Missing to_number or project_id"})
+                continue
+            try:
+                accepted.append((format_phone_number_with_country_code(to_number), str(project_id)))
+            except ValueError as e:
+                rejected.append({"index": index, "message": str(e)})
+
+        # 以單一查詢預先載入所有專案設置，撥號時直接命中快取
+        await get_projects_settings({project_id for _, project_id in accepted})
+
+        campaign = campaign_dialer.submit(accepted, request.url.hostname, rejected=len(rejected))
+        return JSONResponse(content={**campaign.progress(), "rejected_rows": rejected})
+
+    except Exception as e:
+        logger.error(f"Error in handle_create_campaign: {str(e)}")
+        return JSONResponse(
+            content={"message": f"Error processing request: {str(e)}"},
+            status_code=500
+        )
+
+async def handle_get_campaign(campaign_id: str):
+    """查詢外撥名單進度"""
+    campaign = campaign_dialer.campaigns.get(campaign_id)
+    if campaign is None:
+        return JSONResponse(content={"message": f"Campaign not found: {campaign_id}"}, status_code=404)
+    return JSONResponse(content=campaign.progress())
+
+async def handle_cancel_campaign(campaign_id: str):
+    """停止撥出尚未撥出的名單"""
+    campaign = campaign_dialer.cancel(campaign_id)
+    if campaign is None:
+        return JSONResponse(content={"message": f"Campaign not found: {campaign_id}"}, status_code=404)
+    logger.info(f"Campaign {campaign_id} cancelled")
+    return JSONResponse(content=campaign.progress())
+
+async def handle_list_campaigns():
+    """撥號器狀態與所有外撥名單進度"""
+    return JSONResponse(content={
+        "dialer": campaign_dialer.stats(),
+        "campaigns": [campaign.progress() for campaign in campaign_dialer.campaigns.values()],
+    })
@@ -1,18 +1,34 @@
+import asyncio
 import os
+import signal
+from contextlib import asynccontextmanager
+
 import uvicorn
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
 from app.config import settings
-from app.routers import call, twiml
+from app.routers import call, twiml, stats, campaign, health
 from app.utils.log_utils import setup_logger
-from app.services.settings_service import initialize_settings
+from app.utils import metrics as prometheus_metrics
+from app.dependencies.services import ServiceContainer
 
 # 設置日誌
 logger = setup_logger("[Main]")
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """啟動時建立並啟動服務容器，關閉時依序釋放"""
+    logger.info("Application startup")
+    services = ServiceContainer()
+    app.state.services = services
+    await services.startup()
+    yield
+    logger.info("Application shutdown")
+    await services.shutdown()
+
 # 創建 FastAPI 應用
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # 設置 CORS 中間件
 app.add_middleware(
@@ -29,34 +45,57 @@ app.add_middleware(
 #app.include_router(twiml.router, prefix="/api")
 app.include_router(call.router)
 app.include_router(twiml.router)
-
-@app.on_event("startup")
-async def startup_event():
-    """應用啟動時執行的事件"""
-    logger.info("Application startup")
-    #logger.info("Registered routes:")
-    #for route in app.routes:
-    #    methods = ", ".join(route.methods) if route.methods else "NO METHODS"
-    #    logger.info(f"{methods} {route.path}")
-    # 在這裡可以初始化一些全局狀態或資源
-    await initialize_settings()
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    """應用關閉時執行的事件"""
-    logger.info("Application shutdown")
-    # 在這裡可以清理資源
+app.include_router(stats.router)
+app.include_router(campaign.router)
+app.include_router(health.router)
 
 @app.get("/", response_class=HTMLResponse)
 async def index_page():
     """首頁路由"""
     return {"message": "Twilio Media Stream Server is running!"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus 指標（text exposition format）"""
+    return PlainTextResponse(prometheus_metrics.render(), media_type=prometheus_metrics.CONTENT_TYPE_LATEST)
+
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    logger.info(f"Incoming request: {request.method} {request.url}")
+    logger.info("Incoming request: %s %s", request.method, request.url.path)
     response = await call_next(request)
     return response
 
+class DrainingServer(uvicorn.Server):
+    """
+    第一次 SIGTERM 先 drain 再停止
+
+    uvicorn 收到 SIGTERM 會先以 1012 關閉所有 websocket，之後才執行 lifespan shutdown，
+    進行中的通話（media stream）來不及結束；因此先開始 drain，完成後才交給 uvicorn 關閉。
+    preStop 已經 POST /drain 時，SIGTERM 等待同一個 drain 完成；
+    第二次 SIGTERM，或收到 SIGINT 時則立即關閉。
+    """
+
+    def __init__(self, config: uvicorn.Config):
+        super().__init__(config)
+        self.sigterm_count = 0
+
+    def handle_exit(self, sig, frame):
+        services = getattr(app.state, "services", None)
+        if sig != signal.SIGTERM or services is None or self.should_exit:
+            return super().handle_exit(sig, frame)
+        self.sigterm_count += 1
+        if self.sigterm_count > 1:
+            logger.warning(f"Received signal {sig} again, shutting down without waiting for drain")
+            return super().handle_exit(sig, frame)
+        logger.warning(f"Received signal {sig}, draining before shutdown")
+        loop = asyncio.get_event_loop()
+
+        def exit_after_drain():
+            # 已由 POST /drain 開始時，start() 回傳進行中的 task
+            task = services.drain.start(services)
+            task.add_done_callback(lambda _: self.should_exit or super(DrainingServer, self).handle_exit(sig, frame))
+
+        loop.call_soon_threadsafe(exit_after_drain)
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=settings.app_port)
+    DrainingServer(uvicorn.Config(app, host="0.0.0.0", port=settings.app_port)).run()
@@ -1,15 +1,25 @@
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import JSONResponse
+from app.dependencies.services import get_call_service, get_drain
 from app.handlers.call_handler import handle_call_status, handle_outbound_call
+from app.services.call_service import CallService
+from app.services.drain import DRAINING_MESSAGE, DrainController
 from app.utils.log_utils import setup_logger
 router = APIRouter()
 logger = setup_logger(__name__)
 
 @router.post("/call-status")
-async def call_status_webhook(request: Request):
+async def call_status_webhook(request: Request, call_service: CallService = Depends(get_call_service)):
     """通話狀態的 webhook 路由"""
-    return await handle_call_status(request)
+    return await handle_call_status(request, call_service)
 
 @router.api_route("/makecall", methods=["GET", "POST"])
-async def make_outbound_call(request: Request):
+async def make_outbound_call(
+    request: Request,
+    call_service: CallService = Depends(get_call_service),
+    drain: DrainController = Depends(get_drain)
+):
     """發起外撥通話的路由"""
-    return await handle_outbound_call(request)
\ No newline at end of file
+    if drain.draining:
+        return JSONResponse(content={"message": DRAINING_MESSAGE}, status_code=503)
+    return await handle_outbound_call(request, call_service)
\ No newline at end of file
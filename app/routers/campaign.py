@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import JSONResponse
+from app.dependencies.services import get_drain
+from app.handlers.campaign_handler import (
+    handle_cancel_campaign,
+    handle_create_campaign,
+    handle_get_campaign,
+    handle_list_campaigns,
+)
+from app.services.drain import DRAINING_MESSAGE, DrainController
+from app.utils.log_utils import setup_logger
+router = APIRouter()
+logger = setup_logger(__name__)
+
+@router.post("/campaigns")
+async def create_campaign(request: Request, drain: DrainController = Depends(get_drain)):
+    """建立外撥名單並排入撥號器"""
+    if drain.draining:
+        return JSONResponse(content={"message": DRAINING_MESSAGE}, status_code=503)
+    return await handle_create_campaign(request)
+
+@router.get("/campaigns")
+async def list_campaigns():
+    """撥號器狀態與所有外撥名單進度"""
+    return await handle_list_campaigns()
+
+@router.get("/campaigns/{campaign_id}")
+async def get_campaign(campaign_id: str):
+    """外撥名單進度"""
+    return await handle_get_campaign(campaign_id)
+
+@router.post("/campaigns/{campaign_id}/cancel")
+async def cancel_campaign(campaign_id: str):
+    """停止撥出尚未撥出的名單"""
+    return await handle_cancel_campaign(campaign_id)
@@ -0,0 +1,30 @@
+from typing import Optional
+from fastapi import APIRouter, Depends
+from fastapi.responses import JSONResponse
+from app.dependencies.auth import verify_cloud_run_auth
+from app.dependencies.services import ServiceContainer, get_services
+from app.utils.log_utils import setup_logger
+router = APIRouter()
+logger = setup_logger(__name__)
+
+@router.get("/ready")
+async def ready(services: ServiceContainer = Depends(get_services)):
+    """readiness probe：drain 開始後回傳 503，負載平衡器不再送新的請求"""
+    if services.drain.draining:
+        return JSONResponse(content={"status": "draining"}, status_code=503)
+    return {"status": "ready"}
+
+@router.post("/drain")
+async def start_drain(
+    deadline_sec: Optional[float] = None,
+    services: ServiceContainer = Depends(get_services),
+    auth: bool = Depends(verify_cloud_run_auth)
+):
+    """進入 drain mode（例如 preStop hook，需帶 Authorization header）；deadline_sec 覆寫進行中通話的等待上限"""
+    services.drain.start(services, deadline_sec)
+    return services.drain.status(services)
+
+@router.get("/drain/status")
+async def drain_status(services: ServiceContainer = Depends(get_services)):
+    """drain 進度：phase 為 drained 時可以安全停止"""
+    return services.drain.status(services)
@@ -0,0 +1,49 @@
+from typing import Optional
+from fastapi import APIRouter, Depends
+from app.dependencies.auth import verify_cloud_run_auth
+from app.services.extraction_queue import extraction_queue
+from app.services.session_store import SessionStore
+from app.services.supabase_service import invalidate_project_settings, project_settings_cache
+from app.services.websocket_service import active_streams
+from app.services.webhook_service import webhook_outbox
+from app.utils.log_utils import setup_logger
+router = APIRouter()
+logger = setup_logger(__name__)
+
+@router.get("/stats/relay")
+async def relay_stats():
+    """每通進行中電話的轉送佇列深度與丟棄統計"""
+    return {
+        session_id: ws_manager.relay_stats()
+        for session_id, ws_manager in list(active_streams.items())
+    }
+
+@router.get("/stats/project-settings-cache")
+async def project_settings_cache_stats():
+    """專案設定快取的命中統計"""
+    return project_settings_cache.stats()
+
+@router.get("/stats/webhook-outbox")
+async def webhook_outbox_stats():
+    """webhook outbox 的深度與送達延遲"""
+    return await webhook_outbox.stats()
+
+@router.get("/stats/extraction-queue")
+async def extraction_queue_stats():
+    """通話後資訊擷取佇列的深度、等待時間與處理時間"""
+    return extraction_queue.stats()
+
+@router.get("/stats/session-store")
+async def session_store_stats():
+    """SessionStore 的 key 數量與到期、超過上限被移除的數量"""
+    return SessionStore.stats()
+
+@router.post("/project-settings/invalidate")
+async def invalidate_project_settings_cache(
+    project_id: Optional[str] = None,
+    auth: bool = Depends(verify_cloud_run_auth)
+):
+    """Supabase 上的專案設定修改後，清除快取（未指定 project_id 時清除全部，需帶 Authorization header）"""
+    invalidate_project_settings(project_id)
+    logger.info(f"Invalidated project settings cache: {project_id or 'all'}")
+    return {"invalidated": project_id or "all"}
@@ -1,106 +1,144 @@
-from uuid import uuid4
-from fastapi import APIRouter, Request, WebSocket
+from fastapi import APIRouter, Depends, Request, WebSocket
 from fastapi.responses import HTMLResponse
 
+from app.dependencies.services import get_call_service, get_drain
 from app.services.call_service import CallService
-from app.services.websocket_service import WebSocketManager
+from app.services.websocket_service import WebSocketManager, active_streams
 from app.services.session_store import SessionStore
+from app.services.realtime_prewarm import realtime_prewarm
+from app.services.node_affinity import MISROUTED_REQUESTS, node_router
+from app.services.drain import DrainController
 from ..services import twilio_service
 from ..utils.log_utils import setup_logger
-from ..constants import OPENAI_MODEL_REALTIME, OPENAI_API_URL_REALTIME
 import asyncio
-import websockets
-from ..config import settings
+import logging
+import time
 from ..services import openai_service
 from ..handlers import call_handler
 
 router = APIRouter()
 logger = setup_logger("[TwiML_Router]")
 @router.api_route("/twiml", methods=["GET", "POST"])
-async def serve_twiml(request: Request):
+async def serve_twiml(request: Request, call_service: CallService = Depends(get_call_service)):
     """提供 TwiML 響應"""
     host = request.url.hostname
     session_id = request.query_params.get("session_id")
     logger.info(f"Received request with session_id: {session_id}")
+
+    # 經由負載平衡器到達其他節點時，導回建立通話的節點
+    redirect = node_router.redirect_twiml(session_id, "/twiml", host)
+    if redirect is not None:
+        return HTMLResponse(content=redirect, media_type="application/xml")
+
+    # 在 Twilio 播放歡迎詞的同時預先建立 OpenAI Realtime 連線（/makecall 已預熱時不會重複建立）
+    call_sid, call_record = await SessionStore.get_session(session_id)
+    if call_sid:
+        realtime_prewarm.prewarm(session_id, call_record)
     
-    twiml = await call_handler.handle_welcome_call(host, session_id)
+    twiml = await call_handler.handle_welcome_call(host, session_id, call_service)
     logger.info(f"Sending TwiML response for session_id: {session_id}")
     return HTMLResponse(content=twiml, media_type="application/xml")
 
 @router.api_route("/incoming-call", methods=["GET", "POST"])
-async def handle_incoming_call(request: Request):
+async def handle_incoming_call(
+    request: Request,
+    call_service: CallService = Depends(get_call_service),
+    drain: DrainController = Depends(get_drain)
+):
     """處理來電"""
+    if drain.draining:
+        logger.info("Draining, rejecting incoming call as busy")
+        return HTMLResponse(content=twilio_service.generate_busy_twiml(), media_type="application/xml")
     host = request.url.hostname
-    session_id = str(uuid4()) #TODO incoming call should have session_id
+    session_id = node_router.new_session_id() #TODO incoming call should have session_id
     logger.info(f"handle_incoming_call Session ID: {session_id}")
-    twiml = await call_handler.handle_incoming_call(host, session_id)
+    twiml = await call_handler.handle_incoming_call(host, session_id, call_service)
     return HTMLResponse(content=twiml, media_type="application/xml")
 
 @router.websocket("/media-stream/{session_id}")
-async def handle_media_stream(websocket_twilio: WebSocket, session_id: str):
+async def handle_media_stream(
+    websocket_twilio: WebSocket,
+    session_id: str,
+    call_service: CallService = Depends(get_call_service)
+):
     """處理 WebSocket 媒體流"""
     logger.info(f"WebSocket connection request received")
     logger.info(f"Path session_id: {session_id}")
     
-    query_params = dict(websocket_twilio.query_params)
-    logger.info(f"Query parameters: {query_params}")
-    
-    headers = dict(websocket_twilio.headers)
-    logger.info(f"Headers: {headers}")
+    # query / headers 只在 DEBUG 時組出來
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Query parameters: %s", dict(websocket_twilio.query_params))
+        logger.debug("Headers: %s", dict(websocket_twilio.headers))
     
     await websocket_twilio.accept()
+    # 通話建立時間從這裡起算，包含之後的 SessionStore 查詢與 OpenAI 連線
+    connected_at = time.monotonic()
     logger.info(f"WebSocket connection accepted")
+
+    if not node_router.is_local(session_id):
+        # <Stream> 應已指向所屬節點；落在這裡時只能靠共用的 SessionStore，也沒有預熱的連線
+        MISROUTED_REQUESTS.labels("/media-stream").inc()
+        logger.warning(f"Media stream for session {session_id} reached node {node_router.node_id}, owner is {node_router.owner(session_id)}")
     
-    call_sid = SessionStore.get_call_sid(session_id)
+    call_sid, call_record = await SessionStore.get_session(session_id)
     if not call_sid:
         logger.error(f"No call SID found for session ID: {session_id}")
         await websocket_twilio.close()
         return
     
     logger.info(f"Call SID: {call_sid}")
-
-    call_record = SessionStore.get_call_record(call_sid)
-    logger.info(f"Call record: {call_record}")
-    ws_manager = WebSocketManager()
+    logger.debug("Call record: %s", call_record)
+    ws_manager = WebSocketManager(call_service)
+    ws_manager.connected_at = connected_at
+    active_streams[session_id] = ws_manager
+    websocket_openai = None
     
     try:
-        async with websockets.connect(
-            f"{OPENAI_API_URL_REALTIME}?model={OPENAI_MODEL_REALTIME}",
-            extra_headers={
-                "Authorization": f"Bearer {settings.openai_api_key}",
-                "OpenAI-Beta": "realtime=v1"
-            }
-        ) as websocket_openai:
+        websocket_openai = await realtime_prewarm.adopt(session_id)
+        ws_manager.prewarmed = websocket_openai is not None
+        if websocket_openai is None:
+            websocket_openai = await openai_service.connect_realtime()
             await openai_service.send_session_update(websocket_openai, call_record)
-            
-            async def receive_from_twilio():
-                try:
-                    async for message in websocket_twilio.iter_text():
-                        await ws_manager.handle_twilio_message(message, websocket_openai)
-                except Exception as e:
-                    logger.error(f"Error receiving from Twilio: {str(e)}")
-                finally:
-                    if websocket_openai.open:
-                        await websocket_openai.close()
+        logger.info(f"OpenAI realtime session ready (prewarmed: {ws_manager.prewarmed})")
 
-            async def send_to_twilio():
-                try:
-                    async for message in websocket_openai:
-                        await ws_manager.handle_openai_message(message, websocket_twilio, websocket_openai)
-                except Exception as e:
-                    logger.error(f"Error sending to Twilio: {str(e)}")
-                finally:
-                    if websocket_openai.open:
-                        await websocket_openai.close()
+        async def receive_from_twilio():
+            try:
+                async for message in websocket_twilio.iter_text():
+                    await ws_manager.handle_twilio_message(message, websocket_openai)
+            except Exception as e:
+                logger.error(f"Error receiving from Twilio: {str(e)}")
+            finally:
+                ws_manager.to_openai.close()
+                if websocket_openai.open:
+                    await websocket_openai.close()
+
+        async def send_to_twilio():
+            try:
+                async for message in websocket_openai:
+                    await ws_manager.handle_openai_message(message, websocket_twilio, websocket_openai)
+            except Exception as e:
+                logger.error(f"Error sending to Twilio: {str(e)}")
+            finally:
+                ws_manager.to_twilio.close()
+                if websocket_openai.open:
+                    await websocket_openai.close()
 
-            await asyncio.gather(receive_from_twilio(), send_to_twilio())
+        # 兩個方向各自由獨立的 task 寫入對端，一端變慢不會卡住另一端的讀取
+        await asyncio.gather(
+            receive_from_twilio(),
+            send_to_twilio(),
+            ws_manager.to_openai.drain_to(websocket_openai.send),
+            ws_manager.to_twilio.drain_to(websocket_twilio.send_text)
+        )
     finally:
+        active_streams.pop(session_id, None)
+        logger.info(f"Relay stats for session {session_id}: {ws_manager.relay_stats()}")
         try:
             await websocket_twilio.close()
         except Exception as e:
             logger.error(f"Error closing Twilio WebSocket: {str(e)}")
             
-        if 'websocket_openai' in locals():
+        if websocket_openai is not None:
             try:
                 await websocket_openai.close()
             except Exception as e:
@@ -0,0 +1,120 @@
+import asyncio
+import base64
+import time
+from typing import Awaitable, Callable, Optional
+
+from ..utils.log_utils import setup_logger
+
+logger = setup_logger("[Audio_Coalescer]")
+
+# g711_ulaw 8kHz：每 1 ms 8 bytes
+ULAW_BYTES_PER_MS = 8
+
+_APPEND_PREFIX = '{"type":"input_audio_buffer.append","audio":"'
+_APPEND_SUFFIX = '"}'
+
+def build_audio_append(audio: str) -> str:
+    """預先序列化的 input_audio_buffer.append 訊息（base64 不需要 JSON 跳脫）"""
+    return _APPEND_PREFIX + audio + _APPEND_SUFFIX
+
+class InboundAudioCoalescer:
+    """
+    將 Twilio 每 20 ms 一個的 media frame 合併成較大的 input_audio_buffer.append
+
+    - 累積到 window_ms 的音訊就送出
+    - 第一個 frame 等待超過 max_delay_ms 時由 timer 強制送出（延遲上限）
+    - stop 與播放位置以外的 mark 時呼叫 flush() 立即送出
+    window_ms <= 0 時不合併，每個 frame 原樣送出。
+    """
+
+    def __init__(self, send: Callable[[str], Awaitable[None]], window_ms: int, max_delay_ms: int):
+        self._send = send
+        self.window_ms = window_ms
+        self.max_delay_ms = max(max_delay_ms, window_ms)
+        self._window_bytes = window_ms * ULAW_BYTES_PER_MS
+        self._chunks: list[bytes] = []
+        self._buffered_bytes = 0
+        self._arrival_sum = 0.0
+        self._first_arrival = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional[asyncio.Task] = None
+
+        # 統計
+        self.frames_in = 0
+        self.appends_out = 0
+        self.total_delay = 0.0
+        self.max_delay = 0.0
+
+    async def push(self, payload: str) -> None:
+        """加入一個 Twilio media payload（base64 μ-law）"""
+        self.frames_in += 1
+        if self.window_ms <= 0:
+            self.appends_out += 1
+            await self._send(build_audio_append(payload))
+            return
+
+        chunk = base64.b64decode(payload)
+        now = time.monotonic()
+        if not self._chunks:
+            self._first_arrival = now
+            self._timer = asyncio.get_running_loop().call_later(
+                self.max_delay_ms / 1000, self._on_timer
+            )
+        self._chunks.append(chunk)
+        self._buffered_bytes += len(chunk)
+        self._arrival_sum += now
+
+        if self._buffered_bytes >= self._window_bytes:
+            await self.flush()
+
+    async def flush(self) -> None:
+        """立即送出目前累積的音訊"""
+        if not self._chunks:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        now = time.monotonic()
+        self.total_delay += len(self._chunks) * now - self._arrival_sum
+        self.max_delay = max(self.max_delay, now - self._first_arrival)
+        audio = base64.b64encode(b''.join(self._chunks)).decode('ascii')
+        self._chunks = []
+        self._buffered_bytes = 0
+        self._arrival_sum = 0.0
+        self.appends_out += 1
+        await self._send(build_audio_append(audio))
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        # 保留 task 的參照，避免執行中被 garbage collect
+        self._flush_task = asyncio.ensure_future(self._flush_on_timer())
+
+    async def _flush_on_timer(self) -> None:
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Error flushing coalesced audio: {str(e)}")
+
+    def close(self) -> None:
+        """取消等待中的 timer 與 timer 觸發的送出，丟棄未送出的音訊"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        self._chunks = []
+        self._buffered_bytes = 0
+        self._arrival_sum = 0.0
+
+    def stats(self) -> dict:
+        """合併效果與增加的延遲"""
+        return {
+            "window_ms": self.window_ms,
+            "frames_in": self.frames_in,
+            "appends_out": self.appends_out,
+            "sends_saved_ratio": round(1 - self.appends_out / self.frames_in, 3) if self.frames_in else 0.0,
+            "avg_added_delay_ms": round(self.total_delay / self.frames_in * 1000, 2) if self.frames_in else 0.0,
+            "max_added_delay_ms": round(self.max_delay * 1000, 2),
+        }
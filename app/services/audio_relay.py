@@ -0,0 +1,47 @@
+import json
+
+def base64_decoded_length(data: str) -> int:
+    """不解碼直接由 base64 字串長度算出原始 bytes 數"""
+    if not data:
+        return 0
+    padding = (data[-1] == '=') + (data[-2:-1] == '=')
+    return len(data) * 3 // 4 - padding
+
+class TwilioMediaFrame:
+    """
+    預先序列化的 Twilio media 訊息模板
+
+    OpenAI 與 Twilio 兩端都使用 g711_ulaw，`response.audio.delta` 的 base64 字串
+    可以原封不動放進 Twilio 的 `media.payload`，不需要 decode/encode 或重新 json.dumps。
+    base64 字元集不含需要 JSON 跳脫的字元，因此直接字串拼接即可得到合法的 JSON。
+    """
+    __slots__ = ("stream_sid", "_prefix", "_mark_prefix", "_clear")
+
+    _SUFFIX = '"}}'
+
+    def __init__(self, stream_sid: str):
+        self.stream_sid = stream_sid
+        # json.dumps 只在建立模板時執行一次，確保 streamSid 被正確跳脫
+        self._prefix = (
+            '{"event":"media","streamSid":'
+            + json.dumps(stream_sid)
+            + ',"media":{"payload":"'
+        )
+        self._mark_prefix = (
+            '{"event":"mark","streamSid":'
+            + json.dumps(stream_sid)
+            + ',"mark":{"name":"'
+        )
+        self._clear = '{"event":"clear","streamSid":' + json.dumps(stream_sid) + '}'
+
+    def render(self, delta: str) -> str:
+        """將 base64 音訊片段填入模板，回傳可直接 send_text 的字串"""
+        return self._prefix + delta + self._SUFFIX
+
+    def render_mark(self, name: str) -> str:
+        """Twilio mark 訊息，name 只能包含不需 JSON 跳脫的字元（例如 item_id 與數字）"""
+        return self._mark_prefix + name + self._SUFFIX
+
+    def render_clear(self) -> str:
+        """Twilio clear 訊息，清空 Twilio 端尚未播放的音訊"""
+        return self._clear
@@ -1,28 +1,46 @@
-from uuid import uuid4
 from app.constants import TWILIO_STATUS_ANSWEREDBY, TWILIO_VOICE_SETTINGS
 from app.services import twilio_service
-from app.services.session_store import SessionStore
+from app.services.session_store import CallRecord, SessionStore
+from app.services.realtime_prewarm import RealtimePrewarmPool, realtime_prewarm
+from app.services.node_affinity import node_router
+from app.services.drain import DrainController, drain_controller
 from app.utils.log_utils import setup_logger
-from app.services.supabase_service import get_project_settings
+from app.utils.http_client import HttpClientRegistry
+from app.services.supabase_service import SupabaseDB, get_project_settings
 from app.services.settings_service import Settings_Init_FromDB
-from app.services.twilio_service import make_call, close_call_by_agent
-from app.services.openai_service import make_chat_completion
+from app.services.twilio_service import AsyncTwilioRest, make_call, close_call_by_agent
+from app.services.openai_service import make_chat_completion, parse_chat_completion
+from app.services.incremental_extraction import IncrementalExtractor
 from app.services.webhook_service import call_webhook_for_call_result, call_webhook_for_call_status
-from typing import Dict, Any
-import json
-from functools import partial
-import asyncio
-from twilio.rest import Client
-from app.config import settings
+from typing import Dict, Any, Optional
 from app.utils.log_utils import setup_logger
 
 logger = setup_logger(__name__)
 
 class CallService:
-    def __init__(self):
-        self.call_records: Dict[str, dict] = {}
-        self.temp_session_map: Dict[str, str] = {}  # session_id -> call_sid 的映射
-        self.client = Client(settings.twilio_account_sid, settings.twilio_auth_token)
+    """
+    通話相關的業務邏輯
+
+    不持有每通電話的狀態（記錄都在 SessionStore）。Twilio、Supabase 與 HTTP client 以及
+    SessionStore、drain controller、預熱連線池由建構子注入：ServiceContainer 以它持有的 client 建立，
+    路由透過 Depends(get_call_service) 取得；未指定的使用 process 共用的實例（模組層級的 call_service 即是如此）。
+    """
+
+    def __init__(
+        self,
+        twilio_rest: Optional[AsyncTwilioRest] = None,
+        supabase_db: Optional[SupabaseDB] = None,
+        http_clients: Optional[HttpClientRegistry] = None,
+        session_store=SessionStore,
+        drain: DrainController = drain_controller,
+        prewarm: RealtimePrewarmPool = realtime_prewarm
+    ):
+        self.twilio_rest = twilio_rest
+        self.supabase_db = supabase_db
+        self.http_clients = http_clients
+        self.session_store = session_store
+        self.drain = drain
+        self.prewarm = prewarm
 
     async def initiate_outbound_call(
         self,
@@ -33,48 +51,44 @@ class CallService:
     ) -> dict:
         """發起外撥通話"""
         try:
-            # 生成臨時會話 ID
-            temp_session_id = str(uuid4())
+            # 生成臨時會話 ID（帶有本節點的 node_id）
+            temp_session_id = node_router.new_session_id()
 
-            # 構建包含臨時會話 ID 的 TwiML URL
+            # 構建包含臨時會話 ID 的 TwiML URL；TwiML 與 status callback 都直接送到本節點
+            hostname = node_router.host_for(temp_session_id, hostname)
             twiml_url = f"https://{hostname}/twiml?session_id={temp_session_id}"
             logger.info(f"TwiML: {twiml_url}")
             #twiml_url = f"{twiml_url}?session_id={temp_session_id}"
             
             # 獲取專案設置
-            custom_project_setting = await get_project_settings(project_id)
+            custom_project_setting = await get_project_settings(project_id, db=self.supabase_db)
             project_prompts = custom_project_setting.get('project_prompts', '')
             
-            # 獲取事件循環
-            loop = asyncio.get_running_loop()
-            
-            # 將同步的 Twilio API 調用包裝在 run_in_executor 中
-            call_sid = await loop.run_in_executor(
-                None,  # 使用默認的執行器（ThreadPoolExecutor）
-                partial(  # 使用 partial 創建一個新的函數，預設部分參數
-                    make_call,  # 要執行的同步函數
-                    to_number=to_number,  # parameters
-                    twiml_url=twiml_url,  # parameters
-                    hostname=hostname,  # parameters
-                    voice_settings=Settings_Init_FromDB.twilio_voice_settings  # parameters
-                )
+            call_sid = await make_call(
+                to_number=to_number,
+                twiml_url=twiml_url,
+                hostname=hostname,
+                voice_settings=Settings_Init_FromDB.twilio_voice_settings,
+                rest=self.twilio_rest
             )
             
             if call_sid:
+                # drain 時等待本節點撥出的通話結束
+                self.drain.call_started(call_sid)
                 # 初始化通話記錄，加入 project_prompts
-                self.call_records[call_sid] = {
-                    "to_number": to_number,
-                    "project_id": project_id,
-                    "project_prompts": project_prompts,
-                    "transcript": [],
-                    "parsed_content": {}
-                }
+                call_record = CallRecord(
+                    to_number=to_number,
+                    project_id=project_id,
+                    project_prompts=project_prompts,
+                    session_id=temp_session_id
+                )
                 # 儲存臨時會話 ID 和 call_sid 的對應關係
                 # self.temp_session_map[temp_session_id] = call_sid
-                SessionStore.set_call_sid(temp_session_id, call_sid)
-                SessionStore.set_call_record(call_sid, self.call_records[call_sid])
+                await self.session_store.set_session(temp_session_id, call_sid, call_record)
+                # 通話響鈴期間就開始建立 OpenAI Realtime 連線
+                self.prewarm.prewarm(temp_session_id, call_record)
                 
-                logger.info(f"Current records: {self.call_records}. temp_session_id: {temp_session_id}. call_sid: {call_sid}")
+                logger.debug("Call record: %s. temp_session_id: %s. call_sid: %s", call_record, temp_session_id, call_sid)
                 return {
                     "message": "Call initiated successfully.",
                     "call_sid": call_sid,
@@ -87,10 +101,10 @@ class CallService:
             logger.error(f"Error initiating outbound call: {str(e)}")
             raise e
 
-    def get_call_sid_by_session(self, session_id: str) -> str:
-        """根據 session_id 獲取 call_sid"""
-        return self.temp_session_map.get(session_id)
-    
+    async def close_call_by_agent(self, call_sid: str) -> None:
+        """由 agent 結束通話"""
+        await close_call_by_agent(call_sid, rest=self.twilio_rest)
+
     async def handle_answered_call(self, call_sid: str, answered_by: str) -> bool:
         """處理已接聽的通話"""
         logger.info(f"Call answered by: {answered_by}")
@@ -122,6 +136,8 @@ class CallService:
         return True
 
     async def handle_welcome_call(self, host: str, session_id: str) -> str:
+        # media stream 連到建立通話的節點
+        host = node_router.host_for(session_id, host)
         # Generate a new session_id
         #session_id = str(uuid4())
         # Register session_id in CallService
@@ -135,6 +151,7 @@ class CallService:
         )
 
     async def handle_incoming_call(self, host: str, session_id: str) -> str:
+        host = node_router.host_for(session_id, host)
         return twilio_service.generate_twiml(
             "Please wait while we connect your call to the A. I. voice assistant",
             host,
@@ -142,62 +159,49 @@ class CallService:
             TWILIO_VOICE_SETTINGS
         )
 
-    async def process_transcript(self, call_sid: str, transcript: str) -> None:
+    async def process_transcript(
+        self,
+        call_sid: str,
+        transcript: str,
+        incremental: Optional[IncrementalExtractor] = None
+    ) -> Optional[Dict[str, Any]]:
         """
         處理對話記錄並發送提取的詳細信息
         
         Args:
             call_sid: 通話識別碼
             transcript: 完整對話記錄
+            incremental: 通話中的增量擷取；有的話只需處理最後尚未擷取的對話
+
+        Returns:
+            Chat Completion 原始回應（含 usage，供擷取佇列修正 token 用量），
+            增量擷取已處理完所有對話時為 None
         """
         logger.info(f"開始處理通話 {call_sid} 的對話記錄...")
         
         try:
-            # 調用 ChatGPT API
-            result = await make_chat_completion(transcript)
-            logger.info(f'ChatGPT 原始回應: {json.dumps(result, indent=2)}')
-       
-            parsed_content = None
-            if (result.get('choices') and 
-                result['choices'][0].get('message') and 
-                result['choices'][0]['message'].get('content')):
-                
-                try:
-                    parsed_content = json.loads(result['choices'][0]['message']['content'])
-                    logger.info(f'解析後的內容: {json.dumps(parsed_content, indent=2)}')
-                    
-                except json.JSONDecodeError as parse_error:
-                    logger.error(f'解析 ChatGPT 回應的 JSON 時發生錯誤: {str(parse_error)}')
-                    
+            if incremental is not None:
+                parsed_content, result = await incremental.finalize()
+                logger.info(f'增量擷取完成，共 {incremental.runs} 次 Chat Completion')
             else:
-                logger.warning('ChatGPT API 回應結構異常')
-
-            logger.info(f'更新通話記錄前: {call_sid}')
-            # 從 SessionStore 獲取通話記錄
-            call_record = SessionStore.get_call_record(call_sid)
-            if call_record:
-                # 更新通話記錄
-                call_record["transcript"].append(transcript)
-                if parsed_content:
-                    call_record["parsed_content"].update(parsed_content)
-                
-                # 更新 SessionStore 中的記錄
-                SessionStore.set_call_record(call_sid, call_record)
-                
-                logger.info(f'通話 {call_sid} 的記錄: {json.dumps(call_record, ensure_ascii=False, indent=2)}')
-                
-                # 調用 webhook
-                if parsed_content:
-                    logger.info('準備調用 webhook...')
-                    await call_webhook_for_call_result(call_sid, parsed_content, transcript)
-                    logger.info('webhook 調用完成')
-                
-                # 清理記錄
-                SessionStore.clear_call_record(call_sid)
-                logger.info(f"已清理通話 {call_sid} 的記錄")
-                
-            logger.info(f'更新通話記錄後: {call_sid}')
+                # 調用 ChatGPT API
+                result = await make_chat_completion(transcript, clients=self.http_clients)
+                logger.debug('ChatGPT 原始回應: %s', result)
+                parsed_content = parse_chat_completion(result)
+
+            # webhook 只需要 call_sid 與對話，不依賴通話記錄：
+            # 擷取可能在佇列中等待超過 SESSION_STORE_COMPLETED_GRACE_SEC，記錄已過期時仍要送出結果
+            if parsed_content:
+                logger.info('準備調用 webhook...')
+                await call_webhook_for_call_result(call_sid, parsed_content, transcript)
+                logger.info('webhook 調用完成')
+
+            # 擷取完成，清理保留給擷取的通話記錄（已過期時不需要）
+            await self.session_store.clear_call_record(call_sid)
+            return result
             
         except Exception as error:
             logger.error(f'處理對話記錄時發生錯誤: {str(error)}')
-            raise
\ No newline at end of file
+            raise
+
+call_service = CallService()
@@ -0,0 +1,279 @@
+import asyncio
+import random
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from twilio.base.exceptions import TwilioRestException
+
+from ..config import settings
+from ..constants import TERMINAL_CALL_STATUSES
+from ..services.call_service import call_service
+from ..utils.log_utils import setup_logger
+from ..utils.rate_limit import TokenBucket
+
+logger = setup_logger("[Campaign_Service]")
+
+class Campaign:
+    """一批外撥名單與其進度計數"""
+
+    def __init__(self, campaign_id: str, hostname: str, total: int, rejected: int):
+        self.campaign_id = campaign_id
+        self.hostname = hostname
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.cancelled = False
+
+        self.total = total
+        self.rejected = rejected  # 電話號碼格式錯誤，未排入佇列
+        self.pending = total
+        self.dialing = 0
+        self.live = 0
+        self.initiated = 0
+        self.failed = 0  # Twilio 建立通話失敗
+        self.retried = 0  # Twilio 回 429 後重試的次數
+        self.skipped = 0  # 取消後尚未撥出的名單
+        self.call_statuses: Counter = Counter()
+
+    @property
+    def done(self) -> bool:
+        return self.pending == 0 and self.dialing == 0 and self.live == 0
+
+    def _check_done(self) -> None:
+        if self.done and self.finished_at is None:
+            self.finished_at = time.time()
+            logger.info(f"Campaign {self.campaign_id} finished: {self.progress()}")
+
+    def progress(self) -> dict:
+        if self.done:
+            status = "cancelled" if self.cancelled else "completed"
+        else:
+            status = "cancelling" if self.cancelled else "running"
+        return {
+            "campaign_id": self.campaign_id,
+            "status": status,
+            "total": self.total,
+            "rejected": self.rejected,
+            "pending": self.pending,
+            "dialing": self.dialing,
+            "live": self.live,
+            "initiated": self.initiated,
+            "failed": self.failed,
+            "retried": self.retried,
+            "skipped": self.skipped,
+            "call_statuses": dict(self.call_statuses),
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+class CampaignDialer:
+    """
+    行程內的外撥撥號器
+
+    所有活動的名單共用一個 FIFO 佇列，由單一 dispatcher 依序撥出：
+    - token bucket 限制每秒建立的通話數（Twilio CPS），避免 429
+    - 同時進行中的通話數上限；通話在 /call-status 收到終止狀態時釋放，
+      若一直沒收到，live_call_timeout 秒後也會釋放
+    - Twilio 仍回 429 時以指數退避重試，最多 max_retries 次，重試期間保留通話名額
+    - 已結束的名單保留 retention_sec 秒，且最多保留 max_finished 筆，建立新名單時清除
+    """
+
+    def __init__(
+        self,
+        cps: float,
+        burst: float,
+        max_live_calls: int,
+        live_call_timeout: float,
+        max_retries: int = 3,
+        retry_backoff: float = 1.0,
+        retention_sec: float = 3600,
+        max_finished: int = 100
+    ):
+        self.max_live_calls = max_live_calls
+        self.live_call_timeout = live_call_timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.retention_sec = retention_sec
+        self.max_finished = max_finished
+        self._bucket = TokenBucket(cps, burst)
+        self._live_slots = asyncio.Semaphore(max_live_calls)
+        self._queue: "asyncio.Queue[Tuple[Campaign, str, str]]" = asyncio.Queue()
+        self._live: Dict[str, Tuple[Campaign, asyncio.TimerHandle]] = {}
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._dial_tasks = set()
+        self.campaigns: Dict[str, Campaign] = {}
+
+    def submit(self, rows: List[Tuple[str, str]], hostname: str, rejected: int = 0) -> Campaign:
+        """將 (to_number, project_id) 名單排入佇列，回傳新的 campaign"""
+        self._prune()
+        campaign = Campaign(str(uuid4()), hostname, len(rows), rejected)
+        self.campaigns[campaign.campaign_id] = campaign
+        for to_number, project_id in rows:
+            self._queue.put_nowait((campaign, to_number, project_id))
+        campaign._check_done()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch())
+        logger.info(f"Campaign {campaign.campaign_id} queued {len(rows)} calls ({rejected} rejected)")
+        return campaign
+
+    def _prune(self) -> None:
+        """移除超過保留時間或超出保留筆數的已結束名單"""
+        cutoff = time.time() - self.retention_sec
+        finished = []
+        for campaign_id, campaign in list(self.campaigns.items()):
+            if campaign.finished_at is None:
+                continue
+            if campaign.finished_at < cutoff:
+                del self.campaigns[campaign_id]
+            else:
+                finished.append(campaign)
+        excess = len(finished) - self.max_finished
+        if excess > 0:
+            finished.sort(key=lambda campaign: campaign.finished_at)
+            for campaign in finished[:excess]:
+                del self.campaigns[campaign.campaign_id]
+
+    def cancel(self, campaign_id: str) -> Optional[Campaign]:
+        """停止撥出尚未撥出的名單，進行中的通話不受影響"""
+        campaign = self.campaigns.get(campaign_id)
+        if campaign is not None:
+            campaign.cancelled = True
+        return campaign
+
+    async def _dispatch(self) -> None:
+        while True:
+            campaign, to_number, project_id = await self._queue.get()
+            if campaign.cancelled:
+                self._skip(campaign)
+                continue
+            acquired = False
+            try:
+                await self._live_slots.acquire()
+                acquired = True
+                await self._bucket.acquire()
+            except asyncio.CancelledError:
+                # close()：已取出但還沒撥出的這筆也視為略過
+                if acquired:
+                    self._live_slots.release()
+                campaign.cancelled = True
+                self._skip(campaign)
+                raise
+            # 等待期間可能已被取消
+            if campaign.cancelled:
+                self._live_slots.release()
+                self._skip(campaign)
+                continue
+            campaign.pending -= 1
+            campaign.dialing += 1
+            task = asyncio.ensure_future(self._dial(campaign, to_number, project_id))
+            self._dial_tasks.add(task)
+            task.add_done_callback(self._dial_tasks.discard)
+
+    def _skip(self, campaign: Campaign) -> None:
+        campaign.pending -= 1
+        campaign.skipped += 1
+        campaign._check_done()
+
+    async def _dial(self, campaign: Campaign, to_number: str, project_id: str) -> None:
+        attempt = 0
+        while True:
+            try:
+                result = await call_service.initiate_outbound_call(
+                    to_number=to_number,
+                    project_id=project_id,
+                    hostname=campaign.hostname
+                )
+                break
+            except TwilioRestException as e:
+                if e.status != 429 or attempt >= self.max_retries:
+                    self._dial_failed(campaign, to_number, e)
+                    return
+            except Exception as e:
+                self._dial_failed(campaign, to_number, e)
+                return
+            # 429：退避後重新取得 token 再撥，加上隨機抖動避免同時重試
+            delay = self.retry_backoff * (2 ** attempt) * random.uniform(0.5, 1.0)
+            attempt += 1
+            campaign.retried += 1
+            logger.warning(
+                f"Campaign {campaign.campaign_id} rate limited calling {to_number}, "
+                f"retry {attempt}/{self.max_retries} in {delay:.2f}s"
+            )
+            await asyncio.sleep(delay)
+            await self._bucket.acquire()
+            if campaign.cancelled:
+                campaign.dialing -= 1
+                campaign.skipped += 1
+                self._live_slots.release()
+                campaign._check_done()
+                return
+
+        call_sid = result["call_sid"]
+        campaign.dialing -= 1
+        campaign.initiated += 1
+        campaign.live += 1
+        timer = asyncio.get_running_loop().call_later(
+            self.live_call_timeout, self._release, call_sid, "timeout"
+        )
+        self._live[call_sid] = (campaign, timer)
+
+    def _dial_failed(self, campaign: Campaign, to_number: str, error: Exception) -> None:
+        logger.error(f"Campaign {campaign.campaign_id} failed to call {to_number}: {str(error)}")
+        campaign.dialing -= 1
+        campaign.failed += 1
+        self._live_slots.release()
+        campaign._check_done()
+
+    def on_call_status(self, call_sid: str, call_status: str) -> None:
+        """/call-status 回調：通話結束時釋放同時通話數"""
+        if call_status in TERMINAL_CALL_STATUSES:
+            self._release(call_sid, call_status)
+
+    def _release(self, call_sid: str, call_status: str) -> None:
+        entry = self._live.pop(call_sid, None)
+        if entry is None:
+            return
+        campaign, timer = entry
+        timer.cancel()
+        campaign.live -= 1
+        campaign.call_statuses[call_status] += 1
+        self._live_slots.release()
+        campaign._check_done()
+
+    def stats(self) -> dict:
+        """撥號器整體狀態"""
+        return {
+            "queued": self._queue.qsize(),
+            "live_calls": len(self._live),
+            "max_live_calls": self.max_live_calls,
+            "cps_tokens": round(self._bucket.tokens, 2),
+            "active_campaigns": sum(1 for campaign in self.campaigns.values() if not campaign.done),
+        }
+
+    async def close(self) -> None:
+        """停止 dispatcher，尚未撥出的名單記為略過；已建立的通話由 Twilio 繼續進行"""
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+        skipped = 0
+        while not self._queue.empty():
+            campaign, _, _ = self._queue.get_nowait()
+            campaign.cancelled = True
+            self._skip(campaign)
+            skipped += 1
+        if skipped:
+            logger.warning(f"Dialer closed with {skipped} undialed rows, marked as skipped")
+        for _, timer in self._live.values():
+            timer.cancel()
+
+campaign_dialer = CampaignDialer(
+    cps=settings.campaign_cps,
+    burst=settings.campaign_burst,
+    max_live_calls=settings.campaign_max_live_calls,
+    live_call_timeout=settings.campaign_live_call_timeout_sec,
+    max_retries=settings.campaign_max_retries,
+    retry_backoff=settings.campaign_retry_backoff_sec,
+    retention_sec=settings.campaign_retention_sec,
+    max_finished=settings.campaign_max_finished
+)
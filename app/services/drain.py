@@ -0,0 +1,136 @@
+import asyncio
+import time
+from typing import Dict, Optional
+
+from ..config import settings
+from ..utils.log_utils import setup_logger
+from ..utils.metrics import Gauge
+
+logger = setup_logger("[Drain]")
+
+DRAINING = Gauge("app_draining", "1 while the node is draining (not accepting new calls)")
+
+SERVING, DRAINING_CALLS, FLUSHING, DRAINED = "serving", "calls", "flushing", "drained"
+
+DRAINING_MESSAGE = "Server is draining, not accepting new calls"
+
+class DrainController:
+    """
+    滾動部署時的 drain mode
+
+    開始後 /ready 回傳 503、/makecall、/campaigns 與 /incoming-call 不再接新的通話，撥號器停止撥出；
+    進行中的通話（已撥出尚未收到終止狀態，或仍在 media stream 中）最多等待 call_deadline_sec 秒，
+    之後最多 flush_timeout_sec 秒處理完通話後擷取佇列與 webhook outbox。
+    進度由 status() 提供（GET /drain/status），phase 為 drained 時可以安全停止。
+
+    services 為 ServiceContainer，在 start / status 時傳入，避免與各服務模組互相 import。
+    """
+
+    def __init__(self, call_deadline_sec: float, flush_timeout_sec: float, call_timeout_sec: float, poll_interval: float = 0.5):
+        self.call_deadline_sec = call_deadline_sec
+        self.flush_timeout_sec = flush_timeout_sec
+        self.call_timeout_sec = call_timeout_sec
+        self.poll_interval = poll_interval
+        self.phase = SERVING
+        self.started_at: Optional[float] = None
+        self.deadline: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        # 本節點撥出、尚未收到終止狀態的通話：call_sid -> 撥出時間（依撥出順序）
+        self._pending_calls: Dict[str, float] = {}
+        DRAINING.set_function(lambda: 1 if self.draining else 0)
+
+    @property
+    def draining(self) -> bool:
+        return self.phase != SERVING
+
+    def call_started(self, call_sid: str) -> None:
+        now = time.monotonic()
+        self._pending_calls[call_sid] = now
+        self._prune(now)
+
+    def call_finished(self, call_sid: str) -> None:
+        self._pending_calls.pop(call_sid, None)
+
+    def _prune(self, now: float) -> None:
+        # 一直沒收到終止狀態的通話（status callback 遺失）call_timeout_sec 後不再等待
+        for call_sid, started_at in list(self._pending_calls.items()):
+            if now - started_at < self.call_timeout_sec:
+                break
+            del self._pending_calls[call_sid]
+
+    def active_calls(self, services) -> int:
+        """撥出中的通話，加上不在其中的 media stream（例如來電）"""
+        self._prune(time.monotonic())
+        streaming = sum(
+            1 for ws_manager in list(services.active_streams.values())
+            if ws_manager.call_sid not in self._pending_calls
+        )
+        return len(self._pending_calls) + streaming
+
+    def start(self, services, call_deadline_sec: Optional[float] = None) -> asyncio.Task:
+        """開始 drain（重複呼叫時回傳同一個 task）"""
+        if self._task is None:
+            self.started_at = time.monotonic()
+            self.deadline = self.started_at + (self.call_deadline_sec if call_deadline_sec is None else call_deadline_sec)
+            self.phase = DRAINING_CALLS
+            logger.warning(f"Draining: {self.active_calls(services)} active calls, deadline {self.deadline - self.started_at:.0f}s")
+            self._task = asyncio.get_running_loop().create_task(self._drain(services))
+        return self._task
+
+    async def _drain(self, services) -> None:
+        # 停止撥出排隊中的外撥名單，已建立的通話繼續進行
+        await services.campaign_dialer.close()
+        while self.active_calls(services) and time.monotonic() < self.deadline:
+            await asyncio.sleep(self.poll_interval)
+        remaining = self.active_calls(services)
+        if remaining:
+            logger.warning(f"Drain deadline reached with {remaining} active calls")
+        self.phase = FLUSHING
+        await self.flush(services)
+        self.phase = DRAINED
+        self.finished_at = time.monotonic()
+        logger.warning(f"Drained in {self.finished_at - self.started_at:.1f}s: {self.status(services)}")
+
+    async def flush(self, services) -> bool:
+        """等待通話後擷取與 webhook outbox 清空，最多 flush_timeout_sec 秒"""
+        flush_deadline = time.monotonic() + self.flush_timeout_sec
+        flushed = await services.extraction_queue.join(self.flush_timeout_sec)
+        outbox = services.webhook_outbox
+        while outbox.depth and time.monotonic() < flush_deadline:
+            await asyncio.sleep(self.poll_interval)
+        if not flushed or outbox.depth:
+            logger.warning(
+                f"Flush timed out: {services.extraction_queue.depth} transcripts, "
+                f"{outbox.depth} webhooks pending"
+            )
+            return False
+        return True
+
+    async def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待 drain 完成，逾時或尚未開始時回傳 False"""
+        if self._task is None:
+            return False
+        done, _ = await asyncio.wait({self._task}, timeout=timeout)
+        return bool(done)
+
+    def status(self, services) -> dict:
+        now = time.monotonic()
+        return {
+            "phase": self.phase,
+            "ready": not self.draining,
+            "drained": self.phase == DRAINED,
+            "elapsed_sec": round((self.finished_at or now) - self.started_at, 1) if self.started_at else None,
+            "call_deadline_in_sec": round(max(0.0, self.deadline - now), 1) if self.deadline and self.phase == DRAINING_CALLS else None,
+            "active_calls": self.active_calls(services),
+            "media_streams": len(services.active_streams),
+            "extraction_queue": {"depth": services.extraction_queue.depth, "in_service": services.extraction_queue.in_service},
+            "webhook_outbox": {"depth": services.webhook_outbox.depth, "inflight": services.webhook_outbox.inflight},
+            "campaign_queued": services.campaign_dialer.stats()["queued"],
+        }
+
+drain_controller = DrainController(
+    call_deadline_sec=settings.drain_call_deadline_sec,
+    flush_timeout_sec=settings.drain_flush_timeout_sec,
+    call_timeout_sec=settings.campaign_live_call_timeout_sec
+)
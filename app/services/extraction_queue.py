@@ -0,0 +1,236 @@
+import asyncio
+import itertools
+import json
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from ..config import settings
+from ..services.incremental_extraction import IncrementalExtractor
+from ..services.settings_service import Settings_Init_FromDB
+from ..utils.log_utils import setup_logger
+from ..utils.metrics import Counter, Gauge, Histogram, histogram_summary
+from ..utils.rate_limit import TokenBucket
+
+logger = setup_logger("[Extraction_Queue]")
+
+EXTRACTION_QUEUE_DEPTH = Gauge("extraction_queue_depth", "Transcripts waiting for post-call extraction")
+EXTRACTION_IN_SERVICE = Gauge("extraction_in_service", "Post-call extractions currently running")
+EXTRACTION_COMPLETED = Counter("extraction_completed", "Post-call extractions finished", ["outcome"])
+EXTRACTION_QUEUE_WAIT = Histogram(
+    "extraction_queue_wait_seconds",
+    "Time from call end until extraction starts, including the tokens-per-minute wait",
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+)
+EXTRACTION_SERVICE_TIME = Histogram(
+    "extraction_service_seconds",
+    "Duration of the chat completion and result handling for one call",
+    buckets=(0.25, 0.5, 1, 2, 3, 5, 7.5, 10, 15, 20, 30, 60)
+)
+
+def estimate_tokens(text: str) -> int:
+    """粗估 token 數：非 ASCII（中文）字元約 1 token，ASCII 約 4 字元 1 token"""
+    non_ascii = sum(1 for char in text if ord(char) > 127)
+    return non_ascii + (len(text) - non_ascii) // 4 + 1
+
+def parse_project_priorities(value: str) -> Dict[str, int]:
+    """解析 "project_id:priority,..." 格式"""
+    priorities = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        project_id, _, priority = item.partition(':')
+        priorities[project_id.strip()] = int(priority or 0)
+    return priorities
+
+class ExtractionJob:
+    __slots__ = ("call_sid", "transcript", "incremental", "project_id", "priority", "tokens", "enqueued_at")
+
+    def __init__(
+        self,
+        call_sid: str,
+        transcript: str,
+        incremental: Optional[IncrementalExtractor],
+        project_id: Optional[str],
+        priority: int,
+        tokens: int
+    ):
+        self.call_sid = call_sid
+        self.transcript = transcript
+        self.incremental = incremental
+        self.project_id = project_id
+        self.priority = priority
+        self.tokens = tokens
+        self.enqueued_at = time.monotonic()
+
+class ExtractionQueue:
+    """
+    通話結束後的資訊擷取佇列
+
+    固定 workers 個 worker 依優先序處理，同時進行的 Chat Completion 數不超過 worker 數；
+    另以 tokens-per-minute 的 token bucket 限流，開始前先扣除估計的 token 數，
+    完成後依回應的 usage.total_tokens 修正。優先序數字越大越先處理，同優先序依先來後到。
+    通話中的增量擷取經由 metered() 使用同一個 token bucket。
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        tokens_per_minute: float,
+        max_completion_tokens: int,
+        project_priorities: Dict[str, int],
+        process: Optional[Callable[[str, str, Optional[IncrementalExtractor]], Awaitable[Optional[dict]]]] = None
+    ):
+        self.workers = workers
+        self.max_completion_tokens = max_completion_tokens
+        self.project_priorities = project_priorities
+        self._process = process
+        self._bucket = TokenBucket(tokens_per_minute / 60, tokens_per_minute)
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._sequence = itertools.count()
+
+        # 統計
+        self.in_service = 0
+        self.completed = 0
+        self.failed = 0
+        self.in_call_runs = 0
+
+    def _start(self) -> None:
+        loop = asyncio.get_running_loop()
+        self._queue = asyncio.PriorityQueue()
+        self._tasks = [loop.create_task(self._work()) for _ in range(self.workers)]
+        EXTRACTION_QUEUE_DEPTH.set_function(lambda: self.depth)
+        EXTRACTION_IN_SERVICE.set_function(lambda: self.in_service)
+        logger.info(f"Extraction queue started with {self.workers} workers")
+
+    def submit(
+        self,
+        call_sid: str,
+        transcript: str,
+        project_id: Optional[str] = None,
+        priority: Optional[int] = None,
+        incremental: Optional[IncrementalExtractor] = None
+    ) -> ExtractionJob:
+        """排入一通電話的對話記錄，立即回傳；有通話中的增量擷取時只估算尚未擷取的部分"""
+        if self._queue is None:
+            self._start()
+        if priority is None:
+            priority = self.project_priorities.get(str(project_id), 0)
+        if incremental is not None and not incremental.pending_turns:
+            tokens = 0
+        elif incremental is not None:
+            tokens = self.estimate(incremental.pending_text(), incremental.result)
+        else:
+            tokens = self.estimate(transcript)
+        job = ExtractionJob(call_sid, transcript, incremental, project_id, priority, tokens)
+        self._queue.put_nowait((-priority, next(self._sequence), job))
+        logger.info(f"Extraction queued for call_sid {call_sid} (project {project_id}, priority {priority}, ~{tokens} tokens), depth {self.depth}")
+        return job
+
+    def estimate(self, transcript: str, previous_result: Optional[dict] = None) -> int:
+        """一次 Chat Completion 預留的 token 數：system instructions、對話、先前結果與回應上限"""
+        tokens = estimate_tokens(Settings_Init_FromDB.chat_completions_system_instructions) \
+            + estimate_tokens(transcript) + self.max_completion_tokens
+        if previous_result is not None:
+            tokens += estimate_tokens(json.dumps(previous_result, ensure_ascii=False))
+        return tokens
+
+    def metered(
+        self,
+        chat: Callable[[str, Optional[dict]], Awaitable[dict]]
+    ) -> Callable[[str, Optional[dict]], Awaitable[dict]]:
+        """
+        包裝通話中的 Chat Completion，與通話後擷取共用 TPM token bucket
+
+        呼叫前預留估計的 token 數，完成後依 usage.total_tokens 修正。
+        不佔用 worker：通話後的擷取在 worker 內會等待進行中的增量擷取完成。
+        """
+        async def metered_chat(transcript: str, previous_result: Optional[dict] = None) -> dict:
+            tokens = self.estimate(transcript, previous_result)
+            await self._bucket.acquire(tokens)
+            self.in_call_runs += 1
+            response = await chat(transcript, previous_result)
+            usage = (response or {}).get('usage', {}).get('total_tokens')
+            if usage:
+                self._bucket.debit(usage - tokens)
+            return response
+        return metered_chat
+
+    async def _work(self) -> None:
+        while True:
+            _, _, job = await self._queue.get()
+            try:
+                await self._bucket.acquire(job.tokens)
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: ExtractionJob) -> None:
+        EXTRACTION_QUEUE_WAIT.observe(time.monotonic() - job.enqueued_at)
+        self.in_service += 1
+        started_at = time.monotonic()
+        try:
+            result = await self._process_transcript(job.call_sid, job.transcript, job.incremental)
+            usage = (result or {}).get('usage', {}).get('total_tokens')
+            if usage:
+                self._bucket.debit(usage - job.tokens)
+            self.completed += 1
+            EXTRACTION_COMPLETED.labels("success").inc()
+        except Exception as e:
+            self.failed += 1
+            EXTRACTION_COMPLETED.labels("error").inc()
+            logger.error(f"Error extracting call_sid {job.call_sid}: {str(e)}")
+        finally:
+            self.in_service -= 1
+            EXTRACTION_SERVICE_TIME.observe(time.monotonic() - started_at)
+
+    async def _process_transcript(self, call_sid: str, transcript: str, incremental: Optional[IncrementalExtractor]) -> Optional[dict]:
+        if self._process is not None:
+            return await self._process(call_sid, transcript, incremental)
+        from ..services.call_service import call_service
+        return await call_service.process_transcript(call_sid, transcript, incremental)
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def join(self, timeout: Optional[float] = None) -> bool:
+        """等待佇列中的工作全部完成，逾時回傳 False"""
+        if self._queue is None:
+            return True
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def stats(self) -> dict:
+        """佇列深度、限流狀態與等待 / 處理時間分布"""
+        return {
+            "depth": self.depth,
+            "in_service": self.in_service,
+            "workers": self.workers,
+            "completed": self.completed,
+            "failed": self.failed,
+            "in_call_runs": self.in_call_runs,
+            "tokens_available": round(self._bucket.tokens),
+            "queue_wait_sec": histogram_summary(EXTRACTION_QUEUE_WAIT),
+            "service_time_sec": histogram_summary(EXTRACTION_SERVICE_TIME),
+        }
+
+    async def close(self, timeout: float = 0) -> None:
+        """等待最多 timeout 秒讓佇列處理完，之後停止 workers"""
+        if self._queue is None:
+            return
+        if timeout and not await self.join(timeout):
+            logger.warning(f"Extraction queue closed with {self.depth} transcripts not processed")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+extraction_queue = ExtractionQueue(
+    workers=settings.extraction_workers,
+    tokens_per_minute=settings.extraction_tokens_per_minute,
+    max_completion_tokens=settings.extraction_max_completion_tokens,
+    project_priorities=parse_project_priorities(settings.extraction_project_priorities)
+)
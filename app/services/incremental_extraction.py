@@ -0,0 +1,100 @@
+import asyncio
+from typing import Awaitable, Callable, Optional, Tuple
+
+from ..services.openai_service import make_chat_completion, parse_chat_completion
+from ..services.transcript import Transcript
+from ..utils.log_utils import setup_logger
+
+logger = setup_logger("[Incremental_Extraction]")
+
+class IncrementalExtractor:
+    """
+    通話中的增量資訊擷取
+
+    每次 response.done 後呼叫 schedule()，debounce 秒內沒有新的回應才執行一次 Chat Completion；
+    每次只送出上次之後新增的對話，並附上先前的擷取結果讓模型更新。
+    掛斷時 finalize() 只需處理最後一小段尚未擷取的對話。
+
+    chat 用於通話中的擷取（通常以 ExtractionQueue.metered() 包上共用的 TPM 限流）；
+    finalize() 在擷取佇列的 worker 內執行，token 已由佇列預留，改用 final_chat（預設同 chat）。
+    """
+
+    def __init__(
+        self,
+        call_sid: str,
+        transcript: Transcript,
+        debounce_sec: float,
+        chat: Callable[[str, Optional[dict]], Awaitable[dict]] = make_chat_completion,
+        final_chat: Optional[Callable[[str, Optional[dict]], Awaitable[dict]]] = None
+    ):
+        self.call_sid = call_sid
+        self.transcript = transcript
+        self.debounce_sec = debounce_sec
+        self._chat = chat
+        self._final_chat = final_chat or chat
+        self.result: Optional[dict] = None  # 目前為止的擷取結果
+        self.processed_turns = 0
+        self.runs = 0
+        self._debounce: Optional[asyncio.TimerHandle] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def pending_turns(self) -> int:
+        return len(self.transcript) - self.processed_turns
+
+    def pending_text(self) -> str:
+        return self.transcript.render(self.processed_turns)
+
+    def schedule(self) -> None:
+        """有新的對話：重新計時，debounce 秒後在背景擷取"""
+        if self._debounce is not None:
+            self._debounce.cancel()
+        self._debounce = asyncio.get_running_loop().call_later(self.debounce_sec, self._start)
+
+    def _start(self) -> None:
+        self._debounce = None
+        if self._task is not None and not self._task.done():
+            # 前一次還在執行，稍後再試
+            self.schedule()
+            return
+        self._task = asyncio.ensure_future(self._update())
+        self._task.add_done_callback(self._on_done)
+
+    def _on_done(self, task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Incremental extraction failed for call_sid {self.call_sid}: {task.exception()}")
+
+    async def _update(self, chat: Optional[Callable[[str, Optional[dict]], Awaitable[dict]]] = None) -> Optional[dict]:
+        """擷取尚未處理的對話，回傳 Chat Completion 原始回應（沒有新對話時為 None）"""
+        end = len(self.transcript)
+        if end == self.processed_turns:
+            return None
+        response = await (chat or self._chat)(self.transcript.render(self.processed_turns, end), self.result)
+        parsed_content = parse_chat_completion(response)
+        if parsed_content is not None:
+            # 解析失敗時保留原本的進度，下次連同這些對話一起重送
+            self.result = parsed_content
+            self.processed_turns = end
+        self.runs += 1
+        logger.info(f"Incremental extraction for call_sid {self.call_sid}: {self.processed_turns}/{len(self.transcript)} turns")
+        return response
+
+    async def finalize(self) -> Tuple[Optional[dict], Optional[dict]]:
+        """通話結束：等待進行中的擷取，再處理剩下的對話，回傳 (擷取結果, 最後一次的原始回應)"""
+        if self._debounce is not None:
+            self._debounce.cancel()
+            self._debounce = None
+        if self._task is not None and not self._task.done():
+            try:
+                await self._task
+            except Exception:
+                pass  # 已在 _on_done 記錄，剩下的對話由下面重新擷取
+        response = await self._update(self._final_chat)
+        return self.result, response
+
+    def cancel(self) -> None:
+        if self._debounce is not None:
+            self._debounce.cancel()
+            self._debounce = None
+        if self._task is not None:
+            self._task.cancel()
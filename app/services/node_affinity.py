@@ -0,0 +1,82 @@
+import re
+from typing import Optional
+from uuid import uuid4
+
+from twilio.twiml.voice_response import VoiceResponse
+
+from ..config import settings
+from ..utils.log_utils import setup_logger
+from ..utils.metrics import Counter
+
+logger = setup_logger("[Node_Affinity]")
+
+NODE_ID_PATTERN = re.compile(r"^[A-Za-z0-9-]+$")
+
+MISROUTED_REQUESTS = Counter(
+    "node_affinity_misrouted", "Requests that reached a node other than the one owning the session", ("route",)
+)
+
+class NodeRouter:
+    """
+    讓同一通電話的 /twiml、/media-stream 與 /call-status 都回到建立通話的節點
+
+    session_id 為 "{node_id}.{uuid}"，NODE_HOSTNAME_TEMPLATE（例如 "{node}.voice.example.com"）
+    把 node_id 轉成該節點自己的 hostname：/makecall 給 Twilio 的 TwiML / status callback URL
+    與 <Stream> 的 wss URL 都指向該 hostname，經由負載平衡器到達其他節點的 /twiml
+    則回傳 <Redirect> 到所屬節點。
+    session 狀態與預熱的 OpenAI 連線都留在建立通話的節點，media 路徑不需要共用的狀態。
+
+    node_id 為空時停用：session_id 只有 uuid，所有 URL 沿用請求的 hostname。
+    """
+
+    def __init__(self, node_id: str = "", hostname_template: str = ""):
+        if node_id and not NODE_ID_PATTERN.match(node_id):
+            raise ValueError(f"NODE_ID may only contain letters, digits and '-': {node_id!r}")
+        self.node_id = node_id
+        self.hostname_template = hostname_template
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.node_id)
+
+    def new_session_id(self) -> str:
+        session_id = str(uuid4())
+        return f"{self.node_id}.{session_id}" if self.node_id else session_id
+
+    @staticmethod
+    def owner(session_id: Optional[str]) -> Optional[str]:
+        """session_id 所屬的節點，舊格式（只有 uuid）為 None"""
+        if not session_id:
+            return None
+        node_id, separator, _ = session_id.partition(".")
+        return node_id if separator and NODE_ID_PATTERN.match(node_id) else None
+
+    def is_local(self, session_id: Optional[str]) -> bool:
+        owner = self.owner(session_id)
+        return owner is None or not self.enabled or owner == self.node_id
+
+    def host_for(self, session_id: Optional[str], default_host: str) -> str:
+        """所屬節點的 hostname；沒有設定 NODE_HOSTNAME_TEMPLATE 或無法判斷時為 default_host"""
+        owner = self.owner(session_id)
+        if owner is None or not self.hostname_template:
+            return default_host
+        return self.hostname_template.format(node=owner)
+
+    def redirect_twiml(self, session_id: str, path: str, current_host: str) -> Optional[str]:
+        """
+        請求落在非所屬節點時，回傳把 Twilio 導到所屬節點同一路徑的 <Redirect> TwiML
+
+        所屬節點就是目前節點，或無法得知所屬節點的 hostname 時回傳 None，由目前節點處理。
+        """
+        if self.is_local(session_id):
+            return None
+        host = self.host_for(session_id, current_host)
+        if host == current_host:
+            return None
+        MISROUTED_REQUESTS.labels(path).inc()
+        logger.info(f"Redirecting {path} for session {session_id} to node {self.owner(session_id)} ({host})")
+        response = VoiceResponse()
+        response.redirect(f"https://{host}{path}?session_id={session_id}", method="POST")
+        return str(response)
+
+node_router = NodeRouter(settings.node_id, settings.node_hostname_template)
@@ -0,0 +1,110 @@
+import json
+from typing import Awaitable, Callable, Dict, Optional
+
+from ..constants import OpenAIEventTypes
+
+# 在訊息開頭的這個範圍內尋找頂層 "type"，OpenAI 事件的 type 總是排在最前面
+_TYPE_PEEK_WINDOW = 128
+
+def _string_value_start(message: str, marker_end: int) -> int:
+    """回傳 `"key":` 之後字串值的起始位置（允許冒號後有空白），不是字串值時回傳 -1"""
+    length = len(message)
+    while marker_end < length and message[marker_end] in ' \t\r\n':
+        marker_end += 1
+    if marker_end < length and message[marker_end] == '"':
+        return marker_end + 1
+    return -1
+
+def _is_top_level(message: str, start: int) -> bool:
+    """
+    start 處的 `"key":` 是否確定為頂層欄位
+
+    之前沒有出現 '{' 或 '['（第一個字元之外）時不可能在巢狀物件或陣列內；
+    字串值中的引號一定經過跳脫，因此未跳脫的 `"key":` 也不會在字串值內。
+    前面出現過 '{' / '[' 時可能是巢狀欄位（也可能只是字串值中的字元），交由呼叫端退回 json.loads。
+    """
+    return (
+        message.find('{', 1, start) == -1
+        and message.find('[', 1, start) == -1
+        and message[start - 1:start] != '\\'
+    )
+
+def peek_event_type(message: str) -> Optional[str]:
+    """
+    只讀取事件的 type 欄位，不解析整個 JSON
+
+    找不到（或可能不是頂層欄位）時才退回完整的 json.loads。
+    """
+    start = message.find('"type":', 0, _TYPE_PEEK_WINDOW)
+    if start != -1 and _is_top_level(message, start):
+        start = _string_value_start(message, start + 7)
+        end = message.find('"', start) if start != -1 else -1
+        if end != -1 and message.find('\\', start, end) == -1:
+            return message[start:end]
+    try:
+        return json.loads(message).get('type')
+    except (ValueError, AttributeError):
+        return None
+
+def extract_string_field(message: str, key: str) -> Optional[str]:
+    """
+    直接從原始訊息字串取出頂層的字串欄位（例如 base64 的 delta）
+
+    第一個 `"key":` 可能是巢狀欄位、值不是字串或含有跳脫字元時退回 json.loads，
+    確保結果與完整解析一致；沒有這個欄位時回傳 None。
+    """
+    marker = f'"{key}":'
+    start = message.find(marker)
+    if start != -1 and _is_top_level(message, start):
+        start = _string_value_start(message, start + len(marker))
+        end = message.find('"', start) if start != -1 else -1
+        if end != -1 and message.find('\\', start, end) == -1:
+            return message[start:end]
+    value = json.loads(message).get(key)
+    return value if isinstance(value, str) else None
+
+EventHandler = Callable[[dict], Awaitable[None]]
+RawEventHandler = Callable[[str], Awaitable[None]]
+
+class OpenAIEventRouter:
+    """
+    OpenAI Realtime 事件的 handler registry
+
+    - on_raw(): handler 收到原始字串，不做任何 JSON 解析（音訊 delta 的快速路徑）
+    - on(): handler 收到 json.loads 後的 dict（控制事件）
+    沒有註冊 handler 的事件只讀 type 後直接丟棄。
+    """
+
+    def __init__(self):
+        self._raw_handlers: Dict[str, RawEventHandler] = {}
+        self._handlers: Dict[str, EventHandler] = {}
+
+    @staticmethod
+    def _key(event_type) -> str:
+        # OpenAIEventTypes 的 hash 取自 member name，需轉成字串值才能與 peek 結果比對
+        return event_type.value if isinstance(event_type, OpenAIEventTypes) else event_type
+
+    def on(self, event_type, handler: EventHandler) -> None:
+        """註冊需要完整解析的事件 handler"""
+        key = self._key(event_type)
+        self._raw_handlers.pop(key, None)
+        self._handlers[key] = handler
+
+    def on_raw(self, event_type, handler: RawEventHandler) -> None:
+        """註冊直接處理原始訊息字串的事件 handler"""
+        key = self._key(event_type)
+        self._handlers.pop(key, None)
+        self._raw_handlers[key] = handler
+
+    async def dispatch(self, message: str) -> None:
+        """依照 type 分派訊息"""
+        event_type = peek_event_type(message)
+
+        raw_handler = self._raw_handlers.get(event_type)
+        if raw_handler is not None:
+            await raw_handler(message)
+            return
+
+        handler = self._handlers.get(event_type)
+        if handler is not None:
+            await handler(json.loads(message))
@@ -1,49 +1,56 @@
 import json
-import base64
+import logging
+from typing import Optional
 
+import websockets
 from fastapi import WebSocket
 
-from app.constants import OPENAI_API_URL, OPENAI_API_URL_REALTIME, OPENAI_MODEL, OPENAI_MODEL_REALTIME, WHAT_DATE_IS_TODAY_PROMPTS
+from app.constants import INCREMENTAL_EXTRACTION_PROMPTS, OPENAI_API_URL, OPENAI_API_URL_REALTIME, OPENAI_MODEL, OPENAI_MODEL_REALTIME, WHAT_DATE_IS_TODAY_PROMPTS
 from ..config import settings
 from ..utils.log_utils import setup_logger
-import httpx
+from ..utils.http_client import HttpClientRegistry, http_clients
 from ..services.settings_service import Settings_Init_FromDB
+from ..services.session_update_cache import session_update_cache
+from ..services.session_store import CallRecord
 #from ..services.call_service import CallService
 
 logger = setup_logger("[OpenAI_Service]")
 
-async def send_session_update(openai_ws: WebSocket, call_record) -> None:
+async def connect_realtime() -> websockets.WebSocketClientProtocol:
+    """建立 OpenAI Realtime websocket 連線"""
+    return await websockets.connect(
+        f"{OPENAI_API_URL_REALTIME}?model={OPENAI_MODEL_REALTIME}",
+        extra_headers={
+            "Authorization": f"Bearer {settings.openai_api_key}",
+            "OpenAI-Beta": "realtime=v1"
+        }
+    )
+
+async def send_session_update(openai_ws: WebSocket, call_record: Optional[CallRecord]) -> None:
     try:
-        # 獲取並更新配置
-        session_config = Settings_Init_FromDB.SESSION_UPDATE_CONFIG.copy()
-        session_config["session"]["instructions"] = await get_session_instructions(call_record)
-        
-        # 轉換為 JSON 並發送
-        config_json = json.dumps(session_config)
-        logger.info('Sending session update: %s', config_json)
+        # 取得預先序列化的配置並發送，不修改共用的 SESSION_UPDATE_CONFIG
+        project_id = call_record.project_id if call_record else None
+        project_prompts = call_record.project_prompts if call_record else ""
+        config_json = session_update_cache.get(project_id, project_prompts)
+        logger.info('Sending session update for project %s (%d bytes)', project_id, len(config_json))
         await openai_ws.send(config_json)
     except Exception as e:
         logger.error(f"Error sending session update: {str(e)}")
         raise
 
-async def get_session_instructions(call_record) -> str:
-    """根據 call_sid 組合系統指令"""
-    system_message = Settings_Init_FromDB.OpenAI_Init_SYSTEM_MESSAGE
-    
-    # 直接使用傳入的 call_service 實例
-    project_prompts = call_record["project_prompts"]
-    
-    date_prompts = WHAT_DATE_IS_TODAY_PROMPTS
-    
-    logger.info(f"System Message: {system_message}")
-    logger.info(f"Project Prompts: {project_prompts}")
-    logger.info(f"Date Prompts: {date_prompts}")
-    
-    return f"{system_message}\n{project_prompts}\n{date_prompts}"
+async def make_chat_completion(
+    transcript: str,
+    previous_result: Optional[dict] = None,
+    clients: Optional[HttpClientRegistry] = None
+) -> dict:
+    """
+    調用 OpenAI Chat Completion API
 
-async def make_chat_completion(transcript: str) -> dict:
-    """調用 OpenAI Chat Completion API"""
-    logger.info(f"Making chat completion with transcript: {transcript}")
+    有 previous_result 時為增量擷取：transcript 只包含之後新增的對話，
+    由模型依新內容更新先前的結果。clients 未指定時使用 process 共用的 http_clients。
+    """
+    logger.info("Making chat completion with %d characters of transcript", len(transcript))
+    logger.debug("Transcript: %s", transcript)
     try:
         headers = {
             'Authorization': f"Bearer {settings.openai_api_key}",
@@ -57,6 +64,12 @@ async def make_chat_completion(transcript: str) -> dict:
                     "role": "system",
                     "content": f"{Settings_Init_FromDB.chat_completions_system_instructions}\n{WHAT_DATE_IS_TODAY_PROMPTS}"
                 },
+                *([{
+                    "role": "user",
+                    "content": INCREMENTAL_EXTRACTION_PROMPTS.format(
+                        previous_result=json.dumps(previous_result, ensure_ascii=False)
+                    )
+                }] if previous_result is not None else []),
                 {
                     "role": "user",
                     "content": transcript
@@ -65,15 +78,31 @@ async def make_chat_completion(transcript: str) -> dict:
             "response_format": Settings_Init_FromDB.chat_completions_settings.get("response_format", {}).get("response_format", {}) #TODO: Need to get twice because of the nested structure
         }
 
-        logger.info(f"Payload: {json.dumps(payload, indent=2)}")
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                OPENAI_API_URL,
-                headers=headers,
-                json=payload
-            )
-            logger.info(f"Chat completion response: {response.json()}")
-        return response.json()
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Payload: %s", json.dumps(payload, ensure_ascii=False))
+        response = await (clients or http_clients).get("openai").post(
+            OPENAI_API_URL,
+            headers=headers,
+            json=payload
+        )
+        result = response.json()
+        logger.info("Chat completion response: status %d, usage %s", response.status_code, result.get('usage'))
+        return result
     except Exception as e:
         logger.error(f"Error in chat completion: {str(e)}")
         raise
+
+def parse_chat_completion(result: dict) -> Optional[dict]:
+    """取出 Chat Completion 回應中的 JSON 內容，結構異常或無法解析時回傳 None"""
+    if not (result.get('choices') and
+            result['choices'][0].get('message') and
+            result['choices'][0]['message'].get('content')):
+        logger.warning('ChatGPT API 回應結構異常')
+        return None
+    try:
+        parsed_content = json.loads(result['choices'][0]['message']['content'])
+        logger.debug('解析後的內容: %s', parsed_content)
+        return parsed_content
+    except json.JSONDecodeError as parse_error:
+        logger.error(f'解析 ChatGPT 回應的 JSON 時發生錯誤: {str(parse_error)}')
+        return None
@@ -0,0 +1,113 @@
+import asyncio
+import time
+from typing import Dict, Optional, Set
+
+import websockets
+
+from ..config import settings
+from ..services import openai_service
+from ..services.session_store import CallRecord
+from ..utils.log_utils import setup_logger
+
+logger = setup_logger("[Realtime_Prewarm]")
+
+class RealtimePrewarmPool:
+    """
+    以 session_id 為 key，在 Twilio 連上 /media-stream 之前預先建立並設定好 OpenAI Realtime 連線
+
+    TLS handshake、connect 與 session.update 都在通話響鈴與 <Say> 期間完成，
+    /media-stream/{session_id} 直接 adopt 已就緒的連線。超過 TTL 沒有被 adopt 的連線會被關閉，
+    通話未接通就結束（未接、忙線）時由 release() 立即關閉。
+    """
+
+    def __init__(self):
+        self._pending: Dict[str, asyncio.Task] = {}
+        self._expiry: Dict[str, asyncio.TimerHandle] = {}
+        # 關閉中的連線，保留參照直到關閉完成
+        self._closing: Set[asyncio.Task] = set()
+
+    def prewarm(self, session_id: str, call_record: Optional[CallRecord]) -> None:
+        """在背景開始建立連線，同一個 session_id 只會建立一次"""
+        if not settings.realtime_prewarm_enabled or not session_id or session_id in self._pending:
+            return
+        loop = asyncio.get_running_loop()
+        self._pending[session_id] = loop.create_task(self._open(session_id, call_record))
+        self._expiry[session_id] = loop.call_later(
+            settings.realtime_prewarm_ttl_sec, self._expire, session_id
+        )
+
+    async def _open(self, session_id: str, call_record: Optional[CallRecord]) -> websockets.WebSocketClientProtocol:
+        started_at = time.monotonic()
+        websocket_openai = await openai_service.connect_realtime()
+        try:
+            await openai_service.send_session_update(websocket_openai, call_record)
+        except BaseException:
+            # 包含 TTL 到期時的 cancel
+            self._close(websocket_openai)
+            raise
+        logger.info(f"Prewarmed realtime session {session_id} in {(time.monotonic() - started_at) * 1000:.0f} ms")
+        return websocket_openai
+
+    async def adopt(self, session_id: str) -> Optional[websockets.WebSocketClientProtocol]:
+        """取得預熱的連線（尚未完成時等待完成），沒有或失敗時回傳 None"""
+        task = self._pending.pop(session_id, None)
+        expiry = self._expiry.pop(session_id, None)
+        if expiry is not None:
+            expiry.cancel()
+        if task is None:
+            return None
+        try:
+            websocket_openai = await task
+        except Exception as e:
+            logger.error(f"Prewarmed realtime session {session_id} failed: {str(e)}")
+            return None
+        if not websocket_openai.open:
+            logger.warning(f"Prewarmed realtime session {session_id} was closed before adoption")
+            return None
+        return websocket_openai
+
+    def release(self, session_id: str) -> bool:
+        """關閉不會再被 adopt 的預熱連線（例如通話未接通就結束），沒有時回傳 False"""
+        expiry = self._expiry.pop(session_id, None)
+        if expiry is not None:
+            expiry.cancel()
+        task = self._pending.pop(session_id, None)
+        if task is None:
+            return False
+        self._discard(task)
+        return True
+
+    def _expire(self, session_id: str) -> None:
+        self._expiry.pop(session_id, None)
+        if self.release(session_id):
+            logger.info(f"Discarded unused prewarmed realtime session {session_id} after TTL")
+
+    def _discard(self, task: asyncio.Task) -> None:
+        if not task.done():
+            task.cancel()
+            return
+        if not task.cancelled() and task.exception() is None:
+            self._close(task.result())
+
+    def _close(self, websocket_openai: websockets.WebSocketClientProtocol) -> None:
+        closing = asyncio.ensure_future(websocket_openai.close())
+        self._closing.add(closing)
+        closing.add_done_callback(self._closing.discard)
+
+    async def close_all(self) -> None:
+        """關閉所有尚未被 adopt 的連線"""
+        for expiry in self._expiry.values():
+            expiry.cancel()
+        self._expiry.clear()
+        tasks = list(self._pending.values())
+        self._pending.clear()
+        for task in tasks:
+            self._discard(task)
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # 連線中被取消的 task 在 _open 裡才開始關閉，gather 之後再等待所有關閉完成
+        await asyncio.gather(*self._closing, return_exceptions=True)
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+realtime_prewarm = RealtimePrewarmPool()
@@ -0,0 +1,140 @@
+import asyncio
+import itertools
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from ..utils.log_utils import setup_logger
+
+logger = setup_logger("[Relay_Queue]")
+
+# 佇列中訊息的種類
+AUDIO, MARK, CONTROL = "audio", "mark", "control"
+
+class RelayQueue:
+    """
+    Twilio 與 OpenAI 之間單一方向的有界轉送佇列
+
+    讀取端只負責 put，由 drain_to() 的獨立 task 寫入對端 socket，
+    對端變慢時不會卡住讀取端。溢位策略：
+    - 音訊訊息最多保留 max_audio 則，超過時丟棄最舊的音訊
+    - 緊接在音訊之後加入的 mark 屬於該音訊，與音訊一起被丟棄或清除；
+      因此佇列中的 mark 數量也以 max_audio 為上限，回傳的 mark 只對應實際送出的音訊
+    - 控制訊息（clear、truncate 等）永遠不丟棄
+
+    訊息以遞增序號存於 OrderedDict，丟棄最舊音訊為 O(1)。
+    """
+
+    def __init__(self, name: str, max_audio: int):
+        self.name = name
+        self.max_audio = max_audio
+        # 序號 -> (訊息, 種類)，依加入順序
+        self._items: "OrderedDict[int, Tuple[str, str]]" = OrderedDict()
+        # 佇列中音訊的序號（由舊到新），以及音訊序號 -> 跟隨其後的 mark 序號
+        self._audio: Deque[int] = deque()
+        self._marks: Dict[int, int] = {}
+        self._seq = itertools.count()
+        self._closed = False
+        self._not_empty = asyncio.Event()
+
+        # 統計
+        self.enqueued = 0
+        self.sent = 0
+        self.dropped_audio = 0
+        self.dropped_marks = 0
+        self.max_depth = 0
+
+    def put_audio(self, message: str) -> None:
+        """加入音訊訊息，佇列已滿時丟棄最舊的音訊（與其 mark）"""
+        if self._closed:
+            return
+        if len(self._audio) >= self.max_audio:
+            self._drop_oldest_audio()
+        self._audio.append(self._append(message, AUDIO))
+
+    def put_mark(self, message: str) -> None:
+        """加入跟隨音訊的 mark：前一則訊息是仍在佇列中的音訊時，與該音訊一起被丟棄或清除"""
+        if self._closed:
+            return
+        last_seq = next(reversed(self._items), None)
+        seq = self._append(message, MARK)
+        if last_seq is not None and self._audio and self._audio[-1] == last_seq:
+            self._marks[last_seq] = seq
+
+    def put_control(self, message: str) -> None:
+        """加入控制訊息，不受上限限制"""
+        if self._closed:
+            return
+        self._append(message, CONTROL)
+
+    def _append(self, message: str, kind: str) -> int:
+        seq = next(self._seq)
+        self._items[seq] = (message, kind)
+        self.enqueued += 1
+        if len(self._items) > self.max_depth:
+            self.max_depth = len(self._items)
+        self._not_empty.set()
+        return seq
+
+    def _drop_oldest_audio(self) -> None:
+        seq = self._audio.popleft()
+        del self._items[seq]
+        self.dropped_audio += 1
+        mark_seq = self._marks.pop(seq, None)
+        if mark_seq is not None:
+            del self._items[mark_seq]
+            self.dropped_marks += 1
+
+    def clear_audio(self) -> int:
+        """丟棄所有尚未送出的音訊與 mark（保留控制訊息），回傳丟棄數量"""
+        remaining = OrderedDict((seq, item) for seq, item in self._items.items() if item[1] == CONTROL)
+        cleared = len(self._items) - len(remaining)
+        if cleared:
+            self._items = remaining
+            self._audio.clear()
+            self._marks.clear()
+        return cleared
+
+    def close(self) -> None:
+        """不再接受新訊息，drain_to() 送完剩餘訊息後結束"""
+        self._closed = True
+        self._not_empty.set()
+
+    async def get(self) -> Optional[str]:
+        """取出下一則訊息，佇列關閉且已清空時回傳 None"""
+        while not self._items:
+            if self._closed:
+                return None
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        seq, (message, kind) = self._items.popitem(last=False)
+        if kind == AUDIO:
+            # 音訊依序送出，送出的一定是最舊的一則；其 mark 之後照常送出
+            self._audio.popleft()
+            self._marks.pop(seq, None)
+        return message
+
+    async def drain_to(self, send: Callable[[str], Awaitable[None]]) -> None:
+        """持續將佇列中的訊息寫入對端，直到佇列關閉"""
+        try:
+            while (message := await self.get()) is not None:
+                await send(message)
+                self.sent += 1
+        except Exception as e:
+            logger.error(f"Error sending from relay queue {self.name}: {str(e)}")
+        finally:
+            self.close()
+
+    @property
+    def depth(self) -> int:
+        return len(self._items)
+
+    def stats(self) -> dict:
+        """佇列深度與丟棄統計"""
+        return {
+            "depth": len(self._items),
+            "max_depth": self.max_depth,
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "dropped_audio": self.dropped_audio,
+            "dropped_marks": self.dropped_marks,
+        }
@@ -1,51 +1,417 @@
-from typing import Dict, Any
+import heapq
+import json
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ..config import settings
 from ..utils.log_utils import setup_logger
+from ..utils.metrics import Counter
 
 logger = setup_logger("[SessionStore]")
 
+SESSION_STORE_EVICTIONS = Counter(
+    "session_store_evictions", "In-memory session store entries removed before being cleared", ("reason",)
+)
+EXPIRED_EVICTIONS = SESSION_STORE_EVICTIONS.labels("expired")
+CAPACITY_EVICTIONS = SESSION_STORE_EVICTIONS.labels("capacity")
+
+class CallRecord:
+    """單通電話的記錄：/makecall 建立，通話後擷取時更新"""
+    __slots__ = ("to_number", "project_id", "project_prompts", "session_id", "transcript", "parsed_content")
+
+    def __init__(
+        self,
+        to_number: Optional[str] = None,
+        project_id: Optional[str] = None,
+        project_prompts: str = "",
+        session_id: Optional[str] = None,
+        transcript: Optional[List[str]] = None,
+        parsed_content: Optional[Dict[str, Any]] = None
+    ):
+        self.to_number = to_number
+        self.project_id = project_id
+        self.project_prompts = project_prompts
+        self.session_id = session_id
+        self.transcript = transcript if transcript is not None else []
+        self.parsed_content = parsed_content if parsed_content is not None else {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CallRecord":
+        return cls(**{name: data[name] for name in cls.__slots__ if name in data})
+
+    def __repr__(self) -> str:
+        return f"CallRecord({self.to_dict()!r})"
+
+class SessionBackend(ABC):
+    """
+    SessionStore 的儲存後端：session_id -> call_sid 對應，以及 call_sid -> 通話記錄
+
+    /makecall、/twiml 與 /media-stream/{session_id} 可能落在不同的 worker 或節點，
+    多 worker 部署時需使用共用的後端（例如 Redis）。所有 key 都有 TTL，
+    沒走到通話後擷取的通話（未接、忙線、語音信箱）也不會一直留著。
+    """
+
+    @abstractmethod
+    async def get_call_sid(self, session_id: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    async def get_call_record(self, call_sid: str) -> Optional[CallRecord]:
+        ...
+
+    @abstractmethod
+    async def get_session(self, session_id: str) -> Tuple[Optional[str], Optional[CallRecord]]:
+        """session_id 對應的 (call_sid, 通話記錄)，/twiml 與 /media-stream 每個請求只需一次查詢"""
+        ...
+
+    @abstractmethod
+    async def set_session(self, session_id: str, call_sid: str, record: CallRecord) -> None:
+        ...
+
+    @abstractmethod
+    async def set_call_sid(self, session_id: str, call_sid: str) -> None:
+        ...
+
+    @abstractmethod
+    async def set_call_record(self, call_sid: str, record: CallRecord) -> None:
+        ...
+
+    @abstractmethod
+    async def expire_call_record(self, call_sid: str, ttl_sec: float) -> bool:
+        """將通話記錄的剩餘時間縮短為 ttl_sec（已經更短時不變）"""
+        ...
+
+    @abstractmethod
+    async def clear_session(self, session_id: str) -> bool:
+        ...
+
+    @abstractmethod
+    async def clear_call_record(self, call_sid: str) -> bool:
+        ...
+
+    def stats(self) -> dict:
+        return {}
+
+    async def close(self) -> None:
+        pass
+
+class InMemorySessionBackend(SessionBackend):
+    """
+    單一 process 內的 dict，只適用單一 worker
+
+    過期時間以 heap 索引：(到期時間, 序號, key)。每次操作時從 heap 頂端移除已到期的 key，
+    沒有到期的 key 時只需看一次 heap 頂端；key 重新寫入或縮短 TTL 時舊的 heap 項目留著，
+    彈出時與 _deadlines 比對後略過，heap 過大時重建。
+    超過 max_entries 時先移除最快到期的 key（0 為不限制）。
+    """
+
+    def __init__(self, ttl_sec: float, max_entries: int = 0, clock: Callable[[], float] = time.monotonic):
+        self.ttl_sec = ttl_sec
+        self.max_entries = max_entries
+        self.clock = clock
+        self.temp_session_map: Dict[str, str] = {}
+        self.call_records: Dict[str, CallRecord] = {}
+        self._deadlines: Dict[Tuple[str, str], float] = {}
+        self._heap: List[Tuple[float, int, Tuple[str, str]]] = []
+        self._seq = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def _maps(self, kind: str) -> dict:
+        return self.temp_session_map if kind == "session" else self.call_records
+
+    def _schedule(self, key: Tuple[str, str], deadline: float) -> None:
+        self._deadlines[key] = deadline
+        self._seq += 1
+        heapq.heappush(self._heap, (deadline, self._seq, key))
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._heap = [(d, seq, k) for d, seq, k in self._heap if self._deadlines.get(k) == d]
+            heapq.heapify(self._heap)
+
+    def _remove(self, key: Tuple[str, str]) -> bool:
+        if self._deadlines.pop(key, None) is None:
+            return False
+        del self._maps(key[0])[key[1]]
+        return True
+
+    def _pop_head(self) -> Optional[Tuple[str, str]]:
+        """彈出 heap 頂端仍有效的 key"""
+        while self._heap:
+            deadline, _, key = heapq.heappop(self._heap)
+            if self._deadlines.get(key) == deadline:
+                return key
+        return None
+
+    def _sweep(self) -> None:
+        now = self.clock()
+        while self._heap and self._heap[0][0] <= now:
+            deadline, _, key = heapq.heappop(self._heap)
+            if self._deadlines.get(key) == deadline:
+                self._remove(key)
+                self.expired += 1
+                EXPIRED_EVICTIONS.inc()
+
+    def _put(self, kind: str, name: str, value) -> None:
+        self._maps(kind)[name] = value
+        self._schedule((kind, name), self.clock() + self.ttl_sec)
+        while self.max_entries and len(self._deadlines) > self.max_entries:
+            key = self._pop_head()
+            self._remove(key)
+            self.evicted += 1
+            CAPACITY_EVICTIONS.inc()
+            logger.warning(f"Session store full ({self.max_entries} entries), evicted {key[0]} {key[1]}")
+
+    async def get_call_sid(self, session_id: str) -> Optional[str]:
+        self._sweep()
+        return self.temp_session_map.get(session_id)
+
+    async def get_call_record(self, call_sid: str) -> Optional[CallRecord]:
+        self._sweep()
+        return self.call_records.get(call_sid)
+
+    async def get_session(self, session_id: str) -> Tuple[Optional[str], Optional[CallRecord]]:
+        self._sweep()
+        call_sid = self.temp_session_map.get(session_id)
+        return call_sid, self.call_records.get(call_sid) if call_sid else None
+
+    async def set_session(self, session_id: str, call_sid: str, record: CallRecord) -> None:
+        self._sweep()
+        self._put("session", session_id, call_sid)
+        self._put("call", call_sid, record)
+
+    async def set_call_sid(self, session_id: str, call_sid: str) -> None:
+        self._sweep()
+        self._put("session", session_id, call_sid)
+
+    async def set_call_record(self, call_sid: str, record: CallRecord) -> None:
+        self._sweep()
+        self._put("call", call_sid, record)
+
+    async def expire_call_record(self, call_sid: str, ttl_sec: float) -> bool:
+        self._sweep()
+        key = ("call", call_sid)
+        deadline = self._deadlines.get(key)
+        if deadline is None:
+            return False
+        if self.clock() + ttl_sec < deadline:
+            self._schedule(key, self.clock() + ttl_sec)
+        return True
+
+    async def clear_session(self, session_id: str) -> bool:
+        self._sweep()
+        return self._remove(("session", session_id))
+
+    async def clear_call_record(self, call_sid: str) -> bool:
+        self._sweep()
+        return self._remove(("call", call_sid))
+
+    def stats(self) -> dict:
+        self._sweep()
+        return {
+            "backend": "memory",
+            "sessions": len(self.temp_session_map),
+            "call_records": len(self.call_records),
+            "max_entries": self.max_entries,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "index_size": len(self._heap),
+        }
+
+# KEYS[1]：session key；ARGV[1]：通話記錄 key 的前綴。沒有 session 時回傳空陣列
+GET_SESSION_SCRIPT = """
+local call_sid = redis.call('GET', KEYS[1])
+if not call_sid then
+    return {}
+end
+return {call_sid, redis.call('GET', ARGV[1] .. call_sid)}
+"""
+
+class RedisSessionBackend(SessionBackend):
+    """
+    Redis 協定的共用後端
+
+    每個 key 以 SET ... EX 寫入，值與 TTL 一次設定，不會留下沒有過期時間的 key；
+    /makecall 的 session 對應與通話記錄以 MULTI/EXEC 一起寫入，另一個 worker 不會只讀到一半。
+    get_session() 以 Lua script 在一次往返內讀取 session 對應與通話記錄；script 讀取的通話記錄 key
+    由 session 的值組出，Redis Cluster 下需以 key_prefix 的 hash tag（例如 "{voice}:"）放在同一個 slot。
+    通話記錄以 JSON 儲存。過期與記憶體上限由 Redis 本身（TTL、maxmemory-policy）處理。
+
+    client 需提供 redis.asyncio.Redis 的 get / set / expire / delete / pipeline / register_script 介面，
+    未指定時依 url 建立（需安裝 redis 套件）；測試可傳入 in-process 的 fake。
+    """
+
+    def __init__(self, url: str, ttl_sec: int, key_prefix: str = "", client=None):
+        if client is None:
+            # 只有使用 Redis 後端時才需要 redis 套件
+            import redis.asyncio as redis
+            client = redis.from_url(url, decode_responses=True)
+        self.client = client
+        self.ttl_sec = ttl_sec
+        self.key_prefix = key_prefix
+        self._get_session_script = client.register_script(GET_SESSION_SCRIPT)
+
+    def _session_key(self, session_id: str) -> str:
+        return f"{self.key_prefix}session:{session_id}"
+
+    def _call_key(self, call_sid: str) -> str:
+        return f"{self.key_prefix}call:{call_sid}"
+
+    @staticmethod
+    def _decode_record(value) -> Optional[CallRecord]:
+        return CallRecord.from_dict(json.loads(value)) if value else None
+
+    async def get_call_sid(self, session_id: str) -> Optional[str]:
+        value = await self.client.get(self._session_key(session_id))
+        if isinstance(value, bytes):
+            value = value.decode()
+        return value
+
+    async def get_call_record(self, call_sid: str) -> Optional[CallRecord]:
+        return self._decode_record(await self.client.get(self._call_key(call_sid)))
+
+    async def get_session(self, session_id: str) -> Tuple[Optional[str], Optional[CallRecord]]:
+        result = await self._get_session_script(keys=[self._session_key(session_id)], args=[self._call_key("")])
+        if not result:
+            return None, None
+        call_sid = result[0].decode() if isinstance(result[0], bytes) else result[0]
+        return call_sid, self._decode_record(result[1] if len(result) > 1 else None)
+
+    async def set_session(self, session_id: str, call_sid: str, record: CallRecord) -> None:
+        pipe = self.client.pipeline(transaction=True)
+        pipe.set(self._session_key(session_id), call_sid, ex=self.ttl_sec)
+        pipe.set(self._call_key(call_sid), json.dumps(record.to_dict()), ex=self.ttl_sec)
+        await pipe.execute()
+
+    async def set_call_sid(self, session_id: str, call_sid: str) -> None:
+        await self.client.set(self._session_key(session_id), call_sid, ex=self.ttl_sec)
+
+    async def set_call_record(self, call_sid: str, record: CallRecord) -> None:
+        await self.client.set(self._call_key(call_sid), json.dumps(record.to_dict()), ex=self.ttl_sec)
+
+    async def expire_call_record(self, call_sid: str, ttl_sec: float) -> bool:
+        # EXPIRE ... LT：只在新的 TTL 比較短時更新
+        return bool(await self.client.expire(self._call_key(call_sid), max(1, int(ttl_sec)), lt=True))
+
+    async def clear_session(self, session_id: str) -> bool:
+        return bool(await self.client.delete(self._session_key(session_id)))
+
+    async def clear_call_record(self, call_sid: str) -> bool:
+        return bool(await self.client.delete(self._call_key(call_sid)))
+
+    def stats(self) -> dict:
+        return {"backend": "redis", "ttl_sec": self.ttl_sec}
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+def create_backend() -> SessionBackend:
+    """依 SESSION_STORE_BACKEND 建立後端（memory / redis）"""
+    if settings.session_store_backend == "redis":
+        logger.info(f"Using Redis session store (ttl={settings.session_store_ttl_sec}s)")
+        return RedisSessionBackend(
+            settings.redis_url,
+            settings.session_store_ttl_sec,
+            settings.session_store_key_prefix
+        )
+    if settings.session_store_backend != "memory":
+        raise ValueError(f"Unknown SESSION_STORE_BACKEND: {settings.session_store_backend}")
+    return InMemorySessionBackend(settings.session_store_ttl_sec, settings.session_store_max_entries)
+
 class SessionStore:
     _instance = None
-    
-    def __new__(cls):
+
+    def __new__(cls, backend: Optional[SessionBackend] = None):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
-            cls._instance.temp_session_map = {}
-            cls._instance.call_records = {}
-            logger.info("SessionStore initialized")
+            cls._instance.backend = backend or create_backend()
+            logger.info(f"SessionStore initialized ({type(cls._instance.backend).__name__})")
         return cls._instance
-    
+
     @classmethod
-    def get_call_sid(cls, session_id: str) -> str:
-        logger.info(f"Getting call_sid for session_id: {session_id}")
-        return cls._instance.temp_session_map.get(session_id)
-    
+    def use_backend(cls, backend: SessionBackend) -> SessionBackend:
+        """替換後端（測試或腳本用），回傳原本的後端"""
+        store = cls()
+        previous, store.backend = store.backend, backend
+        return previous
+
+    @classmethod
+    async def get_call_sid(cls, session_id: str) -> Optional[str]:
+        logger.debug("Getting call_sid for session_id: %s", session_id)
+        return await cls._instance.backend.get_call_sid(session_id)
+
     @classmethod
-    def set_call_sid(cls, session_id: str, call_sid: str):
-        cls._instance.temp_session_map[session_id] = call_sid
+    async def set_call_sid(cls, session_id: str, call_sid: str):
+        await cls._instance.backend.set_call_sid(session_id, call_sid)
         logger.info(f"Session mapping added: {session_id} -> {call_sid}")
-    
+
+    @classmethod
+    async def get_call_record(cls, call_sid: str) -> Optional[CallRecord]:
+        logger.debug("Getting call_record for call_sid: %s", call_sid)
+        return await cls._instance.backend.get_call_record(call_sid)
+
+    @classmethod
+    async def get_session(cls, session_id: str) -> Tuple[Optional[str], Optional[CallRecord]]:
+        """一次查詢取得 session_id 對應的 (call_sid, 通話記錄)，不存在的為 None"""
+        logger.debug("Getting session for session_id: %s", session_id)
+        return await cls._instance.backend.get_session(session_id)
+
     @classmethod
-    def get_call_record(cls, call_sid: str) -> Dict[str, Any]:
-        logger.info(f"Getting call_record for call_sid: {call_sid}")
-        return cls._instance.call_records.get(call_sid, {})
-    
+    async def set_call_record(cls, call_sid: str, record: CallRecord):
+        await cls._instance.backend.set_call_record(call_sid, record)
+        logger.info("Call record added: %s", call_sid)
+        logger.debug("Call record %s: %s", call_sid, record)
+
     @classmethod
-    def set_call_record(cls, call_sid: str, record: Dict[str, Any]):
-        cls._instance.call_records[call_sid] = record
-        logger.info(f"Call record added: {call_sid} -> {record}")
+    async def set_session(cls, session_id: str, call_sid: str, record: CallRecord):
+        """同時寫入 session 對應與通話記錄"""
+        await cls._instance.backend.set_session(session_id, call_sid, record)
+        logger.info(f"Session mapping added: {session_id} -> {call_sid}")
+        logger.debug("Call record %s: %s", call_sid, record)
 
     @classmethod
-    def clear_session(cls, session_id: str):
-        if session_id in cls._instance.temp_session_map:
-            del cls._instance.temp_session_map[session_id]
+    async def clear_session(cls, session_id: str):
+        if await cls._instance.backend.clear_session(session_id):
             logger.info(f"Session mapping removed: {session_id}")
         else:
             logger.info(f"Session mapping not found: {session_id}")
 
     @classmethod
-    def clear_call_record(cls, call_sid: str):
-        if call_sid in cls._instance.call_records:
-            del cls._instance.call_records[call_sid]
+    async def clear_call_record(cls, call_sid: str):
+        if await cls._instance.backend.clear_call_record(call_sid):
             logger.info(f"Call record removed: {call_sid}")
         else:
             logger.info(f"Call record not found: {call_sid}")
+
+    @classmethod
+    async def finish_call(cls, call_sid: str, keep_record_sec: float = 0) -> Optional[str]:
+        """
+        通話到達終止狀態（/call-status）時清理，回傳通話的 session_id（沒有記錄時為 None）
+
+        session 對應立即移除；通話記錄在 keep_record_sec 內保留給仍在排隊的通話後擷取，
+        擷取完成時會自行清除，0 時立即移除（未接、忙線等不會有擷取）。
+        """
+        backend = cls._instance.backend
+        record = await backend.get_call_record(call_sid)
+        if record is None:
+            return None
+        if record.session_id:
+            await backend.clear_session(record.session_id)
+        if keep_record_sec > 0:
+            await backend.expire_call_record(call_sid, keep_record_sec)
+        else:
+            await backend.clear_call_record(call_sid)
+        logger.info(f"Finished call {call_sid} (record kept {keep_record_sec}s)")
+        return record.session_id
+
+    @classmethod
+    def stats(cls) -> dict:
+        return cls._instance.backend.stats()
+
+    @classmethod
+    async def close(cls):
+        if cls._instance is not None:
+            await cls._instance.backend.close()
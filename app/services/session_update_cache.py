@@ -0,0 +1,80 @@
+import copy
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Tuple
+
+import pytz
+
+from utils import get_today_formatted_string
+from ..constants import DEFAULT_TIMEZONE
+from ..services.settings_service import Settings_Init_FromDB
+from ..utils.log_utils import setup_logger
+
+logger = setup_logger("[Session_Update_Cache]")
+
+TIMEZONE = pytz.timezone(DEFAULT_TIMEZONE)
+
+class SessionUpdateCache:
+    """
+    預先序列化的 session.update 訊息快取
+
+    key 為 (project_id, 設定版本, DEFAULT_TIMEZONE 的當地日期)，value 為不可變的 JSON 字串，
+    每通電話只需查表後直接送出。Settings_Init_FromDB 重新載入或日期換日時自動重建。
+    OpenAI Realtime 只接受 text frame，因此快取 str 而非 bytes。
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, Tuple[str, str]]" = OrderedDict()
+        self._today = None
+        self._rollover_at = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def _local_date(self):
+        """當地日期，只在跨過午夜時重新計算"""
+        now = time.time()
+        if now >= self._rollover_at:
+            local_now = datetime.now(TIMEZONE)
+            self._today = local_now.date()
+            next_midnight = TIMEZONE.localize(
+                datetime.combine(self._today + timedelta(days=1), datetime.min.time())
+            )
+            self._rollover_at = next_midnight.timestamp()
+        return self._today
+
+    def get(self, project_id, project_prompts: str) -> str:
+        """取得指定專案的 session.update 訊息"""
+        key = (project_id, Settings_Init_FromDB.settings_version, self._local_date())
+        entry = self._entries.get(key)
+        # 同一個專案的 prompts 在 Supabase 被修改時也要重建
+        if entry is not None and (entry[0] is project_prompts or entry[0] == project_prompts):
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[1]
+
+        self.misses += 1
+        payload = self._build(project_prompts)
+        self._entries[key] = (project_prompts, payload)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return payload
+
+    def _build(self, project_prompts: str) -> str:
+        session_config = copy.deepcopy(Settings_Init_FromDB.SESSION_UPDATE_CONFIG)
+        date_prompts = f"[今日日期]\n{get_today_formatted_string()}"
+        session_config["session"]["instructions"] = (
+            f"{Settings_Init_FromDB.OpenAI_Init_SYSTEM_MESSAGE}\n{project_prompts}\n{date_prompts}"
+        )
+        payload = json.dumps(session_config)
+        logger.info(f"Built session update ({len(payload)} bytes), date prompts: {date_prompts}")
+        return payload
+
+    def invalidate(self) -> None:
+        """清除所有快取"""
+        self._entries.clear()
+
+session_update_cache = SessionUpdateCache()
@@ -18,6 +18,8 @@ class Settings_Init_FromDB:
     waittime_before_call_function_call_closethecall = 0
     chat_completions_system_instructions = ""
     chat_completions_settings = {}
+    # 每次重新載入設定時遞增，作為 session.update 快取的版本
+    settings_version = 0
 
 async def initialize_settings():
     """初始化全局設置"""
@@ -57,6 +59,8 @@ async def initialize_settings():
     Settings_Init_FromDB.chat_completions_system_instructions = global_openai_chat_completions_settings.get('project_prompts', '')
     logger.info(f"Chat completions system instructions: {Settings_Init_FromDB.chat_completions_system_instructions}")
 
+    Settings_Init_FromDB.settings_version += 1
+
     logger.info("[initialize_settings] <<<") 
 
 # 使用設置
@@ -1,31 +1,103 @@
-from supabase import create_client, Client
+import asyncio
+from typing import Dict, Iterable, Optional
+from supabase import AsyncClient
+from supabase.lib.client_options import AsyncClientOptions
 from ..config import settings
+from ..utils.async_cache import AsyncTTLCache
 from ..utils.log_utils import setup_logger
 
 logger = setup_logger("[Supabase_Service]")
 
-supabase: Client = create_client(settings.supabase_url, settings.supabase_key)
+PROJECT_CONFIG_COLUMNS = ['id', 'project_name', 'project_prompts', 'project_custom_json_settings']
 
-async def get_project_settings(project_id: int) -> dict:
-    """獲取項目設置"""
+class SupabaseDB:
+    """
+    非同步的 Supabase 存取層
+
+    所有查詢共用同一個 httpx.AsyncClient 連線池，不會阻塞 event loop；
+    每個請求有逾時上限，同時進行的查詢數由 semaphore 限制，避免突發流量打滿 Supabase。
+    """
+
+    def __init__(self, url: str, key: str, timeout: float, max_concurrency: int):
+        self.client = AsyncClient(url, key, AsyncClientOptions(postgrest_client_timeout=timeout))
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    def table(self, name: str):
+        return self.client.table(name)
+
+    async def execute(self, query):
+        """在並行上限內執行查詢"""
+        async with self._semaphore:
+            return await query.execute()
+
+    async def close(self) -> None:
+        await self.client.postgrest.aclose()
+
+supabase_db = SupabaseDB(
+    settings.supabase_url,
+    settings.supabase_key,
+    timeout=settings.supabase_timeout_sec,
+    max_concurrency=settings.supabase_max_concurrency
+)
+
+# 查詢失敗或找不到時回傳 {}，不寫入快取，下一次呼叫會重新查詢
+project_settings_cache = AsyncTTLCache(
+    "project_settings",
+    ttl=settings.project_settings_cache_ttl_sec,
+    stale_ttl=settings.project_settings_stale_ttl_sec,
+    cache_if=bool
+)
+
+async def get_project_settings(project_id: int, db: Optional[SupabaseDB] = None) -> dict:
+    """獲取項目設置（經由快取，同一個項目同時間只會查詢一次）；db 未指定時使用 process 共用的 supabase_db"""
+    return await project_settings_cache.get(
+        str(project_id), lambda: _fetch_project_settings(project_id, db)
+    )
+
+async def get_projects_settings(project_ids: Iterable[int]) -> Dict[str, dict]:
+    """
+    一次獲取多個項目設置，回傳 {項目ID字串: 設置}，找不到的項目為 {}
+
+    已在快取中的項目直接使用，其餘以單一 id=in.(...) 查詢取得並寫入快取。
+    """
+    keys = list(dict.fromkeys(str(project_id) for project_id in project_ids))
+    results = {}
+    missing = []
+    for key in keys:
+        cached = project_settings_cache.peek(key)
+        if cached is None:
+            missing.append(key)
+        else:
+            results[key] = cached
+
+    if missing:
+        generation = project_settings_cache.generation
+        fetched = await _fetch_projects_settings(missing)
+        for key in missing:
+            project_settings = fetched.get(key, {})
+            project_settings_cache.set(key, project_settings, generation)
+            results[key] = project_settings
+    return results
+
+def invalidate_project_settings(project_id: int = None) -> None:
+    """清除項目設置快取，未指定項目ID時清除全部"""
+    project_settings_cache.invalidate(None if project_id is None else str(project_id))
+
+async def _fetch_project_settings(project_id: int, db: Optional[SupabaseDB] = None) -> dict:
+    """向 Supabase 查詢項目設置"""
+    db = db or supabase_db
     try:
-        columns = ['id', 'project_name', 'project_prompts', 'project_custom_json_settings']
-        response = supabase.table('ProjectConfigs') \
-            .select(','.join(columns)) \
-            .eq('id', project_id) \
-            .execute()
+        response = await db.execute(
+            db.table('ProjectConfigs')
+            .select(','.join(PROJECT_CONFIG_COLUMNS))
+            .eq('id', project_id)
+        )
         
         if not response.data:
             logger.error(f"未找到項目ID {project_id} 的設置")
             return {}
             
-        project_data = response.data[0]
-        
-        project_settings = {
-            'project_name': project_data.get('project_name'),
-            'project_prompts': project_data.get('project_prompts'),
-            'project_custom_json_settings': project_data.get('project_custom_json_settings')
-        }
+        project_settings = _to_project_settings(response.data[0])
         
         logger.info(f"成功獲取項目 {project_id} ���設置")
         return project_settings
@@ -33,3 +105,25 @@ async def get_project_settings(project_id: int) -> dict:
     except Exception as e:
         logger.error(f"獲取項目設置時發生錯誤: {str(e)}")
         return {}
+
+async def _fetch_projects_settings(project_ids: list) -> Dict[str, dict]:
+    """以單一查詢向 Supabase 取得多個項目設置"""
+    try:
+        response = await supabase_db.execute(
+            supabase_db.table('ProjectConfigs')
+            .select(','.join(PROJECT_CONFIG_COLUMNS))
+            .in_('id', project_ids)
+        )
+        logger.info(f"成功獲取 {len(response.data)}/{len(project_ids)} 個項目的設置")
+        return {str(project_data.get('id')): _to_project_settings(project_data) for project_data in response.data}
+
+    except Exception as e:
+        logger.error(f"批次獲取項目設置時發生錯誤: {str(e)}")
+        return {}
+
+def _to_project_settings(project_data: dict) -> dict:
+    return {
+        'project_name': project_data.get('project_name'),
+        'project_prompts': project_data.get('project_prompts'),
+        'project_custom_json_settings': project_data.get('project_custom_json_settings')
+    }
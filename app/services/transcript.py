@@ -0,0 +1,94 @@
+import time
+from typing import List, Optional
+
+USER = "User"
+AGENT = "Agent"
+
+class TranscriptTurn:
+    """一段發言：說話者、文字、OpenAI item id 與 monotonic 起訖時間"""
+    __slots__ = ("speaker", "text", "item_id", "started_at", "ended_at")
+
+    def __init__(self, speaker: str, text: str, item_id: Optional[str], started_at: float, ended_at: float):
+        self.speaker = speaker
+        self.text = text
+        self.item_id = item_id
+        self.started_at = started_at
+        self.ended_at = ended_at
+
+    def render(self) -> str:
+        return f"{self.speaker}: {self.text}\n"
+
+def _summary(values: List[float]) -> dict:
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "avg": round(sum(values) / len(values), 1),
+        "p50": round(values[(len(values) - 1) // 2], 1),
+        "p90": round(values[int((len(values) - 1) * 0.9)], 1),
+        "max": round(values[-1], 1),
+    }
+
+class Transcript:
+    """
+    單通電話的對話記錄
+
+    每段發言只附加到 list，不在通話中反覆串接字串；
+    需要文字時（擷取、webhook）才由 render() 一次組出。
+    """
+    __slots__ = ("turns",)
+
+    def __init__(self):
+        self.turns: List[TranscriptTurn] = []
+
+    def __len__(self) -> int:
+        return len(self.turns)
+
+    def __bool__(self) -> bool:
+        return bool(self.turns)
+
+    def add(
+        self,
+        speaker: str,
+        text: str,
+        item_id: Optional[str] = None,
+        started_at: Optional[float] = None,
+        ended_at: Optional[float] = None
+    ) -> TranscriptTurn:
+        """附加一段發言，未提供時間時以現在時間記錄"""
+        now = time.monotonic()
+        ended_at = ended_at if ended_at is not None else now
+        turn = TranscriptTurn(speaker, text, item_id, started_at if started_at is not None else ended_at, ended_at)
+        self.turns.append(turn)
+        return turn
+
+    def render(self, start: int = 0, end: Optional[int] = None) -> str:
+        """組出 "User: ...\\nAgent: ...\\n" 格式的文字，start / end 為發言索引範圍"""
+        return "".join(turn.render() for turn in self.turns[start:end])
+
+    def latency_stats(self) -> dict:
+        """
+        每段發言的延遲統計（毫秒）
+
+        response_latency：使用者說完到 agent 開始回應（第一個音訊 delta）的時間，
+        以 agent 開始前最後一段使用者發言的結束時間計算；使用者轉錄可能晚於 agent 回應才完成，
+        所以不依附加順序而依時間比對。
+        """
+        user_ends = sorted(turn.ended_at for turn in self.turns if turn.speaker == USER)
+        response_latency = []
+        agent_duration = []
+        for turn in self.turns:
+            if turn.speaker != AGENT:
+                continue
+            agent_duration.append((turn.ended_at - turn.started_at) * 1000)
+            preceding = [ended_at for ended_at in user_ends if ended_at <= turn.started_at]
+            if preceding:
+                response_latency.append((turn.started_at - preceding[-1]) * 1000)
+        return {
+            "turns": len(self.turns),
+            "user_turns": len(user_ends),
+            "agent_turns": len(agent_duration),
+            "response_latency_ms": _summary(response_latency),
+            "agent_turn_duration_ms": _summary(agent_duration),
+        }
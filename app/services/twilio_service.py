@@ -1,5 +1,9 @@
+import asyncio
+from typing import Optional
 from twilio.twiml.voice_response import VoiceResponse, Connect
 from twilio.rest import Client
+from twilio.http.async_http_client import AsyncTwilioHttpClient
+from twilio.base.exceptions import TwilioRestException
 
 from app.constants import TWILIO_CALLBACK_EVENT_STATUS, TWILIO_VOICE_SETTINGS
 from ..config import settings
@@ -7,9 +11,72 @@ from ..utils.log_utils import setup_logger
 
 logger = setup_logger("[Twilio_Service]")
 
-client = Client(settings.twilio_account_sid, settings.twilio_auth_token)
+class AsyncTwilioRest:
+    """
+    共用的非同步 Twilio REST client
 
-def make_call(to_number: str, twiml_url: str, hostname: str, voice_settings: dict) -> str:
+    使用 SDK 的 AsyncTwilioHttpClient（aiohttp 連線池，keep-alive），
+    呼叫不會佔用 event loop 或 executor 執行緒；每個請求有逾時上限，
+    同時進行的請求數由 semaphore 限制。aiohttp session 必須在 event loop 中建立，
+    因此 client 在第一次使用時才建立。
+    """
+
+    def __init__(
+        self,
+        account_sid: str,
+        auth_token: str,
+        timeout: float,
+        max_concurrency: int,
+        api_base_url: Optional[str] = None
+    ):
+        self.account_sid = account_sid
+        self.auth_token = auth_token
+        self.timeout = timeout
+        self.api_base_url = api_base_url
+        self._client: Optional[Client] = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    @property
+    def client(self) -> Client:
+        if self._client is None:
+            http_client = AsyncTwilioHttpClient(timeout=self.timeout)
+            self._client = Client(self.account_sid, self.auth_token, http_client=http_client)
+            if self.api_base_url:
+                self._client.api.base_url = self.api_base_url
+        return self._client
+
+    async def create_call(self, **kwargs):
+        async with self._semaphore:
+            return await self.client.calls.create_async(**kwargs)
+
+    async def update_call(self, call_sid: str, **kwargs):
+        async with self._semaphore:
+            return await self.client.calls(call_sid).update_async(**kwargs)
+
+    async def fetch_call(self, call_sid: str):
+        async with self._semaphore:
+            return await self.client.calls(call_sid).fetch_async()
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.http_client.close()
+            self._client = None
+
+twilio_rest = AsyncTwilioRest(
+    settings.twilio_account_sid,
+    settings.twilio_auth_token,
+    timeout=settings.twilio_timeout_sec,
+    max_concurrency=settings.twilio_max_concurrency
+)
+
+async def make_call(
+    to_number: str,
+    twiml_url: str,
+    hostname: str,
+    voice_settings: dict,
+    rest: Optional[AsyncTwilioRest] = None
+) -> str:
+    """建立外撥通話，rest 未指定時使用 process 共用的 twilio_rest"""
     # Log all input parameters
     logger.info("Call Parameters:")
     logger.info(f"To Number: {to_number}")
@@ -19,7 +86,7 @@ def make_call(to_number: str, twiml_url: str, hostname: str, voice_settings: dic
     logger.info(f"Twilio Voice Settings: {voice_settings}")
 
     try:
-        call = client.calls.create(
+        call = await (rest or twilio_rest).create_call(
             to=to_number,
             from_=settings.twilio_phone_number,
             url=twiml_url,
@@ -34,6 +101,13 @@ def make_call(to_number: str, twiml_url: str, hostname: str, voice_settings: dic
         )
         logger.info(f"Call initiated. Call SID: {call.sid}")
         return call.sid
+    except TwilioRestException as e:
+        # 429 交給呼叫端退避重試，其他錯誤維持回傳 None
+        if e.status == 429:
+            logger.warning(f"Twilio rate limited call to {to_number}: {str(e)}")
+            raise
+        logger.error(f"Error making call: {str(e)}")
+        return None
     except Exception as e:
         logger.error(f"Error making call: {str(e)}")
         return None
@@ -52,10 +126,16 @@ def generate_twiml(welcome_message: str, host: str, session_id: str, voice_setti
     response.append(connect)
     return str(response)
 
-async def close_call_by_agent(call_sid: str) -> None:
+def generate_busy_twiml() -> str:
+    """以忙線拒接來電（drain 時使用）"""
+    response = VoiceResponse()
+    response.reject(reason="busy")
+    return str(response)
+
+async def close_call_by_agent(call_sid: str, rest: Optional[AsyncTwilioRest] = None) -> None:
     """結束通話"""
     try:
-        client.calls(call_sid).update(status='completed')
+        await (rest or twilio_rest).update_call(call_sid, status='completed')
         logger.info(f"Call {call_sid} has been ended by agent")
     except Exception as e:
         logger.error(f"Error ending call {call_sid}: {str(e)}")
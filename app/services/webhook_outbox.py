@@ -0,0 +1,295 @@
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from ..utils.log_utils import setup_logger
+from ..utils.metrics import LATENCY_BUCKETS, Counter, Gauge, Histogram, histogram_summary
+
+logger = setup_logger("[Webhook_Outbox]")
+
+OUTBOX_DEPTH = Gauge("webhook_outbox_depth", "Webhooks waiting for delivery (pending or in flight)")
+OUTBOX_INFLIGHT = Gauge("webhook_outbox_inflight", "Webhook deliveries currently in flight")
+OUTBOX_DELIVERED = Counter("webhook_outbox_delivered", "Webhooks delivered successfully")
+OUTBOX_FAILED_ATTEMPTS = Counter("webhook_outbox_failed_attempts", "Webhook delivery attempts that failed")
+OUTBOX_DEAD = Counter("webhook_outbox_dead", "Webhooks given up after a permanent error or max attempts")
+OUTBOX_DELIVERY_LATENCY = Histogram(
+    "webhook_outbox_delivery_latency_seconds",
+    "Time from enqueue to successful delivery, including retries",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600)
+)
+OUTBOX_ATTEMPT_DURATION = Histogram(
+    "webhook_outbox_attempt_duration_seconds",
+    "Duration of a single webhook delivery attempt",
+    buckets=LATENCY_BUCKETS
+)
+
+# 5xx 與這些 4xx 會重試，其他 4xx 視為永久錯誤
+RETRYABLE_STATUS_CODES = {408, 425, 429}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS webhook_outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    url TEXT NOT NULL,
+    body TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    next_attempt_at REAL NOT NULL,
+    delivered_at REAL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS webhook_outbox_due ON webhook_outbox (status, next_attempt_at);
+"""
+
+class OutboxJob:
+    __slots__ = ("id", "idempotency_key", "url", "body", "created_at", "attempts")
+
+    def __init__(self, id: int, idempotency_key: str, url: str, body: str, created_at: float, attempts: int):
+        self.id = id
+        self.idempotency_key = idempotency_key
+        self.url = url
+        self.body = body
+        self.created_at = created_at
+        self.attempts = attempts
+
+class WebhookOutbox:
+    """
+    以本機 SQLite 保存的 webhook outbox
+
+    enqueue() 只寫入一筆資料就回傳，通話結束流程不會等待下游回應。
+    背景的 workers 個 worker 負責送出（同時送出數即為 worker 數），失敗時以指數退避加 jitter 重試，
+    超過 max_attempts 或遇到永久性的 4xx 錯誤時標記為 dead。
+    每筆 webhook 有唯一的 idempotency key：重複 enqueue 會被忽略，送出時帶在 Idempotency-Key header，
+    讓接收端可以去除重試造成的重複。行程重啟後，尚未送達的資料會繼續送出。
+    SQLite 操作都在單一專用執行緒執行，不會阻塞 event loop。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        deliver: Callable[[str, str, str], Awaitable[int]],
+        workers: int,
+        max_attempts: int,
+        backoff_base: float,
+        backoff_max: float,
+        retention_sec: float = 86400
+    ):
+        self.path = path
+        self.deliver = deliver
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retention_sec = retention_sec
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="webhook-outbox")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._tasks: List[asyncio.Task] = []
+        self._work_signal: Optional[asyncio.Future] = None
+        self._started = False
+        self._closing = False
+        self._pruned_at = 0.0
+
+        # 統計
+        self.depth = 0
+        self.inflight = 0
+        self.delivered = 0
+        self.failed_attempts = 0
+        self.dead = 0
+
+    async def _run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    async def start(self) -> None:
+        """開啟資料庫並啟動 workers"""
+        if self._started:
+            return
+        self._started = True
+        self._closing = False
+        loop = asyncio.get_running_loop()
+        self._work_signal = loop.create_future()
+        self.depth = await self._run(self._db_open)
+        OUTBOX_DEPTH.set_function(lambda: self.depth)
+        OUTBOX_INFLIGHT.set_function(lambda: self.inflight)
+        self._tasks = [loop.create_task(self._work()) for _ in range(self.workers)]
+        logger.info(f"Webhook outbox started at {self.path} with {self.workers} workers, {self.depth} pending")
+
+    async def enqueue(self, url: str, payload: dict, idempotency_key: str) -> bool:
+        """寫入 outbox 後立即回傳；同一個 idempotency key 已存在時回傳 False"""
+        if not self._started:
+            await self.start()
+        body = json.dumps(payload, ensure_ascii=False)
+        inserted = await self._run(self._db_insert, idempotency_key, url, body, time.time())
+        if not inserted:
+            logger.info(f"Webhook {idempotency_key} already in outbox, skipped")
+            return False
+        self.depth += 1
+        self._notify()
+        logger.info(f"Webhook {idempotency_key} enqueued for {url} ({len(body)} chars)")
+        return True
+
+    def _notify(self) -> None:
+        # 每次通知換一個新的 future，worker 在查詢前取得的 future 不會錯過通知
+        if self._work_signal is not None and not self._work_signal.done():
+            self._work_signal.set_result(None)
+        self._work_signal = asyncio.get_running_loop().create_future()
+
+    async def _work(self) -> None:
+        while not self._closing:
+            signal = self._work_signal
+            try:
+                job, next_due = await self._run(self._db_claim, time.time())
+            except Exception as e:
+                logger.error(f"Error claiming webhook from outbox: {str(e)}")
+                job, next_due = None, None
+            if job is None:
+                timeout = 1.0 if next_due is None else min(1.0, max(0.0, next_due - time.time()))
+                await asyncio.wait({signal}, timeout=timeout)
+                if time.time() - self._pruned_at > 3600:
+                    self._pruned_at = time.time()
+                    await self._run(self._db_prune, time.time() - self.retention_sec)
+                continue
+            await self._attempt(job)
+
+    async def _attempt(self, job: OutboxJob) -> None:
+        self.inflight += 1
+        started_at = time.monotonic()
+        try:
+            status_code = await self.deliver(job.url, job.body, job.idempotency_key)
+            error = None if 200 <= status_code < 300 else f"HTTP {status_code}"
+            retryable = status_code >= 500 or status_code in RETRYABLE_STATUS_CODES
+        except Exception as e:
+            error = f"{type(e).__name__}: {str(e)}"
+            retryable = True
+        finally:
+            self.inflight -= 1
+            OUTBOX_ATTEMPT_DURATION.observe(time.monotonic() - started_at)
+
+        now = time.time()
+        if error is None:
+            await self._run(self._db_mark_delivered, job.id, now)
+            self.depth -= 1
+            self.delivered += 1
+            OUTBOX_DELIVERED.inc()
+            OUTBOX_DELIVERY_LATENCY.observe(now - job.created_at)
+            logger.info(f"Webhook {job.idempotency_key} delivered after {job.attempts} attempt(s)")
+            return
+
+        self.failed_attempts += 1
+        OUTBOX_FAILED_ATTEMPTS.inc()
+        if retryable and job.attempts < self.max_attempts:
+            delay = min(self.backoff_max, self.backoff_base * 2 ** (job.attempts - 1))
+            delay *= random.uniform(0.5, 1.0)
+            await self._run(self._db_mark_retry, job.id, now + delay, error)
+            logger.warning(f"Webhook {job.idempotency_key} attempt {job.attempts} failed ({error}), retry in {delay:.1f}s")
+        else:
+            await self._run(self._db_mark_dead, job.id, error)
+            self.depth -= 1
+            self.dead += 1
+            OUTBOX_DEAD.inc()
+            logger.error(f"Webhook {job.idempotency_key} gave up after {job.attempts} attempt(s): {error}")
+
+    async def stats(self) -> dict:
+        """outbox 深度與送達延遲統計"""
+        oldest_pending_at = await self._run(self._db_oldest_pending) if self._started else None
+        return {
+            "depth": self.depth,
+            "inflight": self.inflight,
+            "delivered": self.delivered,
+            "failed_attempts": self.failed_attempts,
+            "dead": self.dead,
+            "oldest_pending_age_sec": time.time() - oldest_pending_at if oldest_pending_at else None,
+            "delivery_latency_sec": histogram_summary(OUTBOX_DELIVERY_LATENCY),
+        }
+
+    async def close(self, timeout: float = 5.0) -> None:
+        """停止 workers，等待進行中的送出最多 timeout 秒；未送達的資料留待下次啟動"""
+        if not self._started:
+            return
+        self._closing = True
+        self._notify()
+        if self._tasks:
+            _, pending = await asyncio.wait(self._tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self._run(self._db_close)
+        self._started = False
+        logger.info(f"Webhook outbox closed, {self.depth} pending")
+
+    # 以下在專用執行緒執行
+
+    def _db_open(self) -> int:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        # 上次關閉時仍在送出中的資料重新排入
+        self._conn.execute("UPDATE webhook_outbox SET status = 'pending' WHERE status = 'inflight'")
+        return self._conn.execute("SELECT COUNT(*) FROM webhook_outbox WHERE status = 'pending'").fetchone()[0]
+
+    def _db_insert(self, idempotency_key: str, url: str, body: str, now: float) -> bool:
+        cursor = self._conn.execute(
+            "INSERT OR IGNORE INTO webhook_outbox (idempotency_key, url, body, created_at, next_attempt_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (idempotency_key, url, body, now, now)
+        )
+        return cursor.rowcount == 1
+
+    def _db_claim(self, now: float) -> Tuple[Optional[OutboxJob], Optional[float]]:
+        row = self._conn.execute(
+            "UPDATE webhook_outbox SET status = 'inflight', attempts = attempts + 1 "
+            "WHERE id = (SELECT id FROM webhook_outbox WHERE status = 'pending' AND next_attempt_at <= ? "
+            "ORDER BY next_attempt_at LIMIT 1) "
+            "RETURNING id, idempotency_key, url, body, created_at, attempts",
+            (now,)
+        ).fetchone()
+        if row is not None:
+            return OutboxJob(*row), None
+        next_due = self._conn.execute(
+            "SELECT MIN(next_attempt_at) FROM webhook_outbox WHERE status = 'pending'"
+        ).fetchone()[0]
+        return None, next_due
+
+    def _db_mark_delivered(self, job_id: int, now: float) -> None:
+        self._conn.execute(
+            "UPDATE webhook_outbox SET status = 'delivered', delivered_at = ?, last_error = NULL WHERE id = ?",
+            (now, job_id)
+        )
+
+    def _db_mark_retry(self, job_id: int, next_attempt_at: float, error: str) -> None:
+        self._conn.execute(
+            "UPDATE webhook_outbox SET status = 'pending', next_attempt_at = ?, last_error = ? WHERE id = ?",
+            (next_attempt_at, error, job_id)
+        )
+
+    def _db_mark_dead(self, job_id: int, error: str) -> None:
+        self._conn.execute(
+            "UPDATE webhook_outbox SET status = 'dead', last_error = ? WHERE id = ?",
+            (error, job_id)
+        )
+
+    def _db_oldest_pending(self) -> Optional[float]:
+        return self._conn.execute(
+            "SELECT MIN(created_at) FROM webhook_outbox WHERE status IN ('pending', 'inflight')"
+        ).fetchone()[0]
+
+    def _db_prune(self, before: float) -> None:
+        # 已送達的資料只保留 retention_sec，作為 idempotency key 去重的期間
+        self._conn.execute(
+            "DELETE FROM webhook_outbox WHERE status = 'delivered' AND delivered_at < ?", (before,)
+        )
+
+    def _db_close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -1,81 +1,83 @@
-from ..dependencies.auth import get_id_token
+from ..dependencies.auth import get_id_token, id_token_manager
 from ..config import settings
 from ..utils.log_utils import setup_logger
-import httpx
-import os
+from ..utils.http_client import http_clients
+from ..services.webhook_outbox import WebhookOutbox
 
 logger = setup_logger("[WebhookService]")
 
-async def call_webhook(url: str, payload: dict) -> None:
-    """
-    調用 webhook 並處理 Cloud Run 認證
-    """
-    try:
-        headers = {}
-        if settings.environment != 'local':
-            try:
-                # 獲取目標服務的 URL（去除協議前綴）
-                target_audience = url.split('://')[-1].split('/')[0]
-                id_token = await get_id_token(target_audience)
-                headers = {"Authorization": f"Bearer {id_token}"}
-                logger.info("Added IAM authentication token")
-            except Exception as e:
-                logger.error(f"Failed to get IAM token: {str(e)}")
-                raise
+def webhook_audience(url: str) -> str:
+    """獲取目標服務的 URL（去除協議前綴）作為 ID token 的 audience"""
+    return url.split('://')[-1].split('/')[0]
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                url,
-                json=payload,
-                headers=headers,
-                timeout=30.0
-            )
-            
-            logger.info(f"Webhook response: {response.status_code}")
-            if response.status_code != 200:
-                logger.error(f"Webhook error: {response.text}")
-                
+async def get_auth_headers(url: str) -> dict:
+    """非本機環境時加上 Cloud Run 的 IAM 認證 header"""
+    if settings.environment == 'local':
+        return {}
+    try:
+        id_token = await get_id_token(webhook_audience(url))
+        logger.info("Added IAM authentication token")
+        return {"Authorization": f"Bearer {id_token}"}
     except Exception as e:
-        logger.error(f"Error calling webhook: {str(e)}")
+        logger.error(f"Failed to get IAM token: {str(e)}")
         raise
 
+async def deliver_webhook(url: str, body: str, idempotency_key: str) -> int:
+    """outbox 的送出函式：送出已序列化的 JSON，回傳 HTTP 狀態碼"""
+    headers = await get_auth_headers(url)
+    headers["Content-Type"] = "application/json"
+    headers["Idempotency-Key"] = idempotency_key
+    response = await http_clients.get("webhook").post(
+        url,
+        content=body.encode('utf-8'),
+        headers=headers,
+        timeout=30.0
+    )
+    logger.info(f"Webhook {idempotency_key} response: {response.status_code}")
+    if response.status_code >= 300:
+        logger.error(f"Webhook error: {response.text}")
+    return response.status_code
+
+def prewarm_webhook_tokens() -> None:
+    """啟動時先取得 webhook 的 ID token"""
+    if settings.environment != 'local':
+        id_token_manager.prewarm({
+            webhook_audience(settings.webhook_url_call_status),
+            webhook_audience(settings.webhook_url_call_result)
+        })
+
+webhook_outbox = WebhookOutbox(
+    settings.webhook_outbox_path,
+    deliver_webhook,
+    workers=settings.webhook_outbox_workers,
+    max_attempts=settings.webhook_outbox_max_attempts,
+    backoff_base=settings.webhook_outbox_backoff_base_sec,
+    backoff_max=settings.webhook_outbox_backoff_max_sec
+)
+
 async def call_webhook_for_call_result(call_sid: str, result: str, transcript: str):
-    """處理通話結果的 webhook"""
+    """處理通話結果的 webhook（寫入 outbox，由背景 worker 送出）"""
     payload = {
         "call_id": call_sid,
         "result": result, 
         "transcript": transcript
     }
     
-    logger.info(f"Calling result webhook with payload: {payload}")
-    await call_webhook(settings.webhook_url_call_result, payload)
+    # payload 含完整對話，只在 DEBUG 時輸出；INFO 由 outbox 記錄 key 與大小
+    logger.debug("Result webhook payload for %s: %s", call_sid, payload)
+    await webhook_outbox.enqueue(settings.webhook_url_call_result, payload, f"call-result:{call_sid}")
 
 async def call_webhook_for_call_status(call_sid: str, status: str, timestamp: str):
+    """通話狀態的 webhook（寫入 outbox，由背景 worker 送出）"""
     try:
         payload = {
             "call_id": call_sid,
             "status": status, 
             "timestamp": timestamp
         }
-        logger.info(f"Calling webhook with payload: {payload}")
-
-        headers = {}
-        environment = os.getenv('ENV', 'local')
-        if environment != 'local':
-            target_audience =settings.webhook_url_call_status.split('://')[-1].split('/')[0]
-            id_token = await get_id_token(target_audience)
-            headers = {"Authorization": f"Bearer {id_token}"}
-
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                settings.webhook_url_call_status,
-                json=payload,
-                headers=headers,
-                timeout=30.0
-            )
-            if response.status_code != 200:
-                logger.error(f"Webhook error: {response.text}")
+        logger.debug("Status webhook payload for %s: %s", call_sid, payload)
+        await webhook_outbox.enqueue(settings.webhook_url_call_status, payload, f"call-status:{call_sid}:{status}")
                 
     except Exception as e:
         logger.error(f"Error calling webhook: {str(e)}")
-        raise 
\ No newline at end of file
+        raise
@@ -1,99 +1,324 @@
 import json
-import base64
+import time
+from typing import Optional
 from fastapi import WebSocket
 import websockets
 from ..config import settings
 from ..utils.log_utils import setup_logger
-from ..services import openai_service, call_service
-from ..services.call_service import CallService
+from ..utils.metrics import LATENCY_BUCKETS, Counter, Gauge, Histogram
+from ..services import openai_service
+from ..services.call_service import CallService, call_service as default_call_service
+from ..services.extraction_queue import extraction_queue
+from ..services.incremental_extraction import IncrementalExtractor
+from ..services.session_store import SessionStore
+from ..services.transcript import Transcript, USER, AGENT
+from ..services.audio_relay import TwilioMediaFrame, base64_decoded_length
+from ..services.audio_coalescer import InboundAudioCoalescer, ULAW_BYTES_PER_MS
+from ..services.relay_queue import RelayQueue
+from ..services.openai_event_router import OpenAIEventRouter, extract_string_field
 from datetime import datetime
 import pytz
 from ..constants import DEFAULT_TIMEZONE, OpenAIEventTypes
 
 logger = setup_logger("[WebSocket_Service]")
+# 每則 OpenAI 事件 / 每個音訊 frame 都會觸發的 log 分成獨立類別，可用 LOG_LEVELS / LOG_SAMPLING 個別調整
+event_logger = setup_logger("[WebSocket_Service].events")
+frame_logger = setup_logger("[WebSocket_Service].frames")
+
+# 進行中的媒體串流：session_id -> WebSocketManager
+active_streams = {}
+
+# 延遲與流量指標；每個 frame 都會更新的 counter 先取出子 metric，relay 迴圈中只做一次加法
+CALLS_ACTIVE = Gauge("calls_active", "Media streams currently relayed")
+CALLS_ACTIVE.set_function(lambda: len(active_streams))
+CALLS_STARTED = Counter("calls_started", "Media streams started (Twilio start event)")
+RELAY_FRAMES = Counter("relay_frames", "Audio frames relayed", ["direction"])
+RELAY_BYTES = Counter("relay_bytes", "Decoded audio bytes relayed", ["direction"])
+FRAMES_IN = RELAY_FRAMES.labels("twilio_to_openai")
+FRAMES_OUT = RELAY_FRAMES.labels("openai_to_twilio")
+BYTES_IN = RELAY_BYTES.labels("twilio_to_openai")
+BYTES_OUT = RELAY_BYTES.labels("openai_to_twilio")
+TURN_LATENCY = Histogram(
+    "call_turn_latency_seconds",
+    "User speech_stopped until the first audio delta of the next response",
+    buckets=LATENCY_BUCKETS
+)
+TIME_TO_FIRST_AUDIO = Histogram(
+    "call_time_to_first_audio_seconds",
+    "OpenAI response.created until its first audio delta",
+    buckets=LATENCY_BUCKETS
+)
+RESPONSE_DURATION = Histogram(
+    "call_response_duration_seconds",
+    "OpenAI response.created until response.done",
+    buckets=LATENCY_BUCKETS
+)
+CALL_SETUP = Histogram(
+    "call_setup_seconds",
+    "Media stream websocket accepted until the first audio delta sent to the caller",
+    ["prewarmed"],
+    buckets=LATENCY_BUCKETS
+)
+CALL_DURATION = Histogram(
+    "call_duration_seconds",
+    "Twilio stream start until stop",
+    buckets=(5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+)
 
 class WebSocketManager:
-    def __init__(self):
+    def __init__(self, call_service: Optional[CallService] = None):
+        # 掛斷通話等 Twilio 操作使用路由注入的 CallService
+        self.call_service = call_service or default_call_service
         self.stream_sid = None
+        self.media_frame = None
         self.call_sid = None
-        self.all_transcript = ""
+        self.transcript = Transcript()
+        self.incremental = None
         self.pending_close_call = False
+        self.websocket_twilio = None
+        self.websocket_openai = None
+        self.inbound_audio = None
+        self.to_openai = RelayQueue("to_openai", settings.relay_queue_max_audio_to_openai)
+        self.to_twilio = RelayQueue("to_twilio", settings.relay_queue_max_audio_to_twilio)
+        # 插話（barge-in）狀態：目前播放中的 assistant item 與已送出/已播放的音訊 bytes
+        self.playing_item_id = None
+        self.playing_sent_bytes = 0
+        self.playing_played_bytes = 0
+        self.pending_marks = 0
+        self.interrupted_item_id = None
+        self.interruptions = 0
+        # 對話記錄的時間點：使用者開始/停止說話、目前回應的第一個音訊 delta
+        self.speech_started_at = None
+        self.speech_stopped_at = None
+        self.response_item_id = None
+        self.response_started_at = None
+        # 延遲指標的時間點：本回合使用者停止說話、目前回應的 response.created
+        self.turn_speech_stopped_at = None
+        self.response_created_at = None
+        # 連線建立方式與 media stream 接受連線（沒有時為 stream start）到第一個音訊 delta 的時間；
+        # 從接受連線起算才會包含未預熱時的 OpenAI 連線與 session.update
+        self.prewarmed = False
+        self.connected_at = None
+        self.stream_started_at = None
+        self.time_to_first_audio_ms = None
+        self.event_router = self.build_event_router()
+
+    def build_event_router(self) -> OpenAIEventRouter:
+        """註冊 OpenAI 事件 handler，音訊 delta 走不解析 JSON 的快速路徑"""
+        router = OpenAIEventRouter()
+        router.on_raw(OpenAIEventTypes.RESPONSE_AUDIO_DELTA, self.handle_audio_delta)
+        router.on(OpenAIEventTypes.SESSION_UPDATED, self.handle_session_updated)
+        router.on(OpenAIEventTypes.SPEECH_STARTED, self.handle_speech_started)
+        router.on(OpenAIEventTypes.SPEECH_STOPPED, self.handle_speech_stopped)
+        router.on(OpenAIEventTypes.RESPONSE_CREATED, self.handle_response_created)
+        router.on(OpenAIEventTypes.TRANSCRIPTION_COMPLETED, self.handle_transcription)
+        router.on(OpenAIEventTypes.RESPONSE_DONE, self.handle_response_done)
+        router.on(OpenAIEventTypes.CONVERSATION_ITEM_CREATED, self.handle_conversation_item)
+        router.on(OpenAIEventTypes.ERROR, self.handle_error)
+        router.on(OpenAIEventTypes.CONNECTION_CLOSED, self.handle_openai_connection_closed)
+        return router
 
     async def handle_twilio_message(self, message: str, websocket_openai: websockets.WebSocketClientProtocol) -> None:
         """處理來自 Twilio 的消息"""
         data = json.loads(message)
-        #logger.info(f"Received Twilio message: {data}")
+        frame_logger.debug("Twilio %s event (%d bytes)", data['event'], len(message))
         if data['event'] == 'media':
             if websocket_openai.open:
-                audio_append = {
-                    "type": "input_audio_buffer.append",
-                    "audio": data['media']['payload']
-                }
-                await websocket_openai.send(json.dumps(audio_append))
+                if self.inbound_audio is None:
+                    self.inbound_audio = InboundAudioCoalescer(
+                        self.send_audio_to_openai,
+                        settings.inbound_audio_coalesce_ms,
+                        settings.inbound_audio_max_delay_ms
+                    )
+                payload = data['media']['payload']
+                FRAMES_IN.inc()
+                BYTES_IN.inc(base64_decoded_length(payload))
+                await self.inbound_audio.push(payload)
                 
+        elif data['event'] == 'mark':
+            # 每個 agent 音訊 delta 都有播放位置的 mark，只有其他 mark 才立即送出累積的音訊，
+            # 否則 agent 說話時合併形同停用
+            if not self.handle_mark(data.get('mark', {}).get('name', '')):
+                if self.inbound_audio and websocket_openai.open:
+                    await self.inbound_audio.flush()
+
         elif data['event'] == 'start':
             self.stream_sid = data['start']['streamSid']
+            self.media_frame = TwilioMediaFrame(self.stream_sid)
             self.call_sid = data['start']['callSid']
+            self.stream_started_at = time.monotonic()
+            CALLS_STARTED.inc()
             logger.info(f"Stream started - SID: {self.stream_sid}, Call SID: {self.call_sid}")
             
         elif data['event'] == 'stop':
+            if self.stream_started_at is not None:
+                CALL_DURATION.observe(time.monotonic() - self.stream_started_at)
             logger.info(f"Stream stopped: {data.get('stop', {})}")
+            if self.inbound_audio:
+                if websocket_openai.open:
+                    await self.inbound_audio.flush()
+                self.inbound_audio.close()
+                logger.info(f"Inbound audio coalescing for call_sid {self.call_sid}: {self.inbound_audio.stats()}")
             await self.handle_connection_close(websocket_openai)
 
+    async def send_audio_to_openai(self, message: str) -> None:
+        """音訊訊息放入送往 OpenAI 的佇列"""
+        self.to_openai.put_audio(message)
+
     async def handle_openai_message(self, message: str, websocket_twilio: WebSocket, websocket_openai: websockets.WebSocketClientProtocol) -> None:
         """處理來自 OpenAI 的消息"""
-        response = json.loads(message)
-        #logger.info(f"Received OpenAI message: {response}")
-        
-        match response['type']:
-            case OpenAIEventTypes.SESSION_UPDATED:
-                logger.info("Session updated successfully: %s", response)
-                
-            case OpenAIEventTypes.RESPONSE_AUDIO_DELTA if response.get('delta'):
-                await self.handle_audio_response(response, websocket_twilio)
-                
-            case OpenAIEventTypes.TRANSCRIPTION_COMPLETED:
-                await self.handle_transcription(response)
-                
-            case OpenAIEventTypes.RESPONSE_DONE:
-                await self.handle_response_done(response)
-                
-            case OpenAIEventTypes.CONVERSATION_ITEM_CREATED:
-                await self.handle_conversation_item(response)
-                
-            case OpenAIEventTypes.ERROR:
-                logger.error(f"OpenAI Error: {response.get('error', 'Unknown error')}")
+        self.websocket_twilio = websocket_twilio
+        self.websocket_openai = websocket_openai
+        frame_logger.debug("OpenAI message (%d bytes)", len(message))
+        await self.event_router.dispatch(message)
 
-            case OpenAIEventTypes.CONNECTION_CLOSED:
-                await self.handle_connection_close(websocket_openai)
+    async def handle_session_updated(self, response: dict) -> None:
+        """處理 session 更新完成事件"""
+        event_logger.info("Session updated successfully")
+        event_logger.debug("Session: %s", response)
 
-            #case _:
-                #logger.warning(f"Unhandled event type: {response['type']}")
-                #logger.warning(f"Unhandled event response: {response}")
-                
-    async def handle_audio_response(self, response: dict, websocket_twilio: WebSocket) -> None:
-        """處理音頻響應"""
+    async def handle_audio_delta(self, message: str) -> None:
+        """處理音頻 delta，只取出 delta 字串而不解析整個事件"""
+        delta = extract_string_field(message, 'delta')
+        if not delta:
+            return
+        item_id = extract_string_field(message, 'item_id')
+        if item_id == self.interrupted_item_id:
+            # 已被使用者打斷的回應，OpenAI 取消前仍在途中的 delta 直接丟棄
+            return
+        setup_started_at = self.connected_at or self.stream_started_at
+        if self.time_to_first_audio_ms is None and setup_started_at is not None:
+            self.time_to_first_audio_ms = round((time.monotonic() - setup_started_at) * 1000, 1)
+            CALL_SETUP.labels(str(self.prewarmed).lower()).observe(self.time_to_first_audio_ms / 1000)
+            logger.info(
+                f"First audio delta for call_sid {self.call_sid} "
+                f"{self.time_to_first_audio_ms} ms after media stream connected (prewarmed: {self.prewarmed})"
+            )
+        if item_id != self.playing_item_id:
+            now = time.monotonic()
+            if self.turn_speech_stopped_at is not None:
+                TURN_LATENCY.observe(now - self.turn_speech_stopped_at)
+                self.turn_speech_stopped_at = None
+            if self.response_created_at is not None and (
+                self.response_started_at is None or self.response_created_at > self.response_started_at
+            ):
+                # 同一個回應只記錄第一個音訊 item
+                TIME_TO_FIRST_AUDIO.observe(now - self.response_created_at)
+            self.response_item_id = item_id
+            self.response_started_at = now
+            self.playing_item_id = item_id
+            self.playing_sent_bytes = 0
+            self.playing_played_bytes = 0
+            self.pending_marks = 0
+        await self.handle_audio_response(delta, self.websocket_twilio)
+
+        # 每個 delta 之後送出帶有該 delta bytes 的 mark，Twilio 播放到這裡時會回傳同名 mark；
+        # 佇列溢位時 mark 與音訊一起丟棄，回傳的 mark 加總即為實際播放的音訊量
+        delta_bytes = base64_decoded_length(delta)
+        FRAMES_OUT.inc()
+        BYTES_OUT.inc(delta_bytes)
+        self.playing_sent_bytes += delta_bytes
+        self.pending_marks += 1
+        self.to_twilio.put_mark(self.media_frame.render_mark(f"{item_id}:{delta_bytes}"))
+
+    def handle_mark(self, name: str) -> bool:
+        """Twilio 回傳 mark：累計目前 item 已播放的音訊量，是播放位置的 mark 時回傳 True"""
+        item_id, _, played_bytes = name.rpartition(':')
+        if not item_id or not played_bytes.isdigit():
+            return False
+        if item_id == self.playing_item_id:
+            self.playing_played_bytes += int(played_bytes)
+            self.pending_marks = max(self.pending_marks - 1, 0)
+        return True
+
+    async def handle_speech_started(self, response: dict) -> None:
+        """
+        使用者開始說話（插話）
+
+        清空 Twilio 端與佇列中尚未播放的音訊，並將 OpenAI 的 assistant item
+        截斷在實際播放到的位置，讓對話紀錄與使用者聽到的內容一致。
+        """
+        self.speech_started_at = time.monotonic()
+        self.speech_stopped_at = None
+        if not self.playing_item_id or not self.pending_marks:
+            return
+
+        interrupted_at = time.monotonic()
+        cleared = self.to_twilio.clear_audio()
+        self.to_twilio.put_control(self.media_frame.render_clear())
+
+        audio_end_ms = self.playing_played_bytes // ULAW_BYTES_PER_MS
+        self.to_openai.put_control(json.dumps({
+            "type": "conversation.item.truncate",
+            "item_id": self.playing_item_id,
+            "content_index": 0,
+            "audio_end_ms": audio_end_ms
+        }))
+
+        self.interruptions += 1
+        self.interrupted_item_id = self.playing_item_id
+        self.playing_item_id = None
+        self.playing_sent_bytes = 0
+        self.playing_played_bytes = 0
+        self.pending_marks = 0
+        logger.info(
+            f"Barge-in on call_sid {self.call_sid}: truncated {self.interrupted_item_id} at {audio_end_ms} ms, "
+            f"dropped {cleared} queued messages in {(time.monotonic() - interrupted_at) * 1000:.2f} ms"
+        )
+
+    async def handle_speech_stopped(self, response: dict) -> None:
+        """使用者停止說話：作為這段發言的結束時間，也是回合延遲的起點"""
+        self.speech_stopped_at = time.monotonic()
+        self.turn_speech_stopped_at = self.speech_stopped_at
+
+    async def handle_response_created(self, response: dict) -> None:
+        """OpenAI 開始產生回應"""
+        self.response_created_at = time.monotonic()
+
+    async def handle_error(self, response: dict) -> None:
+        """處理 OpenAI 錯誤事件"""
+        logger.error(f"OpenAI Error: {response.get('error', 'Unknown error')}")
+
+    async def handle_openai_connection_closed(self, response: dict) -> None:
+        """處理 OpenAI 連線關閉事件"""
+        await self.handle_connection_close(self.websocket_openai)
+
+    async def handle_audio_response(self, delta: str, websocket_twilio: WebSocket) -> None:
+        """處理音頻響應，將 delta 原樣放入送往 Twilio 的佇列"""
         try:
-            audio_payload = base64.b64encode(base64.b64decode(response['delta'])).decode('utf-8')
-            audio_delta = {
-                "event": "media",
-                "streamSid": self.stream_sid,
-                "media": {
-                    "payload": audio_payload
-                }
-            }
-            await websocket_twilio.send_json(audio_delta)
+            if self.media_frame is None:
+                self.media_frame = TwilioMediaFrame(self.stream_sid)
+            self.to_twilio.put_audio(self.media_frame.render(delta))
         except Exception as e:
             logger.error(f"Error processing audio: {str(e)}")
 
+    def relay_stats(self) -> dict:
+        """每通電話的轉送佇列統計，用來判斷哪一端是瓶頸"""
+        return {
+            "call_sid": self.call_sid,
+            "stream_sid": self.stream_sid,
+            "to_openai": self.to_openai.stats(),
+            "to_twilio": self.to_twilio.stats(),
+            "inbound_audio": self.inbound_audio.stats() if self.inbound_audio else None,
+            "interruptions": self.interruptions,
+            "prewarmed": self.prewarmed,
+            "time_to_first_audio_ms": self.time_to_first_audio_ms,
+            "transcript": self.transcript.latency_stats(),
+        }
+
     async def handle_transcription(self, response: dict) -> None:
         """處理轉錄結果"""
-        user_message = "User: " + response['transcript'].strip()
-        self.all_transcript += user_message + "\n"
-        logger.info(f"Transcription: {user_message}")
+        text = response['transcript'].strip()
+        self.transcript.add(USER, text, response.get('item_id'), self.speech_started_at, self.speech_stopped_at)
+        self.speech_started_at = None
+        self.speech_stopped_at = None
+        event_logger.info("Transcription: User: %s", text)
 
     async def handle_response_done(self, response: dict) -> None:
         """處理響應完成事件"""
+        if self.response_created_at is not None:
+            RESPONSE_DURATION.observe(time.monotonic() - self.response_created_at)
+            self.response_created_at = None
         output = response.get('response', {}).get('output', [])
         if output:
             agent_message = next((
@@ -101,8 +326,18 @@ class WebSocketManager:
                 for content in output[0].get('content', [])
                 if 'transcript' in content
             ), 'Agent message not found')
-            self.all_transcript += "Agent: " + agent_message + "\n"
-            logger.info(f"Agent response: {agent_message}")
+            item_id = output[0].get('id')
+            started_at = self.response_started_at if item_id and item_id == self.response_item_id else None
+            self.transcript.add(AGENT, agent_message, item_id, started_at)
+            if settings.incremental_extraction_enabled:
+                if self.incremental is None:
+                    self.incremental = IncrementalExtractor(
+                        self.call_sid, self.transcript, settings.incremental_extraction_debounce_sec,
+                        chat=extraction_queue.metered(openai_service.make_chat_completion),
+                        final_chat=openai_service.make_chat_completion
+                    )
+                self.incremental.schedule()
+            event_logger.info("Agent response: %s", agent_message)
 
         if self.pending_close_call:
             logger.info(f"Pending close call: {self.pending_close_call} for call_sid: {self.call_sid}")
@@ -110,7 +345,7 @@ class WebSocketManager:
 
     async def handle_conversation_item(self, response: dict) -> None:
         """處理對話項目"""
-        logger.info("Conversation item created")
+        event_logger.info("Conversation item created")
         item = response.get('item', {})
         if item.get('type') == 'function_call' and item.get('name') == 'function_call_closethecall':
             logger.info(f"Received close call function for {self.call_sid}")
@@ -120,20 +355,17 @@ class WebSocketManager:
     async def handle_connection_close(self, websocket_openai: websockets.WebSocketClientProtocol) -> None:
         """處理連接關閉"""
         
-        if self.all_transcript:
-            call_sid = self.call_sid
-            transcript = self.all_transcript
-            service = CallService()
-            await service.process_transcript(
-                call_sid,
-                transcript
-            )
-            logger.info(f"Transcript processed for call_sid: {self.call_sid}")
+        if self.transcript:
+            # Chat Completion 與 webhook 交給擷取佇列處理，不延遲 media stream 的結束
+            logger.info(f"Transcript latency for call_sid {self.call_sid}: {self.transcript.latency_stats()}")
+            call_record = await SessionStore.get_call_record(self.call_sid)
+            project_id = call_record.project_id if call_record else None
+            extraction_queue.submit(self.call_sid, self.transcript.render(), project_id, incremental=self.incremental)
             
         if websocket_openai and not websocket_openai.closed:
             await websocket_openai.close()
 
     async def execute_pending_close_call(self, call_sid: str) -> None:
         """執行掛斷通話"""
-        await call_service.close_call_by_agent(call_sid)
+        await self.call_service.close_call_by_agent(call_sid)
         self.pending_close_call = False 
@@ -0,0 +1,154 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from .log_utils import setup_logger
+
+logger = setup_logger("[Async_Cache]")
+
+class _CacheEntry:
+    __slots__ = ("value", "fetched_at")
+
+    def __init__(self, value: Any, fetched_at: float):
+        self.value = value
+        self.fetched_at = fetched_at
+
+class AsyncTTLCache:
+    """
+    行程內的非同步 TTL 快取
+
+    - ttl 內直接回傳快取值
+    - 過期但仍在 stale_ttl 內時先回傳舊值，並在背景重新載入（stale-while-revalidate）
+    - 同一個 key 同時 miss 時只執行一次 loader，其他呼叫共用結果（single-flight）
+    cache_if 回傳 False 的結果（例如查詢失敗的空結果）不寫入快取。
+    invalidate() 會遞增 generation，之前開始的載入完成後不再寫入，避免寫回已清除的舊值；
+    超過 ttl + stale_ttl 的 entry 在寫入時順便移除。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float,
+        stale_ttl: float = 0.0,
+        cache_if: Callable[[Any], bool] = lambda value: True
+    ):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.cache_if = cache_if
+        self._entries: Dict[Hashable, _CacheEntry] = {}
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.generation = 0
+        self._last_evicted_at = time.monotonic()
+
+        # 統計
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.loads = 0
+        self.load_errors = 0
+        self.evicted = 0
+
+    async def get(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """取得 key 的值，必要時呼叫 loader 載入"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry.fetched_at
+            if age < self.ttl:
+                self.hits += 1
+                return entry.value
+            if age < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                self._load(key, loader)
+                return entry.value
+
+        self.misses += 1
+        # shield：呼叫端被取消時不影響其他等待同一個載入的呼叫端
+        return await asyncio.shield(self._load(key, loader))
+
+    def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return task
+        task = asyncio.ensure_future(self._fetch(key, loader))
+        self._inflight[key] = task
+        task.add_done_callback(self._on_done)
+        return task
+
+    async def _fetch(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        self.loads += 1
+        generation = self.generation
+        task = asyncio.current_task()
+        try:
+            value = await loader()
+        except Exception:
+            self.load_errors += 1
+            raise
+        finally:
+            # invalidate() 之後可能已有新的載入取代這個 task
+            if self._inflight.get(key) is task:
+                del self._inflight[key]
+        self.set(key, value, generation)
+        return value
+
+    def _on_done(self, task: asyncio.Task) -> None:
+        # 背景重新載入失敗時沒有人 await，在這裡取出例外避免警告
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Error loading {self.name} cache entry: {str(task.exception())}")
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """只取未過期的快取值，沒有時回傳 None（不觸發載入）"""
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry.fetched_at >= self.ttl:
+            return None
+        self.hits += 1
+        return entry.value
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None) -> None:
+        """
+        直接寫入快取（例如批次查詢的結果）
+
+        generation 為查詢開始時的 self.generation；之後有 invalidate() 時不寫入。
+        """
+        if generation is not None and generation != self.generation:
+            return
+        now = time.monotonic()
+        if self.cache_if(value):
+            self._entries[key] = _CacheEntry(value, now)
+        if now - self._last_evicted_at >= self.ttl + self.stale_ttl:
+            self._evict_expired(now)
+
+    def _evict_expired(self, now: float) -> None:
+        """移除超過 ttl + stale_ttl、已不會再被使用的 entry"""
+        max_age = self.ttl + self.stale_ttl
+        expired = [key for key, entry in self._entries.items() if now - entry.fetched_at >= max_age]
+        for key in expired:
+            del self._entries[key]
+        self.evicted += len(expired)
+        self._last_evicted_at = now
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """清除指定 key，未指定時清除全部；進行中的載入不再寫入快取，之後的 get() 重新載入"""
+        self.generation += 1
+        if key is None:
+            self._entries.clear()
+            self._inflight.clear()
+        else:
+            self._entries.pop(key, None)
+            self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        """快取命中統計"""
+        return {
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "loads": self.loads,
+            "load_errors": self.load_errors,
+            "evicted": self.evicted,
+        }
@@ -0,0 +1,55 @@
+from typing import Dict
+
+import httpx
+
+from ..config import settings
+from .log_utils import setup_logger
+
+logger = setup_logger("[Http_Client]")
+
+class HttpClientRegistry:
+    """
+    應用程式層級共用的 httpx.AsyncClient
+
+    依用途（webhook、openai 等）各自一個 client，同一個 client 內 httpx 會為每個 host
+    維持各自的 keep-alive 連線池，請求不再每次重新 TCP / TLS handshake。
+    http2 開啟時由 TLS ALPN 協商，目標不支援時自動使用 HTTP/1.1。
+    在 startup 時建立、shutdown 時關閉；尚未 startup 時（例如腳本或測試）第一次使用才建立。
+    """
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    def _create(self, name: str) -> httpx.AsyncClient:
+        logger.info(
+            f"Creating HTTP client '{name}' (http2={settings.http_client_http2}, "
+            f"max_connections={settings.http_client_max_connections}, "
+            f"max_keepalive={settings.http_client_max_keepalive_connections})"
+        )
+        return httpx.AsyncClient(
+            http2=settings.http_client_http2,
+            limits=httpx.Limits(
+                max_connections=settings.http_client_max_connections,
+                max_keepalive_connections=settings.http_client_max_keepalive_connections,
+                keepalive_expiry=settings.http_client_keepalive_expiry_sec
+            ),
+            timeout=settings.http_client_timeout_sec
+        )
+
+    def get(self, name: str = "default") -> httpx.AsyncClient:
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            client = self._clients[name] = self._create(name)
+        return client
+
+    async def startup(self, *names: str) -> None:
+        for name in names:
+            self.get(name)
+
+    async def close(self) -> None:
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            await client.aclose()
+
+http_clients = HttpClientRegistry()
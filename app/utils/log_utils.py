@@ -1,35 +1,175 @@
+"""
+非阻塞的結構化 logging
+
+所有 logger 共用一個 QueueHandler：event loop 上只把 LogRecord 放進佇列，
+格式化（JSON lines）與寫入 console / 檔案都在 QueueListener 的背景執行緒進行。
+
+環境變數：
+    LOG_LEVEL       全域預設等級（預設 INFO）
+    LOG_LEVELS      依 logger 名稱設定等級，例如 "[WebSocket_Service].frames=DEBUG,[SessionStore]=WARNING"
+    LOG_SAMPLING    依 logger 名稱設定 WARNING 以下紀錄的取樣比例，例如 "[WebSocket_Service].events=0.1"
+    LOG_FORMAT      console 輸出格式：json（預設）或 text；檔案固定為 JSON lines
+    LOG_FILE        檔案路徑（預設 logs/app.jsonl），設為空字串則不寫檔
+"""
+import atexit
+import itertools
+import json
 import logging
-from logging.handlers import RotatingFileHandler
 import os
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Optional, TextIO
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# LogRecord 本身的屬性，其餘的（logger.info(..., extra={...})）視為結構化欄位輸出
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+_IMMUTABLE_TYPES = (str, int, float, bool, type(None))
+
+class JsonFormatter(logging.Formatter):
+    """每筆紀錄輸出一行 JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+    def formatTime(self, record: logging.LogRecord, datefmt: Optional[str] = None) -> str:
+        return super().formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}"
+
+class LazyQueueHandler(QueueHandler):
+    """
+    只把 LogRecord 放進佇列，訊息留給背景執行緒組合
+
+    標準 QueueHandler 會在呼叫端先格式化整個訊息；這裡只有參數可能在之後被修改
+    （dict、list 等可變物件）時才先組出字串，%-style 的基本型別參數則延後處理。
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        args = record.args
+        if args and (isinstance(args, dict) or not all(isinstance(arg, _IMMUTABLE_TYPES) for arg in args)):
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            # traceback 會持有整個 stack 的 frame，先轉成文字
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+class SamplingFilter(logging.Filter):
+    """WARNING 以下的紀錄每 N 筆只保留 1 筆，用於每個音訊 frame / 事件都會觸發的 log"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.every = max(1, round(1 / rate)) if rate > 0 else 0
+        self._counter = itertools.count()
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        if self.every and next(self._counter) % self.every == 0:
+            return True
+        self.dropped += 1
+        return False
 
-def setup_logger(logger_name: str) -> logging.Logger:
-    """設置並返回一個配置好的 logger"""
+def _parse_mapping(value: str) -> Dict[str, str]:
+    """解析 "name=value,..."；logger 名稱可能含 "."，以最後一個 "=" 分隔"""
+    mapping = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        name, _, setting = item.rpartition('=')
+        if name:
+            mapping[name.strip()] = setting.strip()
+    return mapping
+
+_default_level = logging.getLevelName(os.getenv('LOG_LEVEL', 'INFO').upper())
+_levels = {name: logging.getLevelName(level.upper()) for name, level in _parse_mapping(os.getenv('LOG_LEVELS', '')).items()}
+_sampling = {name: float(rate) for name, rate in _parse_mapping(os.getenv('LOG_SAMPLING', '')).items()}
+
+_queue: queue.SimpleQueue = queue.SimpleQueue()
+queue_handler = LazyQueueHandler(_queue)
+_listener: Optional[QueueListener] = None
+
+def _build_handlers(console_format: str, file_path: Optional[str], console_stream: Optional[TextIO]) -> list:
+    handlers = []
+    console_handler = logging.StreamHandler(console_stream or sys.stderr)
+    console_handler.setFormatter(JsonFormatter() if console_format == 'json' else logging.Formatter(TEXT_FORMAT))
+    handlers.append(console_handler)
+    if file_path:
+        os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+        file_handler = RotatingFileHandler(file_path, maxBytes=10485760, backupCount=5, encoding='utf-8')  # 10MB
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+    return handlers
+
+def configure(
+    console_format: Optional[str] = None,
+    file_path: Optional[str] = None,
+    console_stream: Optional[TextIO] = None
+) -> None:
+    """（重新）啟動背景寫入執行緒；未指定的參數使用環境變數設定"""
+    global _listener
+    stop()
+    handlers = _build_handlers(
+        console_format or os.getenv('LOG_FORMAT', 'json').lower(),
+        file_path if file_path is not None else os.getenv('LOG_FILE', os.path.join('logs', 'app.jsonl')),
+        console_stream
+    )
+    _listener = QueueListener(_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+def stop() -> None:
+    """寫完佇列中剩下的紀錄並停止背景執行緒"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+atexit.register(stop)
+
+def set_level(logger_name: str, level: int) -> None:
+    """調整單一類別（logger）的等級"""
+    _levels[logger_name] = level
+    logging.getLogger(logger_name).setLevel(level)
+
+def set_sampling(logger_name: str, rate: Optional[float]) -> None:
+    """設定單一類別 WARNING 以下紀錄的取樣比例，None 表示不取樣"""
+    logger = logging.getLogger(logger_name)
+    for log_filter in [f for f in logger.filters if isinstance(f, SamplingFilter)]:
+        logger.removeFilter(log_filter)
+    if rate is None:
+        _sampling.pop(logger_name, None)
+    else:
+        _sampling[logger_name] = rate
+        if rate < 1:
+            logger.addFilter(SamplingFilter(rate))
+
+def setup_logger(logger_name: str, level: Optional[int] = None) -> logging.Logger:
+    """設置並返回一個配置好的 logger；LOG_LEVELS 的設定優先於 level，兩者皆無時使用 LOG_LEVEL"""
     logger = logging.getLogger(logger_name)
-    
-    if not logger.handlers:  # 避免重複添加 handlers
-        logger.setLevel(logging.INFO)
-        
-        # 控制台處理器
-        console_handler = logging.StreamHandler()
-        console_handler.setLevel(logging.INFO)
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-        )
-        console_handler.setFormatter(formatter)
-        logger.addHandler(console_handler)
-        
-        # 可選：文件處理器
-        log_dir = "logs"
-        if not os.path.exists(log_dir):
-            os.makedirs(log_dir)
-            
-        file_handler = RotatingFileHandler(
-            os.path.join(log_dir, f"{logger_name}.log"),
-            maxBytes=10485760,  # 10MB
-            backupCount=5
-        )
-        file_handler.setLevel(logging.INFO)
-        file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
-    
+
+    if queue_handler not in logger.handlers:  # 避免重複添加 handlers
+        if _listener is None:
+            configure()
+        logger.setLevel(_levels.get(logger_name, level if level is not None else _default_level))
+        logger.addHandler(queue_handler)
+        # 子類別（例如 "[WebSocket_Service].frames"）不再傳給上層 logger，避免重複輸出
+        logger.propagate = False
+        if logger_name in _sampling:
+            set_sampling(logger_name, _sampling[logger_name])
+
     return logger
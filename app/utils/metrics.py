@@ -0,0 +1,65 @@
+import math
+from typing import Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+
+__all__ = [
+    "CONTENT_TYPE_LATEST", "REGISTRY", "Counter", "Gauge", "Histogram", "LATENCY_BUCKETS",
+    "render", "sample_value", "histogram_quantile", "histogram_summary",
+]
+
+# 延遲類 histogram 的 bucket（秒），涵蓋 1 ms 到 60 s；prometheus_client 預設只到 10 s
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def render() -> bytes:
+    """/metrics 的 Prometheus text exposition format"""
+    return generate_latest(REGISTRY)
+
+def sample_value(metric, suffix: str = "", **labels) -> float:
+    """metric 指定 sample（例如 counter 的 "_total"）的目前值，沒有時為 0"""
+    for family in metric.collect():
+        for sample in family.samples:
+            if sample.name == family.name + suffix and sample.labels == labels:
+                return sample.value
+    return 0.0
+
+def _buckets(histogram, labels: dict) -> list:
+    """[(上界, 累計數量)]，依上界排序"""
+    buckets = []
+    for family in histogram.collect():
+        for sample in family.samples:
+            if not sample.name.endswith("_bucket"):
+                continue
+            sample_labels = dict(sample.labels)
+            bound = float(sample_labels.pop("le"))
+            if sample_labels == labels:
+                buckets.append((bound, sample.value))
+    return sorted(buckets)
+
+def histogram_quantile(histogram, q: float, **labels) -> Optional[float]:
+    """由 bucket 線性內插估計分位數（與 Prometheus histogram_quantile 相同）"""
+    buckets = _buckets(histogram, labels)
+    count = buckets[-1][1] if buckets else 0
+    if not count:
+        return None
+    rank = q * count
+    previous_bound, previous_count = 0.0, 0.0
+    for bound, cumulative in buckets:
+        if cumulative >= rank and cumulative > previous_count:
+            if bound == math.inf:
+                return previous_bound
+            return previous_bound + (bound - previous_bound) * (rank - previous_count) / (cumulative - previous_count)
+        previous_bound, previous_count = (bound if bound != math.inf else previous_bound), cumulative
+    return previous_bound
+
+def histogram_summary(histogram, **labels) -> dict:
+    """JSON 統計用的摘要"""
+    count = sample_value(histogram, "_count", **labels)
+    total = sample_value(histogram, "_sum", **labels)
+    return {
+        "count": int(count),
+        "avg": total / count if count else None,
+        "p50": histogram_quantile(histogram, 0.5, **labels),
+        "p90": histogram_quantile(histogram, 0.9, **labels),
+        "p99": histogram_quantile(histogram, 0.99, **labels),
+    }
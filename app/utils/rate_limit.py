@@ -0,0 +1,53 @@
+import asyncio
+import time
+
+class TokenBucket:
+    """
+    非同步 token bucket 限流器
+
+    以每秒 rate 個 token 的速度補充，最多累積 capacity 個（允許的突發量）。
+    acquire() 依呼叫順序排隊等待；單次要求超過 capacity 時，等到 bucket 滿後先借用，
+    之後的呼叫會等到欠額補回為止。
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def tokens(self) -> float:
+        self._refill()
+        return self._tokens
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """有足夠 token 時立即扣除並回傳 True，不等待"""
+        self._refill()
+        if self._lock.locked() or self._tokens < min(tokens, self.capacity):
+            return False
+        self._tokens -= tokens
+        return True
+
+    def debit(self, tokens: float) -> None:
+        """事後修正用量：tokens 為正時扣除（可欠額），為負時退回（不超過 capacity）"""
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens - tokens)
+
+    async def acquire(self, tokens: float = 1.0) -> float:
+        """等待直到可以取得 tokens，回傳等待的秒數"""
+        started_at = time.monotonic()
+        async with self._lock:
+            needed = min(tokens, self.capacity)
+            self._refill()
+            while self._tokens < needed:
+                await asyncio.sleep((needed - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= tokens
+        return time.monotonic() - started_at
@@ -0,0 +1,135 @@
+"""
+Twilio -> OpenAI 音訊合併視窗 benchmark
+
+對不同的 INBOUND_AUDIO_COALESCE_MS 設定，報告：
+- 每分鐘通話送往 OpenAI 的訊息數（每則訊息一次 websocket frame / write syscall）
+- 每分鐘通話消耗的 CPU 時間（以不等待的緊密迴圈送往另一行程的本機 websocket server）
+- 以真實 20 ms 節奏送入 frame 時，合併造成的平均 / 最大額外延遲
+
+用法：
+    python -m benchmarks.bench_audio_coalescing --windows 0 40 60 80 120
+"""
+import argparse
+import asyncio
+import base64
+import json
+import multiprocessing
+import os
+import time
+
+from app.services.audio_coalescer import InboundAudioCoalescer
+
+FRAME_MS = 20
+FRAMES_PER_MINUTE = 60 * 1000 // FRAME_MS
+
+def _serve_drain(port, ready) -> None:
+    """在獨立行程跑的 websocket server，只負責讀掉所有訊息"""
+    import websockets
+
+    async def drain(websocket, path=None):
+        async for _ in websocket:
+            pass
+
+    async def serve():
+        async with websockets.serve(drain, "127.0.0.1", port, max_size=None):
+            ready.set()
+            await asyncio.Future()
+
+    asyncio.run(serve())
+
+class FakeOpenAIWebSocket:
+    """連到本機 drain server 的真實 websocket client，送出成本包含 framing、masking 與 write syscall"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.sends = 0
+
+    @classmethod
+    async def connect(cls, port: int) -> "FakeOpenAIWebSocket":
+        import websockets
+        return cls(await websockets.connect(f"ws://127.0.0.1:{port}", max_size=None, compression=None))
+
+    async def send(self, message: str) -> None:
+        self.sends += 1
+        await self.connection.send(message)
+
+    async def close(self) -> None:
+        await self.connection.close()
+
+def twilio_payloads(count: int) -> list[str]:
+    return [base64.b64encode(os.urandom(FRAME_MS * 8)).decode('ascii') for _ in range(count)]
+
+async def cpu_before(payloads: list[str], websocket: FakeOpenAIWebSocket) -> None:
+    for payload in payloads:
+        audio_append = {
+            "type": "input_audio_buffer.append",
+            "audio": payload
+        }
+        await websocket.send(json.dumps(audio_append))
+
+async def cpu_after(payloads: list[str], websocket: FakeOpenAIWebSocket, window_ms: int) -> InboundAudioCoalescer:
+    coalescer = InboundAudioCoalescer(websocket.send, window_ms, window_ms * 2)
+    for payload in payloads:
+        await coalescer.push(payload)
+    await coalescer.flush()
+    coalescer.close()
+    return coalescer
+
+async def paced_latency(payloads: list[str], window_ms: int, port: int) -> InboundAudioCoalescer:
+    websocket = await FakeOpenAIWebSocket.connect(port)
+    coalescer = InboundAudioCoalescer(websocket.send, window_ms, window_ms * 2)
+    start = time.monotonic()
+    for i, payload in enumerate(payloads):
+        await asyncio.sleep(max(0.0, start + i * FRAME_MS / 1000 - time.monotonic()))
+        await coalescer.push(payload)
+    await coalescer.flush()
+    coalescer.close()
+    await websocket.close()
+    return coalescer
+
+async def run(windows: list[int], minutes: int, paced_sec: int, port: int) -> None:
+    payloads = twilio_payloads(FRAMES_PER_MINUTE) * minutes
+
+    websocket = await FakeOpenAIWebSocket.connect(port)
+    start = time.process_time()
+    await cpu_before(payloads, websocket)
+    baseline_cpu = (time.process_time() - start) / minutes * 1000
+    baseline_sends = websocket.sends / minutes
+    await websocket.close()
+
+    print(f"{'window':>8} {'sends/min':>10} {'syscalls':>9} {'CPU ms/min':>11} {'CPU':>6} {'avg +ms':>8} {'max +ms':>8}")
+    print(f"{'before':>8} {baseline_sends:>10.0f} {'':>9} {baseline_cpu:>11.2f} {'':>6} {0:>8.1f} {0:>8.1f}")
+
+    for window_ms in windows:
+        websocket = await FakeOpenAIWebSocket.connect(port)
+        start = time.process_time()
+        await cpu_after(payloads, websocket, window_ms)
+        cpu = (time.process_time() - start) / minutes * 1000
+        sends = websocket.sends / minutes
+        await websocket.close()
+
+        paced = await paced_latency(payloads[:paced_sec * 1000 // FRAME_MS], window_ms, port)
+        stats = paced.stats()
+        print(f"{window_ms:>6}ms {sends:>10.0f} {(1 - sends / baseline_sends) * -100:>8.0f}% "
+              f"{cpu:>11.2f} {(cpu / baseline_cpu - 1) * 100:>5.0f}% "
+              f"{stats['avg_added_delay_ms']:>8.1f} {stats['max_added_delay_ms']:>8.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--windows", type=int, nargs="+", default=[0, 40, 60, 80, 120])
+    parser.add_argument("--minutes", type=int, default=5, help="CPU 量測的通話分鐘數")
+    parser.add_argument("--paced-sec", type=int, default=3, help="延遲量測以真實節奏送入的秒數")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target=_serve_drain, args=(args.port, ready), daemon=True)
+    server.start()
+    ready.wait(10)
+    try:
+        asyncio.run(run(args.windows, args.minutes, args.paced_sec, args.port))
+    finally:
+        server.terminate()
+
+if __name__ == "__main__":
+    main()
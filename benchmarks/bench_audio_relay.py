@@ -0,0 +1,85 @@
+"""
+OpenAI -> Twilio 音訊轉送 microbenchmark
+
+比較舊路徑（base64 decode/encode + 建立 dict + send_json）與
+TwilioMediaFrame 預先序列化模板（delta 原樣轉送）在單核上的 frames/s。
+
+用法：
+    python -m benchmarks.bench_audio_relay --frames 200000 --delta-bytes 800
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import time
+
+from app.services.audio_relay import TwilioMediaFrame
+
+class FakeTwilioWebSocket:
+    """模擬 Starlette WebSocket 的 send_text / send_json 行為，只保留序列化成本"""
+
+    def __init__(self):
+        self.sent = 0
+
+    async def send(self, message: dict) -> None:
+        self.sent += 1
+
+    async def send_text(self, data: str) -> None:
+        await self.send({"type": "websocket.send", "text": data})
+
+    async def send_json(self, data) -> None:
+        text = json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+        await self.send({"type": "websocket.send", "text": text})
+
+async def relay_before(websocket, stream_sid: str, delta: str) -> None:
+    audio_payload = base64.b64encode(base64.b64decode(delta)).decode('utf-8')
+    audio_delta = {
+        "event": "media",
+        "streamSid": stream_sid,
+        "media": {
+            "payload": audio_payload
+        }
+    }
+    await websocket.send_json(audio_delta)
+
+async def relay_after(websocket, media_frame: TwilioMediaFrame, delta: str) -> None:
+    await websocket.send_text(media_frame.render(delta))
+
+async def run(frames: int, delta_bytes: int) -> None:
+    stream_sid = "MZ" + "0" * 32
+    delta = base64.b64encode(os.urandom(delta_bytes)).decode('ascii')
+    media_frame = TwilioMediaFrame(stream_sid)
+
+    # 確認兩條路徑輸出完全一致
+    expected = json.dumps(
+        {"event": "media", "streamSid": stream_sid, "media": {"payload": delta}},
+        separators=(",", ":")
+    )
+    assert media_frame.render(delta) == expected
+
+    results = {}
+    for name, relay, target in (
+        ("before", relay_before, stream_sid),
+        ("after", relay_after, media_frame),
+    ):
+        websocket = FakeTwilioWebSocket()
+        start = time.process_time()
+        for _ in range(frames):
+            await relay(websocket, target, delta)
+        elapsed = time.process_time() - start
+        results[name] = frames / elapsed
+        print(f"{name:>6}: {results[name]:>12,.0f} frames/s/core  ({elapsed * 1e6 / frames:.2f} us/frame)")
+
+    print(f"speedup: {results['after'] / results['before']:.1f}x "
+          f"(delta={delta_bytes} bytes ≈ {delta_bytes / 8:.0f} ms of g711_ulaw audio)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=200000)
+    parser.add_argument("--delta-bytes", type=int, default=800)
+    args = parser.parse_args()
+    asyncio.run(run(args.frames, args.delta_bytes))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+通話建立時間 benchmark：OpenAI Realtime 預熱前後，media stream 連上到第一個 agent 音訊的時間
+
+啟動兩個行程：
+- app：只掛 twiml router 的 FastAPI（uvicorn），另有 /loadtest/prewarm/{session_id} 模擬 /makecall 的預熱
+- 假 OpenAI：aiohttp 實作的 Realtime websocket，websocket 升級前等待 --handshake-ms
+  （模擬 TCP + TLS + HTTP upgrade 到 OpenAI 的往返），收到 session.update 後等待 --session-update-ms
+  才回 session.updated，收到第一段使用者音訊後立即回傳一個音訊 delta
+
+本行程是假 Twilio Media Streams client，逐通電話：
+- before：不預熱，直接連 /media-stream（在 handler 內連線 OpenAI 並送出 session.update）
+- after：先呼叫預熱，等待 --ring-sec（響鈴與 <Say> 的時間）後才連 /media-stream
+每通電話從 websocket 連線開始計時，送出 start 與即時速度的音訊，收到第一個 media 為止。
+同時回報 app 端 call_setup_seconds{prewarmed} 的分位數（從接受 websocket 起算）。
+
+用法：
+    python -m benchmarks.bench_call_setup --calls 20 --handshake-ms 300
+"""
+import argparse
+import asyncio
+import base64
+import json
+import multiprocessing
+import os
+import time
+
+os.environ.setdefault('OPENAI_API_KEY', 'sk-bench')
+os.environ.setdefault('TWILIO_ACCOUNT_SID', 'AC' + '0' * 32)
+os.environ.setdefault('TWILIO_AUTH_TOKEN', 'bench-token')
+os.environ.setdefault('TWILIO_PHONE_NUMBER', '+886200000000')
+os.environ.setdefault('SUPABASE_URL', 'http://127.0.0.1:54321')
+os.environ.setdefault('SUPABASE_KEY', 'eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.bench')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.setdefault('LOG_FILE', '')
+
+import websockets
+
+from benchmarks.bench_load import TWILIO_FRAME_BYTES, TWILIO_FRAME_MS, fetch_json, percentiles
+
+MODES = ("before", "after")
+
+def _serve_fake_openai(port: int, handshake_ms: float, session_update_ms: float, ready) -> None:
+    """假 OpenAI：有連線延遲的 Realtime websocket，第一段使用者音訊後回傳 agent 音訊"""
+    from aiohttp import web, WSMsgType
+
+    def event(event_type: str, **fields) -> str:
+        return json.dumps({"type": event_type, "event_id": "event_" + os.urandom(6).hex(), **fields})
+
+    async def realtime(request: web.Request) -> web.WebSocketResponse:
+        await asyncio.sleep(handshake_ms / 1000)
+        ws = web.WebSocketResponse(max_msg_size=0)
+        await ws.prepare(request)
+        replied = False
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                continue
+            data = json.loads(msg.data)
+            if data.get('type') == 'session.update':
+                await asyncio.sleep(session_update_ms / 1000)
+                await ws.send_str(event("session.updated", session={"id": "sess_setup"}))
+            elif data.get('type') == 'input_audio_buffer.append' and not replied:
+                replied = True
+                await ws.send_str(event("response.created", response={"id": "resp_0", "status": "in_progress"}))
+                await ws.send_str(event(
+                    "response.audio.delta", response_id="resp_0", item_id="item_0", output_index=0,
+                    content_index=0, delta=base64.b64encode(b'\xff' * 800).decode('ascii')
+                ))
+        return ws
+
+    app = web.Application()
+    app.router.add_get('/v1/realtime', realtime)
+
+    async def serve():
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, '127.0.0.1', port).start()
+        ready.set()
+        await asyncio.Future()
+
+    asyncio.run(serve())
+
+def _serve_app(port: int, calls: int, ready) -> None:
+    """app 行程：twiml router + 預熱與 call_setup_seconds 的測試路由"""
+    from contextlib import asynccontextmanager
+
+    import uvicorn
+    from fastapi import FastAPI
+
+    from app.routers import twiml
+    from app.services.realtime_prewarm import realtime_prewarm
+    from app.services.session_store import SessionStore
+    from app.services.settings_service import Settings_Init_FromDB
+    from app.services.websocket_service import CALL_SETUP
+    from app.utils.metrics import histogram_summary
+
+    # 不連 Supabase：直接給 initialize_settings 會載入的 session.update 設定
+    Settings_Init_FromDB.SESSION_UPDATE_CONFIG = {"type": "session.update", "session": {
+        "turn_detection": {"type": "server_vad"},
+        "input_audio_format": "g711_ulaw",
+        "output_audio_format": "g711_ulaw",
+        "voice": "alloy",
+        "modalities": ["text", "audio"],
+    }}
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        for mode in MODES:
+            for index in range(calls):
+                await SessionStore.set_call_sid(f"{mode}-{index}", f"CA{mode}{index:026d}")
+        ready.set()
+        yield
+        await realtime_prewarm.close_all()
+
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(twiml.router)
+
+    @app.post("/loadtest/prewarm/{session_id}")
+    async def prewarm(session_id: str):
+        # 與 /makecall 取得 call SID 後相同
+        realtime_prewarm.prewarm(session_id, None)
+        return {"status": "ok"}
+
+    @app.get("/loadtest/setup")
+    async def setup_times():
+        return {prewarmed: histogram_summary(CALL_SETUP, prewarmed=prewarmed) for prewarmed in ("false", "true")}
+
+    uvicorn.run(app, host='127.0.0.1', port=port, log_level='warning', ws='websockets')
+
+async def post(url: str) -> None:
+    import aiohttp
+    async with aiohttp.ClientSession() as session:
+        async with session.post(url) as response:
+            response.raise_for_status()
+
+async def time_to_first_audio(url: str, index: int, timeout: float = 10.0) -> float:
+    """連線開始到收到第一個 agent 音訊的秒數"""
+    stream_sid = f"MZ{index:032d}"
+    started = time.monotonic()
+    async with websockets.connect(url, max_size=None) as ws:
+        await ws.send(json.dumps({"event": "connected", "protocol": "Call", "version": "1.0.0"}))
+        await ws.send(json.dumps({"event": "start", "streamSid": stream_sid, "start": {
+            "streamSid": stream_sid, "callSid": f"CA{index:032d}", "tracks": ["inbound"],
+            "mediaFormat": {"encoding": "audio/x-mulaw", "sampleRate": 8000, "channels": 1}
+        }}))
+
+        async def send_audio() -> None:
+            payload = base64.b64encode(b'\xff' * TWILIO_FRAME_BYTES).decode('ascii')
+            while True:
+                await ws.send(json.dumps({"event": "media", "streamSid": stream_sid, "media": {"payload": payload}}))
+                await asyncio.sleep(TWILIO_FRAME_MS / 1000)
+
+        sender = asyncio.ensure_future(send_audio())
+        try:
+            async with asyncio.timeout(timeout):
+                async for message in ws:
+                    if json.loads(message)['event'] == 'media':
+                        return time.monotonic() - started
+        finally:
+            sender.cancel()
+            await ws.send(json.dumps({"event": "stop", "streamSid": stream_sid, "stop": {}}))
+    raise RuntimeError("media stream closed before the first audio delta")
+
+async def run(app_port: int, calls: int, ring_sec: float) -> dict:
+    base = f"127.0.0.1:{app_port}"
+    results = {}
+    for mode in MODES:
+        latencies = []
+        for index in range(calls):
+            session_id = f"{mode}-{index}"
+            if mode == "after":
+                await post(f"http://{base}/loadtest/prewarm/{session_id}")
+                await asyncio.sleep(ring_sec)
+            latencies.append(await time_to_first_audio(f"ws://{base}/media-stream/{session_id}", index))
+        results[mode] = percentiles(latencies)
+    results["server"] = await fetch_json(f"http://{base}/loadtest/setup")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=20, help="每種模式的通話數（逐通進行）")
+    parser.add_argument("--handshake-ms", type=float, default=300.0)
+    parser.add_argument("--session-update-ms", type=float, default=100.0)
+    parser.add_argument("--ring-sec", type=float, default=1.0)
+    parser.add_argument("--app-port", type=int, default=18090)
+    parser.add_argument("--openai-port", type=int, default=18091)
+    args = parser.parse_args()
+
+    # app 行程在啟動後才 import app 模組，由環境變數指向假 OpenAI
+    os.environ['OPENAI_API_URL_REALTIME'] = f"ws://127.0.0.1:{args.openai_port}/v1/realtime"
+
+    openai_ready, app_ready = multiprocessing.Event(), multiprocessing.Event()
+    fake_openai = multiprocessing.Process(
+        target=_serve_fake_openai,
+        args=(args.openai_port, args.handshake_ms, args.session_update_ms, openai_ready),
+        daemon=True
+    )
+    app = multiprocessing.Process(target=_serve_app, args=(args.app_port, args.calls, app_ready), daemon=True)
+    fake_openai.start()
+    app.start()
+    openai_ready.wait(10)
+    app_ready.wait(30)
+    try:
+        results = asyncio.run(run(args.app_port, args.calls, args.ring_sec))
+    finally:
+        app.terminate()
+        fake_openai.terminate()
+        app.join()
+        fake_openai.join()
+
+    print(f"OpenAI handshake {args.handshake_ms:.0f} ms, session.update {args.session_update_ms:.0f} ms")
+    print(f"{'':>7} {'client p50':>11} {'p99':>7} {'server p50':>11} {'p99':>7}  (ms, connect → first agent audio)")
+    for mode, prewarmed in zip(MODES, ("false", "true")):
+        client, server = results[mode], results["server"][prewarmed]
+        print(f"{mode:>7} {client['p50']:>11.1f} {client['p99']:>7.1f} "
+              f"{(server['p50'] or 0) * 1000:>11.1f} {(server['p99'] or 0) * 1000:>7.1f}")
+
+if __name__ == "__main__":
+    main()
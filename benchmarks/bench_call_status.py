@@ -0,0 +1,98 @@
+"""
+/call-status 每秒請求數 benchmark
+
+以 httpx.ASGITransport 在同一個行程內對 app 送出 Twilio 通話狀態回調
+（initiated / ringing），同時 --concurrency 個，比較：
+- before：每個請求建立 CallService（原本的建構子會建立 twilio.rest.Client，各自一個 HTTP session）
+- after：lifespan 建立的 ServiceContainer，透過 Depends(get_call_service) 共用同一個 CallService
+報告每秒請求數與 p50 / p99 延遲。logging 導到 /dev/null，不影響結果。
+
+用法：
+    python -m benchmarks.bench_call_status --requests 5000 --concurrency 50
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ.setdefault('OPENAI_API_KEY', 'sk-bench')
+os.environ.setdefault('TWILIO_ACCOUNT_SID', 'AC' + '0' * 32)
+os.environ.setdefault('TWILIO_AUTH_TOKEN', 'bench-token')
+os.environ.setdefault('TWILIO_PHONE_NUMBER', '+886200000000')
+os.environ.setdefault('SUPABASE_URL', 'http://127.0.0.1:54321')
+os.environ.setdefault('SUPABASE_KEY', 'eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.bench')
+os.environ.setdefault('LOG_FILE', '')
+
+import httpx
+from twilio.rest import Client
+
+from app.config import settings
+from app.dependencies.services import ServiceContainer, get_call_service
+from app.main import app
+from app.services.call_service import CallService
+from app.utils import log_utils
+
+STATUS_FORMS = [
+    {"CallStatus": "initiated"},
+    {"CallStatus": "ringing"},
+]
+
+def per_request_call_service() -> CallService:
+    """before：每個請求建立 CallService 與 twilio.rest.Client"""
+    Client(settings.twilio_account_sid, settings.twilio_auth_token)
+    return CallService()
+
+async def measure(requests: int, concurrency: int) -> dict:
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        counter = iter(range(requests))
+
+        async def worker() -> None:
+            for index in counter:
+                form = {"CallSid": f"CA{index:032d}", **STATUS_FORMS[index % len(STATUS_FORMS)]}
+                started = time.perf_counter()
+                response = await client.post("/call-status", data=form)
+                latencies.append(time.perf_counter() - started)
+                assert response.json()["status"] == "success", response.text
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "rps": requests / elapsed,
+        "p50": statistics.median(latencies) * 1000,
+        "p99": latencies[int(len(latencies) * 0.99)] * 1000,
+    }
+
+async def run(requests: int, concurrency: int) -> None:
+    devnull = open(os.devnull, "w", encoding="utf-8")
+    log_utils.configure(file_path='', console_stream=devnull)
+    # 不執行 lifespan（不連 Supabase / 不啟動 outbox），只放入服務容器
+    app.state.services = ServiceContainer()
+    await measure(200, concurrency)  # 暖機
+
+    results = {}
+    for mode in ("before", "after"):
+        if mode == "before":
+            app.dependency_overrides[get_call_service] = per_request_call_service
+        else:
+            app.dependency_overrides.clear()
+        results[mode] = r = await measure(requests, concurrency)
+        print(f"{mode:>7}: {r['rps']:8.0f} req/s  p50 {r['p50']:6.2f} ms  p99 {r['p99']:6.2f} ms")
+
+    print(f"speedup: {results['after']['rps'] / results['before']['rps']:.2f}x")
+    log_utils.stop()
+    devnull.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.concurrency))
+
+if __name__ == "__main__":
+    main()
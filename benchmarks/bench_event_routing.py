@@ -0,0 +1,153 @@
+"""
+OpenAI Realtime 接收迴圈的事件分派 benchmark
+
+重播一分鐘通話的事件組合（或 --recording 指定的錄製檔，每行一個原始事件），
+比較舊路徑（每則訊息 json.loads + match，音訊 base64 round trip + send_json）
+與 OpenAIEventRouter（只讀 type，音訊 delta 原樣轉送，只解析控制事件）
+每分鐘通話消耗的 CPU 時間。
+
+用法：
+    python -m benchmarks.bench_event_routing --repeat 200
+    python -m benchmarks.bench_event_routing --recording events.jsonl
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import time
+
+from app.constants import OpenAIEventTypes
+from app.services.audio_relay import TwilioMediaFrame
+from app.services.openai_event_router import OpenAIEventRouter, extract_string_field
+from benchmarks.bench_audio_relay import FakeTwilioWebSocket, relay_before
+
+STREAM_SID = "MZ" + "0" * 32
+
+def _event(event_type: str, **fields) -> str:
+    # 與 OpenAI 實際送出的格式相同：緊湊 JSON、type 在最前面
+    return json.dumps({"type": event_type, "event_id": "event_" + os.urandom(8).hex(), **fields},
+                      ensure_ascii=False, separators=(",", ":"))
+
+def build_call_minute(turns: int = 6, agent_speech_sec: float = 30.0, delta_ms: int = 100) -> list[str]:
+    """產生一分鐘通話的 OpenAI 事件序列（agent 說話約一半時間）"""
+    events = [_event("session.created", session={"id": "sess_1"}),
+              _event("session.updated", session={"id": "sess_1", "voice": "alloy"})]
+    deltas_per_turn = int(agent_speech_sec * 1000 / delta_ms / turns)
+    audio = base64.b64encode(os.urandom(delta_ms * 8)).decode('ascii')
+    for turn in range(turns):
+        item_id = f"item_{turn:04d}"
+        response_id = f"resp_{turn:04d}"
+        common = {"response_id": response_id, "item_id": item_id, "output_index": 0, "content_index": 0}
+        events += [
+            _event("input_audio_buffer.speech_started", audio_start_ms=turn * 10000, item_id=f"user_{turn}"),
+            _event("input_audio_buffer.speech_stopped", audio_end_ms=turn * 10000 + 3000, item_id=f"user_{turn}"),
+            _event("input_audio_buffer.committed", previous_item_id=None, item_id=f"user_{turn}"),
+            _event("conversation.item.created", item={"id": f"user_{turn}", "type": "message", "role": "user", "content": []}),
+            _event("response.created", response={"id": response_id, "status": "in_progress", "output": []}),
+            _event("response.output_item.added", response_id=response_id, output_index=0, item={"id": item_id, "type": "message"}),
+            _event("conversation.item.created", item={"id": item_id, "type": "message", "role": "assistant", "content": []}),
+            _event("response.content_part.added", part={"type": "audio", "transcript": ""}, **common),
+            _event("conversation.item.input_audio_transcription.completed", item_id=f"user_{turn}", content_index=0, transcript="請問週末可以看房嗎？"),
+        ]
+        for i in range(deltas_per_turn):
+            events.append(_event("response.audio.delta", delta=audio, **common))
+            if i % 2 == 0:
+                events.append(_event("response.audio_transcript.delta", delta="可以", **common))
+        transcript = "可以的，我們週末都有開放參觀，請問您方便幾點過來呢？"
+        events += [
+            _event("response.audio.done", **common),
+            _event("response.audio_transcript.done", transcript=transcript, **common),
+            _event("response.content_part.done", part={"type": "audio", "transcript": transcript}, **common),
+            _event("response.output_item.done", response_id=response_id, output_index=0, item={"id": item_id}),
+            _event("response.done", response={"id": response_id, "status": "completed", "output": [
+                {"id": item_id, "type": "message", "content": [{"type": "audio", "transcript": transcript}]}]}),
+            _event("rate_limits.updated", rate_limits=[{"name": "tokens", "limit": 40000, "remaining": 39000}]),
+        ]
+    return events
+
+async def _noop(_event) -> None:
+    return None
+
+async def replay_before(events: list[str], websocket) -> None:
+    for message in events:
+        response = json.loads(message)
+        match response['type']:
+            case OpenAIEventTypes.SESSION_UPDATED:
+                pass
+            case OpenAIEventTypes.RESPONSE_AUDIO_DELTA if response.get('delta'):
+                await relay_before(websocket, STREAM_SID, response['delta'])
+            case OpenAIEventTypes.TRANSCRIPTION_COMPLETED:
+                pass
+            case OpenAIEventTypes.RESPONSE_DONE:
+                pass
+            case OpenAIEventTypes.CONVERSATION_ITEM_CREATED:
+                pass
+            case OpenAIEventTypes.ERROR:
+                pass
+            case OpenAIEventTypes.CONNECTION_CLOSED:
+                pass
+
+def build_router(websocket) -> OpenAIEventRouter:
+    media_frame = TwilioMediaFrame(STREAM_SID)
+
+    async def relay(message: str) -> None:
+        delta = extract_string_field(message, 'delta')
+        if delta:
+            await websocket.send_text(media_frame.render(delta))
+
+    router = OpenAIEventRouter()
+    router.on_raw(OpenAIEventTypes.RESPONSE_AUDIO_DELTA, relay)
+    for event_type in (
+        OpenAIEventTypes.SESSION_UPDATED,
+        OpenAIEventTypes.TRANSCRIPTION_COMPLETED,
+        OpenAIEventTypes.RESPONSE_DONE,
+        OpenAIEventTypes.CONVERSATION_ITEM_CREATED,
+        OpenAIEventTypes.ERROR,
+        OpenAIEventTypes.CONNECTION_CLOSED,
+    ):
+        router.on(event_type, _noop)
+    return router
+
+async def replay_after(events: list[str], router: OpenAIEventRouter) -> None:
+    for message in events:
+        await router.dispatch(message)
+
+async def run(events: list[str], repeat: int, call_minutes: float) -> None:
+    event_bytes = sum(len(e) for e in events)
+    audio_events = sum(1 for e in events if '"response.audio.delta"' in e[:40])
+    print(f"replaying {len(events)} events ({audio_events} audio deltas, {event_bytes / 1024:.0f} KiB) x {repeat}")
+
+    results = {}
+    for name in ("before", "after"):
+        websocket = FakeTwilioWebSocket()
+        router = build_router(websocket)
+        start = time.process_time()
+        for _ in range(repeat):
+            if name == "before":
+                await replay_before(events, websocket)
+            else:
+                await replay_after(events, router)
+        elapsed = time.process_time() - start
+        results[name] = elapsed / repeat / call_minutes * 1000
+        print(f"{name:>6}: {results[name]:8.2f} ms CPU per call-minute")
+
+    print(f"reduction: {(1 - results['after'] / results['before']) * 100:.0f}% "
+          f"({results['before'] / results['after']:.1f}x)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--recording", help="每行一個 OpenAI 原始事件的錄製檔")
+    parser.add_argument("--call-minutes", type=float, default=1.0, help="錄製檔涵蓋的通話分鐘數")
+    args = parser.parse_args()
+
+    if args.recording:
+        with open(args.recording, encoding='utf-8') as f:
+            events = [line.rstrip('\n') for line in f if line.strip()]
+    else:
+        events = build_call_minute()
+    asyncio.run(run(events, args.repeat, args.call_minutes))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+"""
+併發通話壓測（容量規劃用）
+
+啟動三個行程：
+- app：只掛 twiml router 的 FastAPI（uvicorn），即 /media-stream/{session_id} 的實際轉送路徑
+- 假 OpenAI：aiohttp 實作的 Realtime websocket（依腳本送出 speech / transcription / 音訊 delta /
+  response.done）與 Chat Completions（通話結束後的擷取）
+- 本行程：假 Twilio Media Streams client，每通電話以即時速度（每 20 ms 160 bytes μ-law）送出音訊，
+  並像 Twilio 一樣回傳 mark
+
+每個音訊 frame 的前 8 bytes 寫入送出時的 time.monotonic()（同一台機器的行程共用時鐘），
+接收端據此計算兩個方向的轉送延遲。--ramp-sec 內逐步建立 N 通電話，每通持續 --duration 秒，
+回報 app 行程的 CPU、RSS、event loop 延遲，以及轉送延遲的分位數。
+
+用法：
+    python -m benchmarks.bench_load --calls 10,25,50 --duration 20
+"""
+import argparse
+import asyncio
+import base64
+import json
+import multiprocessing
+import os
+import struct
+import time
+
+os.environ.setdefault('OPENAI_API_KEY', 'sk-bench')
+os.environ.setdefault('TWILIO_ACCOUNT_SID', 'AC' + '0' * 32)
+os.environ.setdefault('TWILIO_AUTH_TOKEN', 'bench-token')
+os.environ.setdefault('TWILIO_PHONE_NUMBER', '+886200000000')
+os.environ.setdefault('SUPABASE_URL', 'http://127.0.0.1:54321')
+os.environ.setdefault('SUPABASE_KEY', 'eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.bench')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.setdefault('LOG_FILE', '')
+
+import websockets
+
+TWILIO_FRAME_MS = 20
+TWILIO_FRAME_BYTES = 160  # 20 ms 的 g711_ulaw
+OPENAI_DELTA_MS = 100
+STAMP = struct.Struct('<d')
+
+def stamped_audio(size: int) -> str:
+    """前 8 bytes 為送出時間的 μ-law 音訊（base64）"""
+    return base64.b64encode(STAMP.pack(time.monotonic()) + b'\xff' * (size - STAMP.size)).decode('ascii')
+
+def read_stamp(payload: str) -> float:
+    return STAMP.unpack(base64.b64decode(payload[:12])[:STAMP.size])[0]
+
+def percentiles(values: list) -> dict:
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "p50": values[len(values) // 2] * 1000,
+        "p99": values[min(len(values) - 1, int(len(values) * 0.99))] * 1000,
+        "max": values[-1] * 1000,
+    }
+
+def _serve_fake_openai(port: int, user_speech_sec: float, agent_speech_sec: float, results, ready) -> None:
+    """假 OpenAI：Realtime websocket 依腳本輪流送出使用者發言與 agent 回應，並量測收到音訊的延遲"""
+    from aiohttp import web, WSMsgType
+
+    def event(event_type: str, **fields) -> str:
+        return json.dumps({"type": event_type, "event_id": "event_" + os.urandom(6).hex(), **fields})
+
+    async def script(ws: web.WebSocketResponse) -> None:
+        delta_bytes = OPENAI_DELTA_MS * 8
+        turn = 0
+        while not ws.closed:
+            await asyncio.sleep(user_speech_sec)
+            user_item, item_id, response_id = f"user_{turn}", f"item_{turn}", f"resp_{turn}"
+            for message in (
+                event("input_audio_buffer.speech_started", item_id=user_item),
+                event("input_audio_buffer.speech_stopped", item_id=user_item),
+                event("conversation.item.input_audio_transcription.completed", item_id=user_item, content_index=0, transcript="請問週末可以看房嗎？"),
+                event("response.created", response={"id": response_id, "status": "in_progress", "output": []}),
+            ):
+                await ws.send_str(message)
+            # 以即時速度送出 agent 音訊
+            next_at = time.monotonic()
+            for _ in range(int(agent_speech_sec * 1000 / OPENAI_DELTA_MS)):
+                await ws.send_str(event(
+                    "response.audio.delta", response_id=response_id, item_id=item_id,
+                    output_index=0, content_index=0, delta=stamped_audio(delta_bytes)
+                ))
+                next_at += OPENAI_DELTA_MS / 1000
+                await asyncio.sleep(max(0.0, next_at - time.monotonic()))
+            transcript = "可以的，我們週末都有開放參觀，請問您方便幾點過來呢？"
+            await ws.send_str(event("response.done", response={"id": response_id, "status": "completed", "output": [
+                {"id": item_id, "type": "message", "content": [{"type": "audio", "transcript": transcript}]}]}))
+            turn += 1
+
+    async def realtime(request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse(max_msg_size=0)
+        await ws.prepare(request)
+        latencies = []
+        script_task = None
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                data = json.loads(msg.data)
+                if data.get('type') == 'session.update':
+                    await ws.send_str(event("session.updated", session={"id": "sess_load"}))
+                    if script_task is None:
+                        script_task = asyncio.ensure_future(script(ws))
+                elif data.get('type') == 'input_audio_buffer.append':
+                    latencies.append(time.monotonic() - read_stamp(data['audio']))
+        finally:
+            if script_task is not None:
+                script_task.cancel()
+            results.put(latencies)
+        return ws
+
+    async def chat_completions(request: web.Request) -> web.Response:
+        await request.json()
+        await asyncio.sleep(0.5)
+        return web.json_response({
+            "choices": [{"message": {"role": "assistant", "content": json.dumps({"summary": "load test"})}}],
+            "usage": {"prompt_tokens": 500, "completion_tokens": 20, "total_tokens": 520},
+        })
+
+    app = web.Application()
+    app.router.add_get('/v1/realtime', realtime)
+    app.router.add_post('/v1/chat/completions', chat_completions)
+
+    async def serve():
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, '127.0.0.1', port, backlog=4096).start()
+        ready.set()
+        await asyncio.Future()
+
+    asyncio.run(serve())
+
+def _serve_app(port: int, calls: int, ready) -> None:
+    """app 行程：twiml router + event loop 延遲監控"""
+    from contextlib import asynccontextmanager
+
+    import uvicorn
+    from fastapi import FastAPI
+
+    from app.routers import twiml
+    from app.services.session_store import SessionStore
+    from app.services.settings_service import Settings_Init_FromDB
+    from app.utils.metrics import Histogram, histogram_summary
+
+    # 不連 Supabase：直接給 initialize_settings 會載入的 session.update 設定
+    Settings_Init_FromDB.SESSION_UPDATE_CONFIG = {"type": "session.update", "session": {
+        "turn_detection": {"type": "server_vad"},
+        "input_audio_format": "g711_ulaw",
+        "output_audio_format": "g711_ulaw",
+        "voice": "alloy",
+        "modalities": ["text", "audio"],
+        "input_audio_transcription": {"model": "whisper-1"},
+    }}
+
+    lag = Histogram("event_loop_lag_seconds", "Event loop lag", registry=None,
+                    buckets=(0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25, 0.5, 1))
+    worst = [0.0]
+
+    async def monitor(interval: float = 0.05) -> None:
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(interval)
+            delay = max(0.0, time.monotonic() - started - interval)
+            lag.observe(delay)
+            worst[0] = max(worst[0], delay)
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        for index in range(calls):
+            await SessionStore.set_call_sid(f"load-{index}", f"CA{index:032d}")
+        task = asyncio.ensure_future(monitor())
+        ready.set()
+        yield
+        task.cancel()
+
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(twiml.router)
+
+    @app.get("/loadtest/lag")
+    async def loop_lag():
+        return {**histogram_summary(lag), "max": worst[0]}
+
+    uvicorn.run(app, host='127.0.0.1', port=port, log_level='warning', ws='websockets')
+
+class FakeTwilioCall:
+    """假 Twilio Media Streams：即時速度送出音訊、回傳 mark，並量測收到 agent 音訊的延遲"""
+
+    def __init__(self, url: str, index: int, duration: float):
+        self.url = url
+        self.index = index
+        self.duration = duration
+        self.stream_sid = f"MZ{index:032d}"
+        self.latencies = []
+        self.error = None
+
+    async def run(self) -> None:
+        try:
+            async with websockets.connect(self.url, max_size=None) as ws:
+                receiver = asyncio.ensure_future(self.receive(ws))
+                await self.send(ws)
+                receiver.cancel()
+        except Exception as e:
+            self.error = e
+
+    async def send(self, ws) -> None:
+        await ws.send(json.dumps({"event": "connected", "protocol": "Call", "version": "1.0.0"}))
+        await ws.send(json.dumps({"event": "start", "sequenceNumber": "1", "streamSid": self.stream_sid, "start": {
+            "streamSid": self.stream_sid, "callSid": f"CA{self.index:032d}", "tracks": ["inbound"],
+            "mediaFormat": {"encoding": "audio/x-mulaw", "sampleRate": 8000, "channels": 1}
+        }}))
+        started = next_at = time.monotonic()
+        chunk = 0
+        while time.monotonic() - started < self.duration:
+            chunk += 1
+            await ws.send(json.dumps({"event": "media", "streamSid": self.stream_sid, "media": {
+                "track": "inbound", "chunk": str(chunk), "timestamp": str(chunk * TWILIO_FRAME_MS),
+                "payload": stamped_audio(TWILIO_FRAME_BYTES)
+            }}))
+            next_at += TWILIO_FRAME_MS / 1000
+            await asyncio.sleep(max(0.0, next_at - time.monotonic()))
+        await ws.send(json.dumps({"event": "stop", "streamSid": self.stream_sid, "stop": {}}))
+
+    async def receive(self, ws) -> None:
+        async for message in ws:
+            data = json.loads(message)
+            if data['event'] == 'media':
+                self.latencies.append(time.monotonic() - read_stamp(data['media']['payload']))
+            elif data['event'] == 'mark':
+                # 假設收到就播放完畢，立即回傳同名 mark
+                await ws.send(json.dumps({"event": "mark", "streamSid": self.stream_sid, "mark": data['mark']}))
+
+def process_usage(pid: int) -> tuple:
+    """(CPU 秒數, RSS bytes)"""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    cpu = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    with open(f"/proc/{pid}/status") as f:
+        rss = next(int(line.split()[1]) * 1024 for line in f if line.startswith('VmRSS:'))
+    return cpu, rss
+
+async def sample_usage(pid: int, samples: list, interval: float = 1.0) -> None:
+    while True:
+        samples.append((time.monotonic(), *process_usage(pid)))
+        await asyncio.sleep(interval)
+
+async def fetch_json(url: str) -> dict:
+    import aiohttp
+    async with aiohttp.ClientSession() as session:
+        async with session.get(url) as response:
+            return await response.json()
+
+async def run_level(app_port: int, app_pid: int, calls: int, duration: float, ramp_sec: float) -> dict:
+    samples = []
+    sampler = asyncio.ensure_future(sample_usage(app_pid, samples))
+    fake_calls = [FakeTwilioCall(f"ws://127.0.0.1:{app_port}/media-stream/load-{i}", i, duration) for i in range(calls)]
+    tasks = []
+    for fake_call in fake_calls:
+        tasks.append(asyncio.ensure_future(fake_call.run()))
+        await asyncio.sleep(ramp_sec / calls)
+    await asyncio.gather(*tasks)
+    sampler.cancel()
+    await asyncio.sleep(1.0)  # 等通話結束後的擷取完成
+    lag = await fetch_json(f"http://127.0.0.1:{app_port}/loadtest/lag")
+
+    (start_at, start_cpu, _), (end_at, end_cpu, _) = samples[0], samples[-1]
+    return {
+        "failed": sum(1 for c in fake_calls if c.error is not None),
+        "cpu_percent": (end_cpu - start_cpu) / (end_at - start_at) * 100 if end_at > start_at else 0.0,
+        "rss_mb": max(rss for _, _, rss in samples) / 1024 / 1024,
+        "lag": lag,
+        "to_twilio": percentiles([latency for c in fake_calls for latency in c.latencies]),
+    }
+
+def collect_openai_latencies(results, sessions: int, timeout: float = 10.0) -> list:
+    """收集假 OpenAI 每個 Realtime session 結束時回報的延遲，逾時未回報的 session 略過"""
+    import queue
+    latencies = []
+    deadline = time.monotonic() + timeout
+    for _ in range(sessions):
+        try:
+            latencies += results.get(timeout=max(0.0, deadline - time.monotonic()))
+        except queue.Empty:
+            break
+    return latencies
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", default="10,25,50", help="逗號分隔的併發通話數，每個等級重新啟動行程")
+    parser.add_argument("--duration", type=float, default=20.0, help="每通電話秒數")
+    parser.add_argument("--ramp-sec", type=float, default=5.0)
+    parser.add_argument("--user-speech-sec", type=float, default=2.0)
+    parser.add_argument("--agent-speech-sec", type=float, default=3.0)
+    parser.add_argument("--app-port", type=int, default=18080)
+    parser.add_argument("--openai-port", type=int, default=18081)
+    args = parser.parse_args()
+
+    # app 行程在啟動後才 import app 模組，由環境變數指向假 OpenAI
+    os.environ['OPENAI_API_URL_REALTIME'] = f"ws://127.0.0.1:{args.openai_port}/v1/realtime"
+    os.environ['OPENAI_API_URL'] = f"http://127.0.0.1:{args.openai_port}/v1/chat/completions"
+
+    print(f"{'calls':>5} {'failed':>6} {'app CPU':>8} {'RSS MB':>7} {'lag p99':>8} {'lag max':>8} "
+          f"{'→twilio p50':>12} {'p99':>7} {'→openai p50':>12} {'p99':>7}  (ms)")
+    for calls in (int(value) for value in args.calls.split(',')):
+        results = multiprocessing.Queue()
+        openai_ready, app_ready = multiprocessing.Event(), multiprocessing.Event()
+        fake_openai = multiprocessing.Process(
+            target=_serve_fake_openai,
+            args=(args.openai_port, args.user_speech_sec, args.agent_speech_sec, results, openai_ready),
+            daemon=True
+        )
+        app = multiprocessing.Process(target=_serve_app, args=(args.app_port, calls, app_ready), daemon=True)
+        fake_openai.start()
+        app.start()
+        openai_ready.wait(10)
+        app_ready.wait(30)
+        try:
+            level = asyncio.run(run_level(args.app_port, app.pid, calls, args.duration, args.ramp_sec))
+            to_openai = percentiles(collect_openai_latencies(results, calls))
+        finally:
+            app.terminate()
+            fake_openai.terminate()
+            app.join()
+            fake_openai.join()
+
+        lag, to_twilio = level['lag'], level['to_twilio']
+        print(f"{calls:>5} {level['failed']:>6} {level['cpu_percent']:>7.1f}% {level['rss_mb']:>7.1f} "
+              f"{(lag['p99'] or 0) * 1000:>8.1f} {lag['max'] * 1000:>8.1f} "
+              f"{to_twilio.get('p50', 0):>12.1f} {to_twilio.get('p99', 0):>7.1f} "
+              f"{to_openai.get('p50', 0):>12.1f} {to_openai.get('p99', 0):>7.1f}")
+
+if __name__ == "__main__":
+    main()
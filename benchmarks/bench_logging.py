@@ -0,0 +1,152 @@
+"""
+轉送迴圈的 logging 成本 benchmark
+
+以 WebSocketManager 重播一分鐘通話的 OpenAI 事件（bench_event_routing 的事件組合），
+量測每則訊息處理時間的 p50 / p99 / max，比較：
+    off      關閉 logging
+    sync     舊的 setup_logger：每個 logger 直接掛 console + RotatingFileHandler，在 event loop 上寫入
+    queue    QueueHandler / QueueListener，JSON lines 在背景執行緒寫入
+    sampled  queue，並將 "[WebSocket_Service].events" 取樣 10%
+
+console 輸出導到暫存檔，避免終端機速度影響結果。
+
+用法：
+    python -m benchmarks.bench_logging --calls 20
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import tempfile
+import time
+from logging.handlers import RotatingFileHandler
+
+os.environ.setdefault('OPENAI_API_KEY', 'sk-bench')
+os.environ.setdefault('TWILIO_ACCOUNT_SID', 'AC' + '0' * 32)
+os.environ.setdefault('TWILIO_AUTH_TOKEN', 'bench-token')
+os.environ.setdefault('TWILIO_PHONE_NUMBER', '+886200000000')
+os.environ.setdefault('SUPABASE_URL', 'http://127.0.0.1:54321')
+os.environ.setdefault('SUPABASE_KEY', 'eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.bench')
+os.environ.setdefault('LOG_FILE', '')
+
+from app.utils import log_utils
+from app.services.websocket_service import WebSocketManager
+from benchmarks.bench_event_routing import STREAM_SID, build_call_minute
+
+class FakeTwilioPeer:
+    async def send_text(self, message: str) -> None:
+        pass
+
+class FakeOpenAIPeer:
+    open = True
+    closed = False
+
+    async def send(self, message: str) -> None:
+        pass
+
+def app_loggers() -> list:
+    return [
+        logger for logger in logging.root.manager.loggerDict.values()
+        if isinstance(logger, logging.Logger) and log_utils.queue_handler in logger.handlers
+    ]
+
+def use_sync_handlers(directory: str) -> list:
+    """把 app 的 logger 換回舊的同步 handlers，回傳 (logger, handlers) 供之後還原"""
+    formatter = logging.Formatter(log_utils.TEXT_FORMAT)
+    console = logging.StreamHandler(open(os.path.join(directory, "console-sync.log"), "w", encoding="utf-8"))
+    console.setFormatter(formatter)
+    swapped = []
+    for logger in app_loggers():
+        file_handler = RotatingFileHandler(os.path.join(directory, f"{logger.name}.log"), maxBytes=10485760, backupCount=5)
+        file_handler.setFormatter(formatter)
+        logger.removeHandler(log_utils.queue_handler)
+        logger.addHandler(console)
+        logger.addHandler(file_handler)
+        swapped.append((logger, [console, file_handler]))
+    return swapped
+
+def restore_queue_handler(swapped: list) -> None:
+    for logger, handlers in swapped:
+        for handler in handlers:
+            logger.removeHandler(handler)
+            handler.close()
+        logger.addHandler(log_utils.queue_handler)
+
+async def replay_call(events: list[str], latencies: list[float]) -> None:
+    twilio, openai = FakeTwilioPeer(), FakeOpenAIPeer()
+    manager = WebSocketManager()
+    pumps = [
+        asyncio.ensure_future(manager.to_twilio.drain_to(twilio.send_text)),
+        asyncio.ensure_future(manager.to_openai.drain_to(openai.send)),
+    ]
+    await manager.handle_twilio_message(json.dumps({
+        "event": "start", "start": {"streamSid": STREAM_SID, "callSid": "CA1"}
+    }), openai)
+    for message in events:
+        started = time.perf_counter()
+        await manager.handle_openai_message(message, twilio, openai)
+        latencies.append(time.perf_counter() - started)
+        if len(latencies) % 50 == 0:
+            await asyncio.sleep(0)  # 讓 pump 消化佇列
+    manager.to_twilio.close()
+    manager.to_openai.close()
+    await asyncio.gather(*pumps)
+
+async def measure(events: list[str], calls: int) -> dict:
+    latencies = []
+    cpu_started = time.process_time()
+    for _ in range(calls):
+        await replay_call(events, latencies)
+    cpu = time.process_time() - cpu_started
+    latencies.sort()
+    return {
+        "p50": statistics.median(latencies) * 1e6,
+        "p99": latencies[int(len(latencies) * 0.99)] * 1e6,
+        "max": latencies[-1] * 1e6,
+        "cpu_ms_per_call": cpu / calls * 1000,
+    }
+
+async def run(calls: int) -> None:
+    events = build_call_minute()
+    print(f"replaying {len(events)} events per call-minute x {calls} calls")
+
+    with tempfile.TemporaryDirectory() as directory:
+        console = open(os.path.join(directory, "console-queue.log"), "w", encoding="utf-8")
+        log_utils.configure(file_path=os.path.join(directory, "app.jsonl"), console_stream=console)
+        await replay_call(events[:50], [])  # 暖機，建立 logger
+
+        results = {}
+        for mode in ("off", "sync", "queue", "sampled"):
+            swapped = []
+            if mode == "off":
+                logging.disable(logging.CRITICAL)
+            elif mode == "sync":
+                swapped = use_sync_handlers(directory)
+            elif mode == "sampled":
+                log_utils.set_sampling("[WebSocket_Service].events", 0.1)
+            try:
+                results[mode] = await measure(events, calls)
+            finally:
+                logging.disable(logging.NOTSET)
+                restore_queue_handler(swapped)
+                log_utils.set_sampling("[WebSocket_Service].events", None)
+            r = results[mode]
+            print(f"{mode:>8}: p50 {r['p50']:7.1f} us  p99 {r['p99']:7.1f} us  max {r['max']:8.1f} us  "
+                  f"{r['cpu_ms_per_call']:7.1f} ms CPU per call-minute")
+
+        log_utils.stop()
+        console.close()
+
+    print(f"p99 sync vs off: +{results['sync']['p99'] - results['off']['p99']:.1f} us, "
+          f"queue vs off: +{results['queue']['p99'] - results['off']['p99']:.1f} us")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args.calls))
+
+if __name__ == "__main__":
+    main()
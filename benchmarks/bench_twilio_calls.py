@@ -0,0 +1,139 @@
+"""
+Twilio REST 外撥 benchmark
+
+對另一行程的本機假 Twilio API（每個請求固定延遲 --latency-ms）同時發起 --calls 通外撥，比較：
+- before：同步 Client.calls.create 丟進預設 executor（原本 CallService 的做法）
+- after：AsyncTwilioRest（AsyncTwilioHttpClient 連線池 + 並行上限）
+報告每秒建立的通話數與 p50 / p99 延遲。
+
+用法：
+    python -m benchmarks.bench_twilio_calls --calls 500 --latency-ms 100
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import statistics
+import time
+import uuid
+from functools import partial
+
+os.environ.setdefault('OPENAI_API_KEY', 'sk-bench')
+os.environ.setdefault('TWILIO_ACCOUNT_SID', 'AC' + '0' * 32)
+os.environ.setdefault('TWILIO_AUTH_TOKEN', 'bench-token')
+os.environ.setdefault('TWILIO_PHONE_NUMBER', '+886200000000')
+os.environ.setdefault('SUPABASE_URL', 'http://127.0.0.1:54321')
+os.environ.setdefault('SUPABASE_KEY', 'eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.bench')
+
+from twilio.rest import Client
+
+from app.config import settings
+from app.services.twilio_service import AsyncTwilioRest
+
+CALL_KWARGS = dict(
+    to='+886900000000',
+    from_='+886200000000',
+    url='https://example.com/twiml',
+    status_callback='https://example.com/call-status',
+    status_callback_method='POST',
+)
+
+def _serve_fake_twilio(port: int, latency: float, ready) -> None:
+    """在獨立行程跑的假 Twilio API，只實作 Calls 的 create / update / fetch"""
+    from aiohttp import web
+
+    async def call_resource(request, sid):
+        await asyncio.sleep(latency)
+        return web.json_response({
+            "sid": sid,
+            "account_sid": request.match_info['account_sid'],
+            "status": "queued",
+        }, status=201 if request.method == 'POST' and 'sid' not in request.match_info else 200)
+
+    async def create(request):
+        await request.post()
+        return await call_resource(request, "CA" + uuid.uuid4().hex)
+
+    async def instance(request):
+        if request.method == 'POST':
+            await request.post()
+        return await call_resource(request, request.match_info['sid'])
+
+    app = web.Application()
+    app.router.add_post('/2010-04-01/Accounts/{account_sid}/Calls.json', create)
+    app.router.add_route('*', '/2010-04-01/Accounts/{account_sid}/Calls/{sid}.json', instance)
+
+    async def serve():
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, '127.0.0.1', port, backlog=4096).start()
+        ready.set()
+        await asyncio.Future()
+
+    asyncio.run(serve())
+
+def report(name: str, latencies: list, elapsed: float) -> None:
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{name:>8} {len(latencies) / elapsed:>10.1f} {statistics.median(latencies) * 1000:>9.1f} {p99 * 1000:>9.1f}")
+
+async def timed(coro_factory, latencies: list) -> None:
+    start = time.monotonic()
+    await coro_factory()
+    latencies.append(time.monotonic() - start)
+
+async def run_before(base_url: str, calls: int) -> None:
+    client = Client(settings.twilio_account_sid, settings.twilio_auth_token)
+    client.api.base_url = base_url
+    loop = asyncio.get_running_loop()
+    latencies = []
+    start = time.monotonic()
+    await asyncio.gather(*(
+        timed(lambda: loop.run_in_executor(None, partial(client.calls.create, **CALL_KWARGS)), latencies)
+        for _ in range(calls)
+    ))
+    report("before", latencies, time.monotonic() - start)
+
+async def run_after(base_url: str, calls: int, max_concurrency: int) -> None:
+    twilio_rest = AsyncTwilioRest(
+        settings.twilio_account_sid,
+        settings.twilio_auth_token,
+        timeout=settings.twilio_timeout_sec,
+        max_concurrency=max_concurrency,
+        api_base_url=base_url
+    )
+    # 暖機：建立 aiohttp session 與第一條連線
+    await twilio_rest.fetch_call("CA" + "0" * 32)
+    latencies = []
+    start = time.monotonic()
+    await asyncio.gather(*(
+        timed(lambda: twilio_rest.create_call(**CALL_KWARGS), latencies)
+        for _ in range(calls)
+    ))
+    report("after", latencies, time.monotonic() - start)
+    await twilio_rest.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=100, help="假 Twilio API 每個請求的延遲")
+    parser.add_argument("--max-concurrency", type=int, default=settings.twilio_max_concurrency)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(
+        target=_serve_fake_twilio, args=(args.port, args.latency_ms / 1000, ready), daemon=True
+    )
+    server.start()
+    ready.wait(10)
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        print(f"{'':>8} {'calls/s':>10} {'p50 ms':>9} {'p99 ms':>9}")
+        asyncio.run(run_before(base_url, args.calls))
+        asyncio.run(run_after(base_url, args.calls, args.max_concurrency))
+    finally:
+        server.terminate()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Webhook HTTP client benchmark
+
+對另一行程的本機 webhook stub server 送出 --requests 個 webhook（同時 --concurrency 個），比較：
+- before：每個請求建立新的 httpx.AsyncClient（原本 call_webhook 的做法）
+- after：HttpClientRegistry 共用的 client（keep-alive 連線池）
+報告每秒請求數與 p50 / p99 延遲。預設使用 openssl 產生的自簽憑證走 HTTPS，
+讓 before 包含實際的 TLS handshake 成本；--no-tls 改用純 HTTP。
+
+用法：
+    python -m benchmarks.bench_webhooks --requests 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import ssl
+import statistics
+import subprocess
+import tempfile
+import time
+
+os.environ.setdefault('OPENAI_API_KEY', 'sk-bench')
+os.environ.setdefault('TWILIO_ACCOUNT_SID', 'AC' + '0' * 32)
+os.environ.setdefault('TWILIO_AUTH_TOKEN', 'bench-token')
+os.environ.setdefault('TWILIO_PHONE_NUMBER', '+886200000000')
+os.environ.setdefault('SUPABASE_URL', 'http://127.0.0.1:54321')
+os.environ.setdefault('SUPABASE_KEY', 'eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.bench')
+
+import httpx
+
+from app.utils.http_client import HttpClientRegistry
+
+PAYLOAD = {
+    "call_id": "CA" + "0" * 32,
+    "status": "completed",
+    "timestamp": "2024-01-01T00:00:00+08:00",
+}
+
+def _serve_stub(port: int, certfile, keyfile, ready) -> None:
+    """在獨立行程跑的 webhook stub，讀完 body 後回 200"""
+    from aiohttp import web
+
+    async def webhook(request):
+        await request.read()
+        return web.json_response({"status": "ok"})
+
+    app = web.Application()
+    app.router.add_post('/webhook/call-status', webhook)
+
+    async def serve():
+        ssl_context = None
+        if certfile:
+            ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            ssl_context.load_cert_chain(certfile, keyfile)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, '127.0.0.1', port, ssl_context=ssl_context, backlog=4096).start()
+        ready.set()
+        await asyncio.Future()
+
+    asyncio.run(serve())
+
+def self_signed_cert(directory: str):
+    certfile = os.path.join(directory, 'cert.pem')
+    keyfile = os.path.join(directory, 'key.pem')
+    subprocess.run([
+        'openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+        '-subj', '/CN=127.0.0.1', '-addext', 'subjectAltName=IP:127.0.0.1',
+        '-keyout', keyfile, '-out', certfile,
+    ], check=True, capture_output=True)
+    return certfile, keyfile
+
+async def post_per_request_client(url: str) -> None:
+    async with httpx.AsyncClient() as client:
+        response = await client.post(url, json=PAYLOAD, timeout=30.0)
+        response.raise_for_status()
+
+async def run(name: str, post, url: str, requests: int, concurrency: int) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            start = time.monotonic()
+            await post(url)
+            latencies.append(time.monotonic() - start)
+
+    start = time.monotonic()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.monotonic() - start
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{name:>8} {requests / elapsed:>10.0f} {statistics.median(latencies) * 1000:>9.2f} {p99 * 1000:>9.2f}")
+
+async def run_after(url: str, requests: int, concurrency: int) -> None:
+    registry = HttpClientRegistry()
+    await registry.startup("webhook")
+
+    async def post(url: str) -> None:
+        response = await registry.get("webhook").post(url, json=PAYLOAD, timeout=30.0)
+        response.raise_for_status()
+
+    await run("after", post, url, requests, concurrency)
+    await registry.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--no-tls", action="store_true")
+    parser.add_argument("--port", type=int, default=8767)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        certfile = keyfile = None
+        scheme = "http"
+        if not args.no_tls:
+            certfile, keyfile = self_signed_cert(directory)
+            # httpx 預設 trust_env，會以 SSL_CERT_FILE 驗證自簽憑證
+            os.environ['SSL_CERT_FILE'] = certfile
+            scheme = "https"
+
+        ready = multiprocessing.Event()
+        server = multiprocessing.Process(
+            target=_serve_stub, args=(args.port, certfile, keyfile, ready), daemon=True
+        )
+        server.start()
+        ready.wait(10)
+        url = f"{scheme}://127.0.0.1:{args.port}/webhook/call-status"
+        try:
+            print(f"{scheme}, {args.requests} requests, concurrency {args.concurrency}")
+            print(f"{'':>8} {'req/s':>10} {'p50 ms':>9} {'p99 ms':>9}")
+            asyncio.run(run("before", post_per_request_client, url, args.requests, args.concurrency))
+            asyncio.run(run_after(url, args.requests, args.concurrency))
+        finally:
+            server.terminate()
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,5 @@
 import os
 import json
-import base64
 import asyncio
 import websockets
 from fastapi import FastAPI, WebSocket, Request
@@ -10,20 +9,20 @@ from twilio.twiml.voice_response import VoiceResponse, Connect
 from dotenv import load_dotenv
 from constants import GLOBAL_PROJECT_ID, GLOBAL_PROJECT_OPENAI_CHAT_COMPLETIONS_CONFIG_ID, GLOBAL_PROJECT_OPENAI_SESSION_UPDATE_CONFIG_ID, GLOBAL_PROJECT_OUTBOUNDCALL_ID, TWILIO_STATUS_ANSWEREDBY, TWILIO_VOICE_SETTINGS, WAITTIME_BEFORE_CALL_function_call_closethecall, DEFAULT_TIMEZONE
 from openai_constant import DEFAULT_SESSION_CONFIG, GLOBAL_OPENAI_API_CHAT_COMPLETIONS_SETTINGS, OPENAI_API_KEY, OPENAI_API_URL, OPENAI_MODEL, OPENAI_MODEL_REALTIME, OPENAI_API_URL_REALTIME, SYSTEM_INSTRUCTIONS, SYSTEM_MESSAGE, WHAT_DATE_IS_TODAY_PROMPTS, OpenAIEventTypes, RESPONSE_FORMAT
-from twilio_client import make_call, generate_twiml, close_call_by_agent
-import requests as http_requests
+from twilio_client import make_call, generate_twiml, close_call_by_agent, client as twilio_client
 from typing import Dict, Any
 import traceback
 from log_utils import setup_logger
 from datetime import datetime, timedelta, timezone
-import httpx
-from google.auth.transport import requests
-from google.oauth2 import id_token
-import google.auth
-from supabase import create_client, Client
 from contextlib import asynccontextmanager
 from utils import format_phone_number_with_country_code
+from app.services.audio_relay import TwilioMediaFrame
+from app.services.openai_event_router import peek_event_type, extract_string_field
+from app.services.supabase_service import get_project_settings, supabase_db
+from app.utils.http_client import http_clients
+from app.dependencies.auth import id_token_manager
 import pytz
+from cachetools import TTLCache
 
 
 load_dotenv()
@@ -40,7 +39,9 @@ async def lifespan(app: FastAPI):
     await initialize_settings()
     yield
     # 关闭时执行
-    # 清理代码（如果需要）
+    await supabase_db.close()
+    await twilio_client.close()
+    await http_clients.close()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -52,7 +53,10 @@ if not OPENAI_API_KEY:
 logger = setup_logger("[Twilio_Assistant]")
 
 # Global dictionary to store call information
-call_records = {}
+# 沒走到 process_transcript 的通話（未接、忙線、語音信箱）到期後自動移除，並限制最多筆數
+CALL_RECORD_TTL_SEC = int(os.getenv('SESSION_STORE_TTL_SEC', 7200))
+CALL_RECORD_MAX_ENTRIES = int(os.getenv('SESSION_STORE_MAX_ENTRIES', 100000))
+call_records = TTLCache(maxsize=CALL_RECORD_MAX_ENTRIES, ttl=CALL_RECORD_TTL_SEC)
 
 # 獲取 webhook URL
 BASE_WEBHOOK_URL = os.getenv('BASE_WEBHOOK_URL', 'http://localhost')
@@ -74,9 +78,6 @@ logger.info(f"Base webhook port: {BASE_WEBHOOK_PORT}")
 logger.info(f"Call result webhook URL: {WEBHOOK_URL_CALL_RESULT}")
 logger.info(f"Call status webhook URL: {WEBHOOK_URL_CALL_STATUS}")
 
-supabase_url = os.getenv("SUPABASE_URL")
-supabase_key = os.getenv("SUPABASE_KEY")
-supabase: Client = create_client(supabase_url, supabase_key)
 OpenAI_Init_SYSTEM_MESSAGE = ""
 OpenAI_PROJECT_MESSAGE = ""
 SESSION_UPDATE_CONFIG = DEFAULT_SESSION_CONFIG.copy()
@@ -86,18 +87,9 @@ chat_completions_system_instructions = SYSTEM_INSTRUCTIONS
 chat_completions_settings = GLOBAL_OPENAI_API_CHAT_COMPLETIONS_SETTINGS.copy()
 
 
-# 全局變量來存儲令牌和過期時間
-cached_id_token = None
-token_expiry = None
-
 async def get_cached_id_token(target_audience):
-    global cached_id_token, token_expiry
-    # 如果令牌不存在或已過期，重新獲取
-    if not cached_id_token or datetime.now() >= token_expiry:
-        cached_id_token = await get_id_token(f"https://{target_audience}")
-        # 假設令牌有效期為 1 小時
-        token_expiry = datetime.now() + timedelta(hours=1)
-    return cached_id_token
+    # 以 audience 為 key 快取，過期前於背景重新取得
+    return await id_token_manager.get(f"https://{target_audience}")
 
 async def initialize_settings():
     logger.info("[initialize_settings] >>>")
@@ -141,38 +133,6 @@ async def initialize_settings():
 
     logger.info("[initialize_settings] <<<")
 
-async def get_project_settings(project_id: int) -> dict:
-    logger.info("[get_project_settings] >>>")
-    try:
-        # 执行查询
-        columns = ['id', 'project_name', 'project_prompts', 'project_custom_json_settings']
-        response = supabase.table('ProjectConfigs') \
-            .select(','.join(columns)) \
-            .eq('id', project_id) \
-            .execute()
-        
-        # 检查是否有结果
-        if not response.data:
-            logger.error(f"未找到项目ID {project_id} 的设置")
-            return {}
-            
-        # 获取第一条记录
-        project_data = response.data[0]
-        
-        # 构建返回的设置对象
-        project_settings = {
-            'project_name': project_data.get('project_name'),
-            'project_prompts': project_data.get('project_prompts'),
-            'project_custom_json_settings': project_data.get('project_custom_json_settings')
-        }
-        
-        logger.info(f"成功获取项目 {project_id} 的设置")
-        return project_settings
-        
-    except Exception as e:
-        logger.error(f"获取项目设置时发生错误: {str(e)}")
-        return {}
-
 @app.get("/", response_class=HTMLResponse)
 async def index_page():
     return {"message": "Twilio Media Stream Server is running!"}
@@ -223,7 +183,7 @@ async def make_outbound_call(request: Request):
         custom_project_setting = await get_project_settings(project_id)
         OpenAI_PROJECT_MESSAGE = custom_project_setting.get('project_prompts', '')
     
-        call_sid = make_call(to_number, twiml_url, hostname, twilio_voice_settings)
+        call_sid = await make_call(to_number, twiml_url, hostname, twilio_voice_settings)
         
         if call_sid:
             # Initialize call record
@@ -320,8 +280,8 @@ async def handle_media_stream(websocket: WebSocket):
     call_sid = None
     pending_close_call = False
     
-    # Initialize user transcriptions for this session
-    all_transcript = ""
+    # Initialize user transcriptions for this session (one line per turn, joined on close)
+    transcript_lines = []
 
     async with websockets.connect(
         f"{OPENAI_API_URL_REALTIME}?model={OPENAI_MODEL_REALTIME}",
@@ -364,7 +324,7 @@ async def handle_media_stream(websocket: WebSocket):
                         # Handle stream termination event
                         logger.info(f"[receive_from_twilio] Stream stopped: {data.get('stop', {})}")
                         #logger.info(f"[receive_from_twilio] user_transcript: {all_transcript}")
-                        await on_connection_close(openai_ws, stream_sid, all_transcript, call_sid)
+                        await on_connection_close(openai_ws, stream_sid, "".join(transcript_lines), call_sid)
                         break  # Exit the loop when stream ends
                     #else:
                         # Log any other non-media events for debugging
@@ -379,9 +339,23 @@ async def handle_media_stream(websocket: WebSocket):
 
         async def send_to_twilio():
             """Receive events from the OpenAI Realtime API, send audio back to Twilio."""
-            nonlocal stream_sid, call_sid, all_transcript,pending_close_call
+            nonlocal stream_sid, call_sid, pending_close_call
+            media_frame = None
             try:
                 async for openai_message in openai_ws:
+                    # 先只讀 type，音訊 delta 不做完整的 JSON 解析直接轉送
+                    if peek_event_type(openai_message) == OpenAIEventTypes.RESPONSE_AUDIO_DELTA:
+                        delta = extract_string_field(openai_message, 'delta')
+                        if delta:
+                            try:
+                                # 兩端皆為 g711_ulaw，delta 原樣放入預先序列化的 media 模板
+                                if media_frame is None:
+                                    media_frame = TwilioMediaFrame(stream_sid)
+                                await websocket.send_text(media_frame.render(delta))
+                            except Exception as e:
+                                logger.error(f"Error processing audio data: {e}")
+                        continue
+
                     response = json.loads(openai_message)
                     # First, check if the event type needs to be logged
                     #if response['type'] in LOG_EVENT_TYPES:
@@ -392,28 +366,10 @@ async def handle_media_stream(websocket: WebSocket):
                         case OpenAIEventTypes.SESSION_UPDATED:
                             logger.info("Session updated successfully: %s", response)
                         
-                        case OpenAIEventTypes.RESPONSE_AUDIO_DELTA if response.get('delta'):
-                            # Audio received from OpenAI
-                            try:
-                                # Encode the audio payload
-                                audio_payload = base64.b64encode(base64.b64decode(response['delta'])).decode('utf-8')
-                                # Prepare the audio delta message
-                                audio_delta = {
-                                    "event": "media",
-                                    "streamSid": stream_sid,
-                                    "media": {
-                                        "payload": audio_payload
-                                    }
-                                }
-                                # Send the audio data back to Twilio
-                                await websocket.send_json(audio_delta)
-                            except Exception as e:
-                                logger.error(f"Error processing audio data: {e}")
-                        
                         case OpenAIEventTypes.TRANSCRIPTION_COMPLETED:
                             # User message transcription handling
                             user_message = "User: " + response['transcript'].strip()
-                            all_transcript += user_message + "\n"
+                            transcript_lines.append(user_message + "\n")
                             logger.info(f"User: {user_message}")
                             # Check if the user wants to hang up
                             hang_up_keywords = ['掛斷', '再見', '結束通話', '掰掰', '拜拜', '不用了', '不需要','Bye']
@@ -428,7 +384,7 @@ async def handle_media_stream(websocket: WebSocket):
                             if output:
                                 agent_message = next((content.get('transcript') for content in output[0].get('content', [])
                                                       if 'transcript' in content), 'Agent message not found')
-                                all_transcript += "Agent: " + agent_message + "\n"
+                                transcript_lines.append("Agent: " + agent_message + "\n")
                             else:
                                 agent_message = 'Agent message not found'
 
@@ -507,7 +463,8 @@ async def send_session_update(openai_ws):
     SESSION_UPDATE_CONFIG["session"]["instructions"] = await get_session_instructions()
     # 轉換為 JSON 並發送
     config_json = json.dumps(SESSION_UPDATE_CONFIG)
-    logger.info('Sending session update: %s', config_json)
+    logger.info('Sending session update (%d bytes)', len(config_json))
+    logger.debug('Session update: %s', config_json)
     await openai_ws.send(config_json)
 
 async def make_chat_gpt_completion(transcript: str) -> Dict[Any, Any]:
@@ -544,7 +501,7 @@ async def make_chat_gpt_completion(transcript: str) -> Dict[Any, Any]:
             **chat_completions_settings.get("response_format", {})  # using .get() to avoid KeyError if 'response_format' is missing
         }
         
-        response = http_requests.post(
+        response = await http_clients.get("openai").post(
             OPENAI_API_URL,
             headers=headers,
             json=payload
@@ -571,7 +528,7 @@ async def process_transcript_and_send(call_sid: str, transcript: str) -> None:
     try:
         # Make the ChatGPT completion call
         result = await make_chat_gpt_completion(transcript)
-        logger.info(f'Raw result from ChatGPT: {json.dumps(result, indent=2)}')
+        logger.debug('Raw result from ChatGPT: %s', result)
    
         if (result.get('choices') and 
             result['choices'][0].get('message') and 
@@ -599,12 +556,12 @@ async def process_transcript_and_send(call_sid: str, transcript: str) -> None:
             # Add transcription content
             call_records[call_sid]["transcript"].append(transcript) 
             call_records[call_sid]["parsed_content"].update(parsed_content)
-            logger.info(f'Call record for {call_sid}: {json.dumps(call_records[call_sid],ensure_ascii=False, indent=2)}')
+            logger.debug('Call record for %s: %s', call_sid, call_records[call_sid])
             logger.info(f'before call_webhook_for_call_result')
             await call_webhook_for_call_result(call_sid, parsed_content, transcript)
             logger.info(f'after call_webhook_for_call_result')
             # Clean up record
-            del call_records[call_sid]
+            call_records.pop(call_sid, None)
             logger.info(f"Cleaned up record for call {call_sid}")
         logger.info(f'After update call_records: {call_sid}')
     except Exception as error:
@@ -683,6 +640,8 @@ async def handle_call_status(request: Request):
         logger.info(f'CallDuration: {form_data.get("CallDuration")}')
         bool_should_call_webhook = True
     elif call_status in ["no-answer", "canceled", "busy", "failed"]:
+        # 沒有接通的通話不會有 transcript，直接移除記錄
+        call_records.pop(call_sid, None)
         retry_info = {
             "call_sid": call_sid,
             "result": "in-progress-noPickup",
@@ -707,7 +666,6 @@ async def handle_call_status(request: Request):
             }
             logger.info(f"WEBHOOK_URL_CALL_STATUS: {WEBHOOK_URL_CALL_STATUS}")
             logger.info(f"Calling webhook with payload: {payload}")
-            logger.info(f"async with httpx.AsyncClient() as client:")
 
             headers = {}
             environment = os.getenv('ENV', 'local')
@@ -722,35 +680,21 @@ async def handle_call_status(request: Request):
                     logger.error(f"Failed to get IAM token: {str(e)}")
                     raise
 
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    WEBHOOK_URL_CALL_STATUS,
-                    json=payload,
-                    headers=headers,
-                    timeout=30.0  # 增加超時時間
-                )
-                logger.info(f"Webhook response: {response.status_code}")
-                if response.status_code != 200:
-                    logger.error(f"Webhook error: {response.text}")
+            response = await http_clients.get("webhook").post(
+                WEBHOOK_URL_CALL_STATUS,
+                json=payload,
+                headers=headers,
+                timeout=30.0  # 增加超時時間
+            )
+            logger.info(f"Webhook response: {response.status_code}")
+            if response.status_code != 200:
+                logger.error(f"Webhook error: {response.text}")
                 
         except Exception as e:
             logger.error(f"Error calling webhook: {str(e)}")
             
     return JSONResponse(content={"status": "success"})
 
-async def get_id_token(target_audience: str) -> str:
-    """Get ID token for Cloud Run authentication"""
-    try:
-        auth_req = requests.Request()
-        credentials, project = google.auth.default()
-        credentials.refresh(auth_req)
-        
-        token = id_token.fetch_id_token(auth_req, target_audience)
-        return token
-    except Exception as e:
-        logger.error(f"Error getting ID token: {str(e)}")
-        raise
-
 async def call_webhook_for_call_result(call_sid: str, result: str, transcript: str):
     try:
         payload = {
@@ -776,16 +720,15 @@ async def call_webhook_for_call_result(call_sid: str, result: str, transcript: s
                 logger.error(f"Failed to get IAM token: {str(e)}")
                 raise
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                WEBHOOK_URL_CALL_RESULT,
-                json=payload,
-                headers=headers,
-                timeout=30.0  # 增加超時時間
-            )
-            logger.info(f"Webhook response: {response.status_code}")
-            if response.status_code != 200:
-                logger.error(f"Webhook error: {response.text}")
+        response = await http_clients.get("webhook").post(
+            WEBHOOK_URL_CALL_RESULT,
+            json=payload,
+            headers=headers,
+            timeout=30.0  # 增加超時時間
+        )
+        logger.info(f"Webhook response: {response.status_code}")
+        if response.status_code != 200:
+            logger.error(f"Webhook error: {response.text}")
                 
     except Exception as e:
         logger.error(f"Error calling webhook: {str(e)}")
@@ -0,0 +1,12 @@
+import os
+
+# 測試不會連線到外部服務，只需要讓模組層級的 Twilio / Supabase client 可以建立
+os.environ.setdefault('OPENAI_API_KEY', 'sk-test')
+os.environ.setdefault('TWILIO_ACCOUNT_SID', 'AC' + '0' * 32)
+os.environ.setdefault('TWILIO_AUTH_TOKEN', 'test-token')
+os.environ.setdefault('TWILIO_PHONE_NUMBER', '+886200000000')
+os.environ.setdefault('SUPABASE_URL', 'http://127.0.0.1:54321')
+os.environ.setdefault('SUPABASE_KEY', 'eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.test')
+os.environ.setdefault('ENV', 'local')
+# 測試不寫 logs/app.jsonl
+os.environ.setdefault('LOG_FILE', '')
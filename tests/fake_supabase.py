@@ -0,0 +1,66 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+class FakeSupabase:
+    """
+    本機的 Supabase (PostgREST) 替身
+
+    只實作 GET /rest/v1/<table>?select=...&id=eq.<id> 與 id=in.(...)，
+    每個請求延遲 latency 秒，並記錄每張表被查詢的次數。
+    """
+
+    def __init__(self, rows: dict, latency: float = 0.0):
+        self.rows = rows
+        self.latency = latency
+        self.requests = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                table = parsed.path.rsplit('/', 1)[-1]
+                query = parse_qs(parsed.query)
+                with fake._lock:
+                    fake.requests.append((table, query))
+                time.sleep(fake.latency)
+
+                id_filter = query.get('id', [''])[0]
+                if id_filter.startswith('eq.'):
+                    ids = [id_filter[3:]]
+                elif id_filter.startswith('in.('):
+                    ids = id_filter[4:-1].split(',')
+                else:
+                    ids = list(fake.rows)
+                body = json.dumps([fake.rows[i] for i in ids if i in fake.rows]).encode()
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "FakeSupabase":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
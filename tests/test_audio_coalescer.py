@@ -0,0 +1,103 @@
+import asyncio
+import base64
+import json
+
+from app.services.audio_coalescer import InboundAudioCoalescer
+from app.services.websocket_service import WebSocketManager
+
+FRAME_BYTES = 160  # Twilio 每 20 ms 一個 frame
+
+def frame(index: int) -> str:
+    return base64.b64encode(bytes([index]) * FRAME_BYTES).decode('ascii')
+
+def appended_audio(messages: list) -> list:
+    return [base64.b64decode(json.loads(message)['audio']) for message in messages]
+
+class Recorder:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, message: str) -> None:
+        self.sent.append(message)
+
+def test_window_flushes_once_enough_audio_is_buffered():
+    async def scenario():
+        recorder = Recorder()
+        coalescer = InboundAudioCoalescer(recorder.send, window_ms=60, max_delay_ms=1000)
+        for index in range(7):
+            await coalescer.push(frame(index))
+        coalescer.close()
+        return recorder, coalescer
+
+    recorder, coalescer = asyncio.run(scenario())
+
+    # 60 ms = 3 個 frame 合併成一次 append；最後一個 frame 在 close 時丟棄
+    assert appended_audio(recorder.sent) == [
+        bytes([0]) * FRAME_BYTES + bytes([1]) * FRAME_BYTES + bytes([2]) * FRAME_BYTES,
+        bytes([3]) * FRAME_BYTES + bytes([4]) * FRAME_BYTES + bytes([5]) * FRAME_BYTES,
+    ]
+    assert coalescer.stats()['frames_in'] == 7
+    assert coalescer.stats()['appends_out'] == 2
+
+def test_max_delay_timer_flushes_a_partial_window():
+    async def scenario():
+        recorder = Recorder()
+        coalescer = InboundAudioCoalescer(recorder.send, window_ms=60, max_delay_ms=80)
+        await coalescer.push(frame(0))
+        await asyncio.sleep(0.04)
+        assert recorder.sent == []
+        await asyncio.sleep(0.08)
+        coalescer.close()
+        return recorder, coalescer
+
+    recorder, coalescer = asyncio.run(scenario())
+
+    assert appended_audio(recorder.sent) == [bytes([0]) * FRAME_BYTES]
+    assert 0.08 <= coalescer.max_delay < 0.12
+
+def test_close_cancels_pending_timer_flush():
+    async def scenario():
+        recorder = Recorder()
+        coalescer = InboundAudioCoalescer(recorder.send, window_ms=60, max_delay_ms=60)
+        await coalescer.push(frame(0))
+        coalescer.close()
+        await asyncio.sleep(0.1)
+        return recorder
+
+    assert asyncio.run(scenario()).sent == []
+
+class FakeOpenAIPeer:
+    def __init__(self):
+        self.open = True
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+def test_stop_and_non_playback_marks_flush_but_playback_marks_do_not():
+    stream_sid = "MZ" + "1" * 32
+
+    async def scenario():
+        manager = WebSocketManager()
+        openai = FakeOpenAIPeer()
+
+        async def twilio(event: str, **fields) -> None:
+            await manager.handle_twilio_message(json.dumps({"event": event, "streamSid": stream_sid, **fields}), openai)
+
+        await twilio("start", start={"streamSid": stream_sid, "callSid": "CA1"})
+        manager.inbound_audio = InboundAudioCoalescer(manager.send_audio_to_openai, window_ms=1000, max_delay_ms=1000)
+        await twilio("media", media={"payload": frame(0)})
+        # agent 音訊的播放位置 mark
+        await twilio("mark", mark={"name": "item_a:800"})
+        depth_after_playback_mark = manager.to_openai.depth
+        await twilio("mark", mark={"name": "greeting_done"})
+        depth_after_other_mark = manager.to_openai.depth
+        await twilio("media", media={"payload": frame(1)})
+        await twilio("stop", stop={})
+        return manager, depth_after_playback_mark, depth_after_other_mark
+
+    manager, depth_after_playback_mark, depth_after_other_mark = asyncio.run(scenario())
+
+    assert depth_after_playback_mark == 0
+    assert depth_after_other_mark == 1
+    assert manager.to_openai.depth == 2
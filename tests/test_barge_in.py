@@ -0,0 +1,109 @@
+import asyncio
+import base64
+import json
+import time
+
+from app.services.websocket_service import WebSocketManager
+
+STREAM_SID = "MZ" + "1" * 32
+DELTA_BYTES = 800  # 100 ms 的 g711_ulaw
+
+class FakeTwilioPeer:
+    """模擬 Twilio Media Streams：每則訊息需要 frame_delay 秒才能寫出，讓音訊堆積在佇列中"""
+
+    def __init__(self, frame_delay: float):
+        self.frame_delay = frame_delay
+        self.received = []
+
+    async def send_text(self, message: str) -> None:
+        await asyncio.sleep(self.frame_delay)
+        self.received.append((time.monotonic(), json.loads(message)))
+
+    def events(self, event: str) -> list:
+        return [(at, data) for at, data in self.received if data['event'] == event]
+
+class FakeOpenAIPeer:
+    def __init__(self):
+        self.open = True
+        self.received = []
+
+    async def send(self, message: str) -> None:
+        self.received.append(json.loads(message))
+
+def audio_delta(item_id: str) -> str:
+    delta = base64.b64encode(b'\xff' * DELTA_BYTES).decode('ascii')
+    return json.dumps({
+        "type": "response.audio.delta", "event_id": "event_1", "response_id": "resp_1",
+        "item_id": item_id, "output_index": 0, "content_index": 0, "delta": delta
+    }, separators=(",", ":"))
+
+async def run_barge_in(played_marks: int, queued_deltas: int = 20):
+    twilio = FakeTwilioPeer(frame_delay=0.002)
+    openai = FakeOpenAIPeer()
+    manager = WebSocketManager()
+    pumps = [
+        asyncio.ensure_future(manager.to_twilio.drain_to(twilio.send_text)),
+        asyncio.ensure_future(manager.to_openai.drain_to(openai.send)),
+    ]
+
+    await manager.handle_twilio_message(json.dumps({
+        "event": "start", "start": {"streamSid": STREAM_SID, "callSid": "CA1"}
+    }), openai)
+    for _ in range(queued_deltas):
+        await manager.handle_openai_message(audio_delta("item_a"), twilio, openai)
+
+    # Twilio 回傳前幾個 mark，代表這些音訊已實際播放
+    for _ in range(played_marks):
+        await manager.handle_twilio_message(json.dumps({
+            "event": "mark", "streamSid": STREAM_SID, "mark": {"name": f"item_a:{DELTA_BYTES}"}
+        }), openai)
+
+    interrupted_at = time.monotonic()
+    await manager.handle_openai_message(json.dumps({
+        "type": "input_audio_buffer.speech_started", "audio_start_ms": 1000, "item_id": "item_user"
+    }), twilio, openai)
+    # OpenAI 取消前仍在途中的 delta 不應再送給 Twilio
+    await manager.handle_openai_message(audio_delta("item_a"), twilio, openai)
+
+    manager.to_twilio.close()
+    manager.to_openai.close()
+    await asyncio.gather(*pumps)
+    return manager, twilio, openai, interrupted_at
+
+def test_barge_in_clears_twilio_and_truncates_at_played_offset():
+    manager, twilio, openai, interrupted_at = asyncio.run(run_barge_in(played_marks=3))
+
+    clears = twilio.events('clear')
+    assert len(clears) == 1
+    cleared_at = clears[0][0]
+    # clear 之後不再有任何音訊送到 Twilio
+    assert not [data for at, data in twilio.received if at > cleared_at and data['event'] == 'media']
+    assert len(twilio.events('media')) < 20
+
+    truncates = [event for event in openai.received if event['type'] == 'conversation.item.truncate']
+    assert truncates == [{
+        "type": "conversation.item.truncate",
+        "item_id": "item_a",
+        "content_index": 0,
+        "audio_end_ms": 3 * DELTA_BYTES // 8
+    }]
+    assert manager.interruptions == 1
+
+    latency_ms = (cleared_at - interrupted_at) * 1000
+    # 最多只需等待一個正在寫出的 frame
+    assert latency_ms < 50
+
+def test_speech_without_agent_audio_does_not_interrupt():
+    async def scenario():
+        twilio = FakeTwilioPeer(frame_delay=0)
+        openai = FakeOpenAIPeer()
+        manager = WebSocketManager()
+        await manager.handle_openai_message(json.dumps({
+            "type": "input_audio_buffer.speech_started", "audio_start_ms": 0, "item_id": "item_user"
+        }), twilio, openai)
+        return manager
+
+    manager = asyncio.run(scenario())
+    assert manager.interruptions == 0
+    assert manager.to_twilio.depth == 0
+    assert manager.to_openai.depth == 0
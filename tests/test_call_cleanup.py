@@ -0,0 +1,74 @@
+import asyncio
+import json
+
+from app.services import call_service as call_service_module
+from app.services.call_service import CallService
+from app.services.session_store import CallRecord, InMemorySessionBackend, SessionStore
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+async def fake_chat_completion(transcript, previous_result=None, clients=None):
+    return {
+        "choices": [{"message": {"content": json.dumps({"summary": "看房"}, ensure_ascii=False)}}],
+        "usage": {"total_tokens": 100}
+    }
+
+def test_result_webhook_is_sent_after_the_record_expired_in_the_queue(monkeypatch):
+    clock = FakeClock()
+    previous = SessionStore.use_backend(InMemorySessionBackend(ttl_sec=7200, clock=clock))
+    webhooks = []
+
+    async def fake_webhook(call_sid, result, transcript):
+        webhooks.append((call_sid, result, transcript))
+
+    monkeypatch.setattr(call_service_module, "make_chat_completion", fake_chat_completion)
+    monkeypatch.setattr(call_service_module, "call_webhook_for_call_result", fake_webhook)
+
+    async def scenario():
+        await SessionStore.set_session("session-1", "CA1", CallRecord(project_id="p1", session_id="session-1"))
+        await SessionStore.finish_call("CA1", keep_record_sec=600)
+        # 擷取在 TPM 限流的佇列中等待超過保留時間
+        clock.now += 601
+        assert await SessionStore.get_call_record("CA1") is None
+        return await CallService().process_transcript("CA1", "User: 週末可以看房嗎\n")
+
+    try:
+        response = asyncio.run(scenario())
+    finally:
+        SessionStore.use_backend(previous)
+
+    assert response["usage"]["total_tokens"] == 100
+    assert webhooks == [("CA1", {"summary": "看房"}, "User: 週末可以看房嗎\n")]
+
+class FakeRequest:
+    def __init__(self, form):
+        self._form = form
+
+    async def form(self):
+        return self._form
+
+def test_status_webhook_is_enqueued_when_session_cleanup_fails(monkeypatch):
+    from app.handlers import call_handler
+
+    webhooks = []
+
+    async def fake_webhook(call_sid, status, timestamp):
+        webhooks.append((call_sid, status))
+
+    async def failing_finish_call(cls, call_sid, keep_record_sec=0):
+        raise ConnectionError("redis unavailable")
+
+    monkeypatch.setattr(call_handler, "call_webhook_for_call_status", fake_webhook)
+    monkeypatch.setattr(SessionStore, "finish_call", classmethod(failing_finish_call))
+
+    response = asyncio.run(call_handler.handle_call_status(
+        FakeRequest({"CallSid": "CA1", "CallStatus": "completed"}), CallService()
+    ))
+
+    assert json.loads(response.body) == {"status": "success"}
+    assert webhooks == [("CA1", "completed")]
@@ -0,0 +1,97 @@
+import asyncio
+import base64
+import json
+
+from app.main import metrics
+from app.services import websocket_service
+from app.services.websocket_service import WebSocketManager
+from app.utils.metrics import histogram_quantile, histogram_summary, sample_value
+
+class FakeTwilioPeer:
+    async def send_text(self, message: str) -> None:
+        pass
+
+class FakeOpenAIPeer:
+    open = True
+    closed = False
+
+    async def send(self, message: str) -> None:
+        pass
+
+    async def close(self) -> None:
+        self.closed = True
+
+def audio_delta(item_id: str, size: int = 800) -> str:
+    delta = base64.b64encode(b'\xff' * size).decode('ascii')
+    return json.dumps({"type": "response.audio.delta", "item_id": item_id, "delta": delta})
+
+def counts() -> dict:
+    return {
+        "turn": histogram_summary(websocket_service.TURN_LATENCY)["count"],
+        "first_audio": histogram_summary(websocket_service.TIME_TO_FIRST_AUDIO)["count"],
+        "response": histogram_summary(websocket_service.RESPONSE_DURATION)["count"],
+        "duration": histogram_summary(websocket_service.CALL_DURATION)["count"],
+        "frames_out": sample_value(websocket_service.RELAY_FRAMES, "_total", direction="openai_to_twilio"),
+        "bytes_out": sample_value(websocket_service.RELAY_BYTES, "_total", direction="openai_to_twilio"),
+        "frames_in": sample_value(websocket_service.RELAY_FRAMES, "_total", direction="twilio_to_openai"),
+        "bytes_in": sample_value(websocket_service.RELAY_BYTES, "_total", direction="twilio_to_openai"),
+    }
+
+class FakeExtractionQueue:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, call_sid, transcript, project_id=None, priority=None, incremental=None):
+        self.submitted.append(call_sid)
+
+def test_call_events_feed_latency_histograms_and_relay_counters(monkeypatch):
+    extraction_queue = FakeExtractionQueue()
+    monkeypatch.setattr(websocket_service, "extraction_queue", extraction_queue)
+    before = counts()
+
+    async def scenario():
+        manager = WebSocketManager()
+        twilio, openai = FakeTwilioPeer(), FakeOpenAIPeer()
+        await manager.handle_twilio_message(json.dumps({
+            "event": "start", "start": {"streamSid": "MZ1", "callSid": "CA1"}
+        }), openai)
+        await manager.handle_twilio_message(json.dumps({
+            "event": "media", "media": {"payload": base64.b64encode(b'\xff' * 160).decode('ascii')}
+        }), openai)
+        for event in (
+            {"type": "input_audio_buffer.speech_started", "item_id": "item_u1"},
+            {"type": "input_audio_buffer.speech_stopped", "item_id": "item_u1"},
+            {"type": "response.created", "response": {"id": "resp_1"}},
+        ):
+            await manager.handle_openai_message(json.dumps(event), twilio, openai)
+        await asyncio.sleep(0.02)
+        for _ in range(3):
+            await manager.handle_openai_message(audio_delta("item_a1"), twilio, openai)
+        await manager.handle_openai_message(json.dumps({"type": "response.done", "response": {"output": [
+            {"id": "item_a1", "content": [{"type": "audio", "transcript": "您好"}]}
+        ]}}), twilio, openai)
+        await manager.handle_twilio_message(json.dumps({"event": "stop", "stop": {}}), openai)
+
+    asyncio.run(scenario())
+    after = counts()
+
+    assert extraction_queue.submitted == ["CA1"]
+    assert after["turn"] == before["turn"] + 1
+    assert after["first_audio"] == before["first_audio"] + 1
+    assert after["response"] == before["response"] + 1
+    assert after["duration"] == before["duration"] + 1
+    assert after["frames_out"] == before["frames_out"] + 3
+    assert after["bytes_out"] == before["bytes_out"] + 2400
+    assert after["frames_in"] == before["frames_in"] + 1
+    assert after["bytes_in"] == before["bytes_in"] + 160
+    # 回合延遲至少包含 speech_stopped 後等待的 20 ms
+    assert histogram_quantile(websocket_service.TURN_LATENCY, 1.0) >= 0.02
+
+def test_metrics_route_renders_prometheus_text():
+    response = asyncio.run(metrics())
+    body = response.body.decode()
+
+    assert response.media_type.startswith("text/plain")
+    assert "# TYPE call_turn_latency_seconds histogram" in body
+    assert 'relay_frames_total{direction="openai_to_twilio"}' in body
+    assert "calls_active " in body
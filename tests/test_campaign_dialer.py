@@ -0,0 +1,214 @@
+import asyncio
+import time
+
+import pytest
+from twilio.base.exceptions import TwilioRestException
+
+from app.services import campaign_service
+from app.services.campaign_service import CampaignDialer
+from app.utils.rate_limit import TokenBucket
+
+class FakeCallService:
+    """模擬 CallService：記錄撥出時間，指定號碼建立通話失敗或回 429"""
+    calls = []
+    failing_numbers = set()
+    rate_limited = {}  # 號碼 -> 還要回幾次 429
+
+    async def initiate_outbound_call(self, to_number: str, project_id: str, hostname: str) -> dict:
+        FakeCallService.calls.append((time.monotonic(), to_number, project_id))
+        if to_number in FakeCallService.failing_numbers:
+            raise Exception("Failed to initiate call")
+        if FakeCallService.rate_limited.get(to_number, 0) > 0:
+            FakeCallService.rate_limited[to_number] -= 1
+            raise TwilioRestException(429, "https://api.twilio.com/Calls.json", "Too Many Requests", method="POST")
+        return {"call_sid": f"CA-{to_number}", "temp_session_id": "session"}
+
+@pytest.fixture(autouse=True)
+def fake_call_service(monkeypatch):
+    FakeCallService.calls = []
+    FakeCallService.failing_numbers = set()
+    FakeCallService.rate_limited = {}
+    monkeypatch.setattr(campaign_service, 'call_service', FakeCallService())
+
+async def wait_until_done(campaign, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not campaign.done:
+        assert time.monotonic() < deadline, campaign.progress()
+        await asyncio.sleep(0.005)
+
+def test_dialer_respects_cps_and_live_call_cap():
+    cps = 50
+    rows = [(f'+8869000000{i:02d}', '1') for i in range(12)]
+    FakeCallService.failing_numbers = {rows[5][0]}
+
+    async def scenario():
+        dialer = CampaignDialer(cps=cps, burst=1, max_live_calls=3, live_call_timeout=5)
+        max_live = 0
+
+        async def twilio_status_callbacks():
+            # 每通電話 40 ms 後結束
+            nonlocal max_live
+            live_since = {}
+            while True:
+                max_live = max(max_live, len(dialer._live))
+                for call_sid in list(dialer._live):
+                    live_since.setdefault(call_sid, time.monotonic())
+                    if time.monotonic() - live_since[call_sid] > 0.04:
+                        dialer.on_call_status(call_sid, 'completed')
+                await asyncio.sleep(0.002)
+
+        callbacks = asyncio.ensure_future(twilio_status_callbacks())
+        campaign = dialer.submit(rows, 'example.com', rejected=1)
+        await wait_until_done(campaign)
+        callbacks.cancel()
+        await dialer.close()
+        return campaign, max_live
+
+    campaign, max_live = asyncio.run(scenario())
+
+    started = [at for at, _, _ in FakeCallService.calls]
+    gaps = [b - a for a, b in zip(started, started[1:])]
+    assert len(started) == 12
+    assert min(gaps) >= 1 / cps * 0.9
+    assert max_live <= 3
+    progress = campaign.progress()
+    assert progress['status'] == 'completed'
+    assert progress['initiated'] == 11
+    assert progress['failed'] == 1
+    assert progress['rejected'] == 1
+    assert progress['call_statuses'] == {'completed': 11}
+    assert progress['pending'] == progress['dialing'] == progress['live'] == 0
+
+def test_cancel_skips_undialed_rows_and_timeout_releases_live_calls():
+    rows = [(f'+8869000000{i:02d}', '1') for i in range(10)]
+
+    async def scenario():
+        dialer = CampaignDialer(cps=1000, burst=10, max_live_calls=2, live_call_timeout=0.05)
+        campaign = dialer.submit(rows, 'example.com')
+        await asyncio.sleep(0.01)
+        # 兩通電話佔滿名額，沒有 /call-status 回調
+        dialer.cancel(campaign.campaign_id)
+        await wait_until_done(campaign)
+        await dialer.close()
+        return campaign
+
+    progress = asyncio.run(scenario()).progress()
+
+    assert progress['status'] == 'cancelled'
+    assert progress['initiated'] == 2
+    assert progress['skipped'] == 8
+    assert progress['call_statuses'] == {'timeout': 2}
+
+def test_token_bucket_allows_burst_then_limits_rate():
+    async def scenario():
+        bucket = TokenBucket(rate=100, capacity=5)
+        started = time.monotonic()
+        for _ in range(5):
+            await bucket.acquire()
+        burst_elapsed = time.monotonic() - started
+        for _ in range(10):
+            await bucket.acquire()
+        return burst_elapsed, time.monotonic() - started
+
+    burst_elapsed, total_elapsed = asyncio.run(scenario())
+
+    assert burst_elapsed < 0.01
+    assert total_elapsed >= 10 / 100 * 0.9
+
+def test_close_skips_rows_still_queued_in_dispatcher():
+    rows = [(f'+8869000000{i:02d}', '1') for i in range(10)]
+
+    async def scenario():
+        # 每秒一通：close 時大部分名單還在佇列中，dispatcher 正等待 token
+        dialer = CampaignDialer(cps=1, burst=1, max_live_calls=5, live_call_timeout=5)
+        first = dialer.submit(rows[:6], 'example.com')
+        second = dialer.submit(rows[6:], 'example.com')
+        await asyncio.sleep(0.05)
+        await dialer.close()
+        return dialer, first, second
+
+    dialer, first, second = asyncio.run(scenario())
+
+    assert len(FakeCallService.calls) == 1
+    assert dialer.stats()['queued'] == 0
+    first_progress, second_progress = first.progress(), second.progress()
+    assert first_progress['pending'] == second_progress['pending'] == 0
+    assert first_progress['initiated'] == 1 and first_progress['skipped'] == 5
+    assert first_progress['status'] == 'cancelling'
+    assert second_progress['skipped'] == 4
+    assert second_progress['status'] == 'cancelled'
+
+def test_rate_limited_calls_are_retried_with_backoff():
+    rows = [('+886900000001', '1'), ('+886900000002', '1')]
+    # 第一個號碼 429 兩次後成功；第二個號碼一直 429，用完重試次數後記為失敗
+    FakeCallService.rate_limited = {rows[0][0]: 2, rows[1][0]: 10}
+
+    async def scenario():
+        dialer = CampaignDialer(
+            cps=1000, burst=10, max_live_calls=5, live_call_timeout=0.05,
+            max_retries=2, retry_backoff=0.02
+        )
+        campaign = dialer.submit(rows, 'example.com')
+        await wait_until_done(campaign)
+        await dialer.close()
+        return campaign
+
+    progress = asyncio.run(scenario()).progress()
+
+    first_attempts = [at for at, number, _ in FakeCallService.calls if number == rows[0][0]]
+    gaps = [b - a for a, b in zip(first_attempts, first_attempts[1:])]
+    assert len(first_attempts) == 3
+    # 退避時間加倍（含 0.5~1 倍的隨機抖動）
+    assert gaps[0] >= 0.02 * 0.5 * 0.9
+    assert gaps[1] >= 0.04 * 0.5 * 0.9
+    assert len(FakeCallService.calls) == 6
+    assert progress['initiated'] == 1
+    assert progress['failed'] == 1
+    assert progress['retried'] == 4
+    assert progress['call_statuses'] == {'timeout': 1}
+
+def test_cancel_during_backoff_skips_the_retry():
+    rows = [('+886900000001', '1')]
+    FakeCallService.rate_limited = {rows[0][0]: 10}
+
+    async def scenario():
+        dialer = CampaignDialer(
+            cps=1000, burst=10, max_live_calls=1, live_call_timeout=5,
+            max_retries=3, retry_backoff=0.1
+        )
+        campaign = dialer.submit(rows, 'example.com')
+        await asyncio.sleep(0.02)
+        dialer.cancel(campaign.campaign_id)
+        await wait_until_done(campaign)
+        # 名額已釋放
+        assert dialer._live_slots.locked() is False
+        await dialer.close()
+        return campaign
+
+    progress = asyncio.run(scenario()).progress()
+
+    assert len(FakeCallService.calls) == 1
+    assert progress['status'] == 'cancelled'
+    assert progress['skipped'] == 1
+    assert progress['failed'] == 0
+
+def test_finished_campaigns_are_pruned_by_age_and_count(monkeypatch):
+    async def scenario():
+        dialer = CampaignDialer(
+            cps=1000, burst=10, max_live_calls=5, live_call_timeout=5,
+            retention_sec=60, max_finished=2
+        )
+        # 空名單建立後立即結束
+        finished = [dialer.submit([], 'example.com') for _ in range(3)]
+        running = dialer.submit([('+886900000001', '1')], 'example.com')
+        # 超出筆數上限：最早結束的一筆已被移除
+        assert list(dialer.campaigns) == [c.campaign_id for c in finished[1:]] + [running.campaign_id]
+
+        now = time.time()
+        monkeypatch.setattr(campaign_service.time, 'time', lambda: now + 61)
+        latest = dialer.submit([], 'example.com')
+        # 超過保留時間的已結束名單被移除，進行中的名單保留
+        assert set(dialer.campaigns) == {running.campaign_id, latest.campaign_id}
+        await dialer.close()
+
+    asyncio.run(scenario())
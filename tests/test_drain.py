@@ -0,0 +1,184 @@
+import asyncio
+import signal
+
+import httpx
+import uvicorn
+
+from app.dependencies.services import ServiceContainer
+from app.main import DrainingServer, app
+from app.services.drain import DRAINED, DRAINING_CALLS, FLUSHING, SERVING, DrainController
+
+class FakeStream:
+    def __init__(self, call_sid):
+        self.call_sid = call_sid
+
+class FakeDialer:
+    def __init__(self):
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+    def stats(self):
+        return {"queued": 0}
+
+class FakeExtractionQueue:
+    def __init__(self):
+        self.depth = 1
+        self.in_service = 0
+
+    async def join(self, timeout=None):
+        await asyncio.sleep(0.02)
+        self.depth = 0
+        return True
+
+class FakeOutbox:
+    def __init__(self):
+        self.depth = 1
+        self.inflight = 0
+
+class FakeServices:
+    def __init__(self, drain):
+        self.drain = drain
+        self.active_streams = {}
+        self.campaign_dialer = FakeDialer()
+        self.extraction_queue = FakeExtractionQueue()
+        self.webhook_outbox = FakeOutbox()
+
+def test_drain_waits_for_active_calls_then_flushes():
+    drain = DrainController(call_deadline_sec=5, flush_timeout_sec=5, call_timeout_sec=60, poll_interval=0.01)
+    services = FakeServices(drain)
+
+    async def scenario():
+        drain.call_started("CA1")
+        # 來電沒有撥出記錄，只在 media stream 中
+        services.active_streams["stream-1"] = FakeStream("CA1")
+        services.active_streams["stream-2"] = FakeStream("CA2")
+        assert drain.active_calls(services) == 2
+
+        task = drain.start(services)
+        assert drain.start(services) is task
+        assert drain.phase == DRAINING_CALLS and drain.draining
+        await asyncio.sleep(0.03)
+        assert services.campaign_dialer.closed
+        assert drain.status(services)["active_calls"] == 2
+
+        drain.call_finished("CA1")
+        del services.active_streams["stream-1"]
+        del services.active_streams["stream-2"]
+        await asyncio.sleep(0.03)
+        assert drain.phase == FLUSHING
+
+        services.webhook_outbox.depth = 0
+        assert await drain.wait(timeout=1)
+        status = drain.status(services)
+        assert status["phase"] == DRAINED and status["drained"] and not status["ready"]
+        assert status["extraction_queue"]["depth"] == 0
+
+    asyncio.run(scenario())
+
+def test_drain_gives_up_on_calls_after_deadline():
+    drain = DrainController(call_deadline_sec=5, flush_timeout_sec=0.05, call_timeout_sec=60, poll_interval=0.01)
+    services = FakeServices(drain)
+
+    async def scenario():
+        drain.call_started("CA1")
+        drain.start(services, call_deadline_sec=0.05)
+        assert await drain.wait(timeout=1)
+        assert drain.phase == DRAINED
+        # 沒有在期限內清空的 outbox 留待下次啟動處理
+        assert services.webhook_outbox.depth == 1
+
+    asyncio.run(scenario())
+
+def test_routes_refuse_new_calls_while_draining():
+    services = ServiceContainer()
+    services.drain = DrainController(call_deadline_sec=0, flush_timeout_sec=0, call_timeout_sec=60)
+    app.state.services = services
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://example.test") as client:
+            response = await client.get("/ready")
+            assert response.status_code == 200
+            assert (await client.get("/drain/status")).json()["phase"] == SERVING
+
+            services.drain.phase = DRAINING_CALLS
+            assert (await client.get("/ready")).status_code == 503
+            assert (await client.post("/makecall")).status_code == 503
+            assert (await client.post("/campaigns")).status_code == 503
+            response = await client.post("/incoming-call")
+            assert '<Reject reason="busy" />' in response.text
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        del app.state.services
+
+def test_drain_requires_auth_outside_local(monkeypatch):
+    from app.config import settings
+
+    services = ServiceContainer()
+    services.drain = DrainController(call_deadline_sec=0, flush_timeout_sec=0, call_timeout_sec=60)
+    app.state.services = services
+    monkeypatch.setattr(settings, "environment", "production")
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://example.test") as client:
+            response = await client.post("/drain")
+            assert response.status_code == 401
+            assert not services.drain.draining
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        del app.state.services
+
+def test_sigterm_waits_for_drain_started_by_prestop():
+    drain = DrainController(call_deadline_sec=5, flush_timeout_sec=5, call_timeout_sec=60, poll_interval=0.01)
+    services = FakeServices(drain)
+    services.webhook_outbox.depth = 0
+    app.state.services = services
+    server = DrainingServer(uvicorn.Config(app))
+
+    async def scenario():
+        drain.call_started("CA1")
+        # preStop：POST /drain，接著 SIGTERM
+        drain.start(services)
+        server.handle_exit(signal.SIGTERM, None)
+        await asyncio.sleep(0.05)
+        assert not server.should_exit
+
+        drain.call_finished("CA1")
+        assert await drain.wait(timeout=1)
+        await asyncio.sleep(0)
+        assert server.should_exit
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        del app.state.services
+
+def test_second_sigterm_exits_without_waiting():
+    drain = DrainController(call_deadline_sec=5, flush_timeout_sec=5, call_timeout_sec=60, poll_interval=0.01)
+    services = FakeServices(drain)
+    app.state.services = services
+    server = DrainingServer(uvicorn.Config(app))
+
+    async def scenario():
+        drain.call_started("CA1")
+        server.handle_exit(signal.SIGTERM, None)
+        await asyncio.sleep(0.03)
+        assert drain.draining and not server.should_exit
+
+        server.handle_exit(signal.SIGTERM, None)
+        assert server.should_exit
+        drain.call_finished("CA1")
+        services.webhook_outbox.depth = 0
+        assert await drain.wait(timeout=1)
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        del app.state.services
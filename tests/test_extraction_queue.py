@@ -0,0 +1,129 @@
+import asyncio
+import time
+
+from app.services.extraction_queue import ExtractionQueue, estimate_tokens, parse_project_priorities
+
+class FakeExtractor:
+    """模擬 CallService.process_transcript：延遲 latency 秒後回傳帶 usage 的 Chat Completion 回應"""
+
+    def __init__(self, latency: float = 0.0, total_tokens: int = 0, fail_on=()):
+        self.latency = latency
+        self.total_tokens = total_tokens
+        self.fail_on = set(fail_on)
+        self.processed = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def process(self, call_sid: str, transcript: str, incremental=None) -> dict:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+            self.processed.append(call_sid)
+            if call_sid in self.fail_on:
+                raise RuntimeError("chat completion failed")
+            return {"usage": {"total_tokens": self.total_tokens}} if self.total_tokens else {}
+        finally:
+            self.in_flight -= 1
+
+def make_queue(extractor: FakeExtractor, workers: int = 2, tokens_per_minute: float = 600000, priorities=None) -> ExtractionQueue:
+    return ExtractionQueue(
+        workers=workers,
+        tokens_per_minute=tokens_per_minute,
+        max_completion_tokens=100,
+        project_priorities=priorities or {},
+        process=extractor.process
+    )
+
+def test_parse_project_priorities_and_estimate_tokens():
+    assert parse_project_priorities("") == {}
+    assert parse_project_priorities(" vip:10, 42:5,low:-1 ") == {"vip": 10, "42": 5, "low": -1}
+    assert estimate_tokens("您好") == 3
+    assert estimate_tokens("a" * 40) == 11
+
+def test_concurrency_is_bounded_by_workers_and_failures_are_counted():
+    extractor = FakeExtractor(latency=0.02, fail_on={"CA3"})
+
+    async def scenario():
+        queue = make_queue(extractor, workers=3)
+        for i in range(12):
+            queue.submit(f"CA{i}", "Agent: 您好\n")
+        assert await queue.join(timeout=5)
+        stats = queue.stats()
+        await queue.close()
+        return stats
+
+    stats = asyncio.run(scenario())
+
+    assert len(extractor.processed) == 12
+    assert extractor.max_in_flight == 3
+    assert stats["completed"] == 11 and stats["failed"] == 1
+    assert stats["depth"] == 0 and stats["in_service"] == 0
+    assert stats["queue_wait_sec"]["count"] >= 12
+
+def test_higher_priority_projects_are_processed_first():
+    extractor = FakeExtractor(latency=0.01)
+
+    async def scenario():
+        queue = make_queue(extractor, workers=1, priorities={"vip": 10})
+        # 第一筆先佔住唯一的 worker，其餘依優先序排隊
+        queue.submit("CA-first", "x", project_id="normal")
+        await asyncio.sleep(0)
+        queue.submit("CA-normal-1", "x", project_id="normal")
+        queue.submit("CA-vip-1", "x", project_id="vip")
+        queue.submit("CA-normal-2", "x", project_id="normal")
+        queue.submit("CA-vip-2", "x", project_id="vip")
+        queue.submit("CA-urgent", "x", project_id="normal", priority=99)
+        await queue.join(timeout=5)
+        await queue.close()
+
+    asyncio.run(scenario())
+
+    assert extractor.processed == ["CA-first", "CA-urgent", "CA-vip-1", "CA-vip-2", "CA-normal-1", "CA-normal-2"]
+
+def test_tokens_per_minute_limit_throttles_and_uses_actual_usage():
+    # 每分鐘 6000 token = 每秒 100：每筆實際用量 50 token，預估約 101
+    extractor = FakeExtractor(total_tokens=50)
+
+    async def scenario():
+        queue = make_queue(extractor, workers=4, tokens_per_minute=6000)
+        queue._bucket._tokens = 0
+        started = time.monotonic()
+        for i in range(4):
+            queue.submit(f"CA{i}", "")
+        await queue.join(timeout=10)
+        elapsed = time.monotonic() - started
+        await queue.close()
+        return elapsed
+
+    elapsed = asyncio.run(scenario())
+
+    # 只依預估會需要約 4 秒；完成後退回多扣的 token，實際約 2.5 秒
+    assert 1.5 < elapsed < 3.5
+    assert len(extractor.processed) == 4
+
+def test_in_call_chat_shares_the_tokens_per_minute_bucket():
+    calls = []
+
+    async def chat(transcript, previous_result=None):
+        calls.append(time.monotonic())
+        return {"usage": {"total_tokens": 500}}
+
+    async def scenario():
+        queue = make_queue(FakeExtractor(), tokens_per_minute=6000)
+        metered_chat = queue.metered(chat)
+        started = time.monotonic()
+        # bucket 為空時需等待補充預估的約 100 token（每秒 100）
+        queue._bucket._tokens = 0
+        await metered_chat("Agent: 您好\n", {"lines": []})
+        waited = calls[0] - started
+        # 實際用量超過預估，差額計入 bucket，通話後的擷取需等待補回
+        tokens_after = queue._bucket.tokens
+        stats = queue.stats()
+        return waited, tokens_after, stats
+
+    waited, tokens_after, stats = asyncio.run(scenario())
+
+    assert 0.8 < waited < 2.0
+    assert tokens_after < -350
+    assert stats["in_call_runs"] == 1
@@ -0,0 +1,45 @@
+import asyncio
+
+from aiohttp import web
+
+from app.utils.http_client import HttpClientRegistry
+
+async def start_stub(peers: list):
+    async def webhook(request):
+        peers.append(request.transport.get_extra_info('peername'))
+        return web.json_response({"status": "ok"})
+
+    app = web.Application()
+    app.router.add_post('/webhook', webhook)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    return runner, f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/webhook"
+
+def test_registry_reuses_connections_until_closed():
+    async def scenario():
+        peers = []
+        runner, url = await start_stub(peers)
+        registry = HttpClientRegistry()
+        await registry.startup("webhook")
+        client = registry.get("webhook")
+        try:
+            for _ in range(10):
+                response = await registry.get("webhook").post(url, json={"call_id": "CA1"})
+                assert response.status_code == 200
+            same_client = registry.get("webhook") is client
+            await registry.close()
+            closed = client.is_closed
+            # 關閉後再次取得會建立新的 client
+            reopened = registry.get("webhook")
+            await registry.close()
+        finally:
+            await runner.cleanup()
+        return peers, same_client, closed, reopened is not client
+
+    peers, same_client, closed, reopened = asyncio.run(scenario())
+
+    assert len(peers) == 10
+    assert len(set(peers)) == 1
+    assert same_client and closed and reopened
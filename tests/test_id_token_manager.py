@@ -0,0 +1,136 @@
+import asyncio
+import base64
+import json
+import threading
+import time
+
+from app.dependencies.auth import IdTokenManager, token_expiry
+
+def make_jwt(audience: str, exp: float) -> str:
+    def encode(data: dict) -> str:
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip('=')
+    return f"{encode({'alg': 'RS256'})}.{encode({'aud': audience, 'exp': exp})}.signature"
+
+class FakeMetadataServer:
+    """模擬 google.oauth2.id_token.fetch_id_token：阻塞 latency 秒，發出 lifetime 秒後過期的 token"""
+
+    def __init__(self, lifetime: float, latency: float = 0.0):
+        self.lifetime = lifetime
+        self.latency = latency
+        self.fetches = []
+
+    def fetch(self, audience: str) -> str:
+        self.fetches.append((audience, threading.current_thread() is threading.main_thread()))
+        time.sleep(self.latency)
+        return make_jwt(audience, time.time() + self.lifetime)
+
+def test_token_expiry_reads_exp_claim():
+    assert token_expiry(make_jwt('https://hooks', 1700000000)) == 1700000000
+    assert token_expiry('not-a-jwt') is None
+
+def test_concurrent_callers_share_one_fetch_per_audience():
+    server = FakeMetadataServer(lifetime=3600, latency=0.1)
+
+    async def scenario():
+        manager = IdTokenManager(refresh_margin=300, fetch=server.fetch)
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker_task = asyncio.ensure_future(ticker())
+        tokens = await asyncio.gather(
+            *(manager.get('https://a') for _ in range(20)),
+            *(manager.get('https://b') for _ in range(20))
+        )
+        ticker_task.cancel()
+        cached = await manager.get('https://a')
+        manager.close()
+        return tokens, cached, ticks, manager.stats()
+
+    tokens, cached, ticks, stats = asyncio.run(scenario())
+
+    assert sorted(audience for audience, _ in server.fetches) == ['https://a', 'https://b']
+    # 阻塞的取得在執行緒中執行，event loop 持續運作
+    assert not any(on_main_thread for _, on_main_thread in server.fetches)
+    assert ticks >= 5
+    assert len(set(tokens[:20])) == 1 and len(set(tokens[20:])) == 1
+    assert tokens[0] != tokens[20]
+    assert cached == tokens[0]
+    assert stats['hits'] == 1
+
+def test_token_is_refreshed_in_background_before_expiry():
+    server = FakeMetadataServer(lifetime=31.2, latency=0.01)
+
+    async def scenario():
+        # 31.2 秒後過期、提前 1 秒更新：第一次取得約 0.2 秒後在背景更新
+        manager = IdTokenManager(refresh_margin=31, fetch=server.fetch)
+        first = await manager.get('https://hooks')
+        await asyncio.sleep(0.4)
+        started = time.monotonic()
+        second = await manager.get('https://hooks')
+        elapsed = time.monotonic() - started
+        manager.close()
+        return first, second, elapsed, manager.stats()
+
+    first, second, elapsed, stats = asyncio.run(scenario())
+
+    assert len(server.fetches) >= 2
+    assert first != second
+    assert elapsed < 0.005
+    assert stats['waits'] == 1
+
+def test_protected_routes_verify_id_token_audience(monkeypatch):
+    import httpx
+
+    from app.config import settings
+    from app.dependencies import auth
+    from app.dependencies.services import ServiceContainer
+    from app.main import app
+    from app.services.drain import DrainController
+
+    verified = []
+
+    def fake_verify(token, request, audience):
+        # 模擬 google.oauth2.id_token.verify_oauth2_token：簽章或 audience 不符時拋出 ValueError
+        verified.append((token, audience))
+        if token != 'valid-token':
+            raise ValueError("Token has wrong audience")
+        return {'aud': audience, 'email': 'deployer@example.iam.gserviceaccount.com'}
+
+    monkeypatch.setattr(auth.id_token, 'verify_oauth2_token', fake_verify)
+    monkeypatch.setattr(settings, 'environment', 'production')
+    monkeypatch.setattr(settings, 'auth_audience', 'https://voice.example.com')
+    services = ServiceContainer()
+    services.drain = DrainController(call_deadline_sec=0, flush_timeout_sec=0, call_timeout_sec=60)
+    app.state.services = services
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://example.test") as client:
+            for path in ("/drain", "/project-settings/invalidate"):
+                response = await client.post(path, headers={"Authorization": "Bearer forged"})
+                assert response.status_code == 401
+            assert not services.drain.draining
+
+            response = await client.post("/project-settings/invalidate", headers={"Authorization": "Bearer valid-token"})
+            assert response.status_code == 200
+
+            monkeypatch.setattr(settings, 'auth_audience', '')
+            response = await client.post("/drain", headers={"Authorization": "Bearer valid-token"})
+            assert response.status_code == 401
+            assert not services.drain.draining
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        del app.state.services
+
+    assert verified == [
+        ('forged', 'https://voice.example.com'),
+        ('forged', 'https://voice.example.com'),
+        ('valid-token', 'https://voice.example.com'),
+    ]
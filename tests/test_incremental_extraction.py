@@ -0,0 +1,113 @@
+import asyncio
+import json
+
+from app.services.incremental_extraction import IncrementalExtractor
+from app.services.transcript import AGENT, USER, Transcript
+
+class FakeChat:
+    """模擬 make_chat_completion：把先前結果的 lines 加上新的對話行，延遲 latency 秒後回傳"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = []
+
+    async def complete(self, transcript: str, previous_result=None) -> dict:
+        self.calls.append((transcript, previous_result))
+        await asyncio.sleep(self.latency)
+        lines = (previous_result or {}).get("lines", []) + transcript.splitlines()
+        return {
+            "choices": [{"message": {"content": json.dumps({"lines": lines}, ensure_ascii=False)}}],
+            "usage": {"total_tokens": len(transcript)}
+        }
+
+def test_turns_are_debounced_and_sent_once():
+    chat = FakeChat(latency=0.05)
+
+    async def scenario():
+        transcript = Transcript()
+        extractor = IncrementalExtractor("CA1", transcript, debounce_sec=0.05, chat=chat.complete)
+        # 連續的回應在 debounce 內只觸發一次擷取
+        for i in range(3):
+            transcript.add(USER, f"u{i}")
+            transcript.add(AGENT, f"a{i}")
+            extractor.schedule()
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.2)
+        runs_during_call = extractor.runs
+
+        transcript.add(USER, "bye")
+        transcript.add(AGENT, "再見")
+        result, response = await extractor.finalize()
+        return runs_during_call, result, response
+
+    runs_during_call, result, response = asyncio.run(scenario())
+
+    assert runs_during_call == 1
+    assert chat.calls[0] == ("User: u0\nAgent: a0\nUser: u1\nAgent: a1\nUser: u2\nAgent: a2\n", None)
+    # 掛斷時只送出最後的新對話，並附上先前的結果
+    assert chat.calls[1][0] == "User: bye\nAgent: 再見\n"
+    assert chat.calls[1][1]["lines"][-1] == "Agent: a2"
+    assert result["lines"] == ["User: u0", "Agent: a0", "User: u1", "Agent: a1", "User: u2", "Agent: a2", "User: bye", "Agent: 再見"]
+    assert response["usage"]["total_tokens"] == len("User: bye\nAgent: 再見\n")
+
+def test_finalize_waits_for_in_flight_run_and_skips_empty_delta():
+    chat = FakeChat(latency=0.1)
+
+    async def scenario():
+        transcript = Transcript()
+        extractor = IncrementalExtractor("CA1", transcript, debounce_sec=0.01, chat=chat.complete)
+        transcript.add(USER, "hi")
+        transcript.add(AGENT, "hello")
+        extractor.schedule()
+        await asyncio.sleep(0.03)
+        # 擷取進行中掛斷：等它完成後，沒有新對話就不再呼叫
+        return await extractor.finalize()
+
+    result, response = asyncio.run(scenario())
+
+    assert len(chat.calls) == 1
+    assert result == {"lines": ["User: hi", "Agent: hello"]}
+    assert response is None
+
+def test_failed_run_is_retried_with_the_remaining_turns():
+    chat = FakeChat()
+    failures = [RuntimeError("timeout")]
+
+    async def flaky(transcript, previous_result=None):
+        if failures:
+            chat.calls.append((transcript, previous_result))
+            raise failures.pop()
+        return await chat.complete(transcript, previous_result)
+
+    async def scenario():
+        transcript = Transcript()
+        extractor = IncrementalExtractor("CA1", transcript, debounce_sec=0.01, chat=flaky)
+        transcript.add(USER, "hi")
+        extractor.schedule()
+        await asyncio.sleep(0.05)
+        transcript.add(AGENT, "hello")
+        return await extractor.finalize()
+
+    result, _ = asyncio.run(scenario())
+
+    assert [text for text, _ in chat.calls] == ["User: hi\n", "User: hi\nAgent: hello\n"]
+    assert result == {"lines": ["User: hi", "Agent: hello"]}
+
+def test_finalize_uses_final_chat():
+    in_call, final = FakeChat(), FakeChat()
+
+    async def scenario():
+        transcript = Transcript()
+        extractor = IncrementalExtractor("CA1", transcript, debounce_sec=0.01, chat=in_call.complete, final_chat=final.complete)
+        transcript.add(USER, "hi")
+        extractor.schedule()
+        await asyncio.sleep(0.05)
+        transcript.add(AGENT, "bye")
+        return await extractor.finalize()
+
+    result, _ = asyncio.run(scenario())
+
+    # 通話中經由限流的 chat，掛斷後在擷取佇列的 worker 內直接呼叫
+    assert [call[0] for call in in_call.calls] == ["User: hi\n"]
+    assert [call[0] for call in final.calls] == ["Agent: bye\n"]
+    assert result["lines"] == ["User: hi", "Agent: bye"]
@@ -0,0 +1,64 @@
+import io
+import json
+import logging
+
+import pytest
+
+from app.utils import log_utils
+
+@pytest.fixture
+def captured():
+    """把背景寫入執行緒的 console 輸出導到 StringIO，測試後恢復預設設定"""
+    stream = io.StringIO()
+    log_utils.configure(console_format='json', file_path='', console_stream=stream)
+    yield stream
+    log_utils.configure()
+
+def read_lines(stream: io.StringIO) -> list:
+    log_utils.stop()  # 寫完佇列中的紀錄
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+def test_records_are_written_as_json_lines_with_extra_fields(captured):
+    logger = log_utils.setup_logger("test.json_lines")
+    logger.info("Call %s answered in %d ms", "CA1", 120, extra={"call_sid": "CA1"})
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logger.exception("Webhook failed")
+
+    first, second = read_lines(captured)
+
+    assert first["message"] == "Call CA1 answered in 120 ms"
+    assert first["level"] == "INFO" and first["logger"] == "test.json_lines"
+    assert first["call_sid"] == "CA1"
+    assert second["level"] == "ERROR" and "ValueError: boom" in second["exc"]
+
+def test_primitive_args_are_formatted_on_the_listener_thread():
+    record = logging.LogRecord("test", logging.INFO, __file__, 1, "%s took %d ms", ("relay", 5), None)
+    prepared = log_utils.queue_handler.prepare(record)
+    assert prepared.args == ("relay", 5)
+
+    # 可變的參數在呼叫端先組成字串，避免之後被修改
+    call_record = {"status": "ringing"}
+    record = logging.LogRecord("test", logging.INFO, __file__, 1, "record %s", (call_record,), None)
+    prepared = log_utils.queue_handler.prepare(record)
+    call_record["status"] = "completed"
+    assert prepared.args is None and prepared.msg == "record {'status': 'ringing'}"
+
+def test_per_category_level_and_sampling(captured):
+    events = log_utils.setup_logger("test.category.events")
+    frames = log_utils.setup_logger("test.category.frames")
+    log_utils.set_sampling("test.category.events", 0.1)
+    log_utils.set_level("test.category.frames", logging.WARNING)
+
+    for i in range(100):
+        events.info("event %d", i)
+        frames.info("frame %d", i)
+    events.warning("never sampled")
+
+    lines = read_lines(captured)
+    messages = [line["message"] for line in lines]
+
+    assert [m for m in messages if m.startswith("event")] == [f"event {i}" for i in range(0, 100, 10)]
+    assert not [m for m in messages if m.startswith("frame")]
+    assert "never sampled" in messages
@@ -0,0 +1,56 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.dependencies.services import ServiceContainer
+from app.constants import TWILIO_VOICE_SETTINGS
+from app.main import app
+from app.services import call_service as call_service_module
+from app.services.call_service import CallService
+from app.services.node_affinity import NodeRouter
+from app.services.settings_service import Settings_Init_FromDB
+
+def test_session_ids_encode_the_owning_node():
+    router = NodeRouter("node-a", "{node}.voice.example.com")
+    session_id = router.new_session_id()
+
+    assert session_id.startswith("node-a.")
+    assert NodeRouter.owner(session_id) == "node-a"
+    assert router.is_local(session_id)
+    assert not router.is_local("node-b." + session_id.partition(".")[2])
+    assert router.host_for(session_id, "lb.example.com") == "node-a.voice.example.com"
+
+    # 舊格式與停用時沿用請求的 hostname
+    assert NodeRouter.owner("0b9c6a5e-2f4e-4c1e-9d3a-6f1f1b1e2a3c") is None
+    assert router.host_for("0b9c6a5e-2f4e-4c1e-9d3a-6f1f1b1e2a3c", "lb.example.com") == "lb.example.com"
+    assert NodeRouter("", "{node}.voice.example.com").is_local("node-b.x")
+    assert NodeRouter().new_session_id().count(".") == 0
+
+    with pytest.raises(ValueError):
+        NodeRouter("node.a")
+
+def test_twiml_redirects_to_the_owner_and_streams_to_its_hostname(monkeypatch):
+    router = NodeRouter("node-a", "{node}.voice.example.com")
+    monkeypatch.setattr(call_service_module, "node_router", router)
+    monkeypatch.setattr("app.routers.twiml.node_router", router)
+    # 不連 Supabase，使用預設的語音設定
+    monkeypatch.setattr(Settings_Init_FromDB, "twilio_voice_settings", TWILIO_VOICE_SETTINGS)
+    app.state.services = ServiceContainer()
+    app.state.services.call_service = CallService()
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="https://lb.example.com") as client:
+            foreign = await client.post("/twiml", params={"session_id": "node-b.1234"})
+            local = await client.post("/twiml", params={"session_id": "node-a.5678"})
+        return foreign.text, local.text
+
+    try:
+        foreign, local = asyncio.run(scenario())
+    finally:
+        del app.state.services
+
+    assert '<Redirect method="POST">https://node-b.voice.example.com/twiml?session_id=node-b.1234</Redirect>' in foreign
+    assert "<Say" not in foreign
+    assert 'url="wss://node-a.voice.example.com/media-stream/node-a.5678"' in local
@@ -0,0 +1,69 @@
+import asyncio
+import json
+
+from app.services.openai_event_router import OpenAIEventRouter, extract_string_field, peek_event_type
+
+def test_peek_event_type_reads_top_level_type():
+    assert peek_event_type('{"type":"response.audio.delta","delta":"AAAA"}') == "response.audio.delta"
+    # 冒號後的空白
+    assert peek_event_type('{"type": \t"session.updated"}') == "session.updated"
+    assert peek_event_type('{ "type" : "error" }') == "error"
+
+def test_peek_event_type_ignores_nested_type():
+    message = json.dumps({"item": {"type": "message"}, "type": "conversation.item.created"})
+    assert peek_event_type(message) == "conversation.item.created"
+    assert peek_event_type(json.dumps({"item": {"type": "message"}})) is None
+    assert peek_event_type('[{"type":"error"}]') is None
+    assert peek_event_type('not json') is None
+
+def test_peek_event_type_unescapes_through_json():
+    message = json.dumps({"type": 'odd"type'})
+    assert peek_event_type(message) == 'odd"type'
+
+def test_extract_string_field_matches_json_loads():
+    messages = [
+        {"type": "response.audio.delta", "item_id": "item_1", "delta": "AAAA+/=="},
+        {"type": "x", "delta": "line\nbreak \"quoted\" \\ slash"},
+        {"type": "x", "delta": "中文"},
+        {"type": "x", "delta": None},
+        {"type": "x", "delta": 3},
+        {"type": "x"},
+    ]
+    for data in messages:
+        expected = data.get("delta") if isinstance(data.get("delta"), str) else None
+        for separators in ((",", ":"), (", ", ": ")):
+            message = json.dumps(data, separators=separators, ensure_ascii=False)
+            assert extract_string_field(message, "delta") == expected, message
+
+def test_extract_string_field_ignores_nested_and_string_occurrences():
+    nested_first = json.dumps({"type": "x", "part": {"delta": "nested"}, "delta": "top"})
+    assert extract_string_field(nested_first, "delta") == "top"
+    nested_only = json.dumps({"type": "x", "part": {"delta": "nested"}})
+    assert extract_string_field(nested_only, "delta") is None
+    in_array = json.dumps({"type": "x", "items": [{"item_id": "a"}], "item_id": "b"})
+    assert extract_string_field(in_array, "item_id") == "b"
+    in_string = json.dumps({"type": "x", "transcript": 'say "delta": "no"', "delta": "yes"})
+    assert extract_string_field(in_string, "delta") == "yes"
+
+def test_router_dispatches_raw_and_parsed_handlers():
+    received = []
+
+    async def raw_handler(message):
+        received.append(("raw", message))
+
+    async def handler(data):
+        received.append(("parsed", data["type"]))
+
+    async def scenario():
+        router = OpenAIEventRouter()
+        router.on_raw("response.audio.delta", raw_handler)
+        router.on("session.updated", handler)
+        await router.dispatch('{"type":"response.audio.delta","delta":"AA"}')
+        await router.dispatch('{"type":"session.updated","session":{"type":"realtime"}}')
+        await router.dispatch('{"type":"rate_limits.updated"}')
+
+    asyncio.run(scenario())
+    assert received == [
+        ("raw", '{"type":"response.audio.delta","delta":"AA"}'),
+        ("parsed", "session.updated"),
+    ]
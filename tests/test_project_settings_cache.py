@@ -0,0 +1,164 @@
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.services import supabase_service
+from app.utils.async_cache import AsyncTTLCache
+from tests.fake_supabase import FakeSupabase
+
+def project_row(project_id: str, prompts: str) -> dict:
+    return {
+        'id': int(project_id),
+        'project_name': f'project-{project_id}',
+        'project_prompts': prompts,
+        'project_custom_json_settings': None,
+    }
+
+@pytest.fixture
+def fake_supabase(monkeypatch):
+    fake = FakeSupabase({'1': project_row('1', 'v1')}, latency=0.05).start()
+    db = supabase_service.SupabaseDB(fake.url, settings.supabase_key, timeout=5, max_concurrency=4)
+    monkeypatch.setattr(supabase_service, 'supabase_db', db)
+    cache = AsyncTTLCache('project_settings', ttl=60, stale_ttl=300, cache_if=bool)
+    monkeypatch.setattr(supabase_service, 'project_settings_cache', cache)
+    yield fake
+    fake.stop()
+
+def test_concurrent_misses_share_one_query(fake_supabase):
+    async def scenario():
+        return await asyncio.gather(*(supabase_service.get_project_settings(1) for _ in range(50)))
+
+    results = asyncio.run(scenario())
+
+    assert len(fake_supabase.requests) == 1
+    assert all(result['project_prompts'] == 'v1' for result in results)
+    stats = supabase_service.project_settings_cache.stats()
+    assert stats['misses'] == 50
+    assert stats['coalesced'] == 49
+    assert stats['loads'] == 1
+
+def test_fresh_entries_are_served_from_cache(fake_supabase):
+    async def scenario():
+        await supabase_service.get_project_settings(1)
+        # project_id 以字串傳入（例如來自 query string）也命中同一筆
+        return await supabase_service.get_project_settings('1')
+
+    assert asyncio.run(scenario())['project_prompts'] == 'v1'
+    assert len(fake_supabase.requests) == 1
+    assert supabase_service.project_settings_cache.stats()['hits'] == 1
+
+def test_stale_entry_is_returned_while_revalidating(fake_supabase):
+    cache = supabase_service.project_settings_cache
+    cache.ttl = 0.01
+
+    async def scenario():
+        await supabase_service.get_project_settings(1)
+        fake_supabase.rows['1'] = project_row('1', 'v2')
+        await asyncio.sleep(0.02)
+        stale = await supabase_service.get_project_settings(1)
+        # 等待背景重新載入完成
+        await asyncio.sleep(0.2)
+        cache.ttl = 60
+        fresh = await supabase_service.get_project_settings(1)
+        return stale, fresh
+
+    stale, fresh = asyncio.run(scenario())
+
+    assert stale['project_prompts'] == 'v1'
+    assert fresh['project_prompts'] == 'v2'
+    assert len(fake_supabase.requests) == 2
+    assert cache.stats()['stale_hits'] == 1
+
+def test_missing_project_is_not_cached(fake_supabase):
+    async def scenario():
+        first = await supabase_service.get_project_settings(2)
+        second = await supabase_service.get_project_settings(2)
+        return first, second
+
+    assert asyncio.run(scenario()) == ({}, {})
+    assert len(fake_supabase.requests) == 2
+
+def test_invalidate_forces_reload(fake_supabase):
+    async def scenario():
+        await supabase_service.get_project_settings(1)
+        fake_supabase.rows['1'] = project_row('1', 'v2')
+        supabase_service.invalidate_project_settings(1)
+        return await supabase_service.get_project_settings(1)
+
+    assert asyncio.run(scenario())['project_prompts'] == 'v2'
+    assert len(fake_supabase.requests) == 2
+
+def test_invalidate_during_load_does_not_restore_stale_settings(fake_supabase):
+    cache = supabase_service.project_settings_cache
+
+    async def scenario():
+        # 查詢進行中（latency 50 ms）時清除快取，舊的查詢結果不寫回
+        loading = asyncio.ensure_future(supabase_service.get_project_settings(1))
+        await asyncio.sleep(0.01)
+        supabase_service.invalidate_project_settings(1)
+        old = await loading
+        assert cache.peek('1') is None
+        fake_supabase.rows['1'] = project_row('1', 'v2')
+        return old, await supabase_service.get_project_settings(1)
+
+    old, new = asyncio.run(scenario())
+
+    assert old['project_prompts'] == 'v1'
+    assert new['project_prompts'] == 'v2'
+    assert len(fake_supabase.requests) == 2
+
+def test_entries_past_stale_ttl_are_evicted():
+    cache = AsyncTTLCache('test', ttl=0.01, stale_ttl=0.01)
+
+    async def load():
+        return 'value'
+
+    async def scenario():
+        for key in range(10):
+            await cache.get(key, load)
+        await asyncio.sleep(0.03)
+        await cache.get('new', load)
+
+    asyncio.run(scenario())
+
+    assert cache.stats()['entries'] == 1
+    assert cache.stats()['evicted'] == 10
+
+def test_batch_lookup_uses_one_query_for_uncached_projects(fake_supabase):
+    fake_supabase.rows['2'] = project_row('2', 'p2')
+    fake_supabase.rows['3'] = project_row('3', 'p3')
+
+    async def scenario():
+        await supabase_service.get_project_settings(1)
+        return await supabase_service.get_projects_settings([1, 2, '3', 2, 4])
+
+    results = asyncio.run(scenario())
+
+    assert results['1']['project_prompts'] == 'v1'
+    assert results['2']['project_prompts'] == 'p2'
+    assert results['3']['project_prompts'] == 'p3'
+    assert results['4'] == {}
+    # 1 已在快取中，2、3、4 以單一查詢取得
+    assert len(fake_supabase.requests) == 2
+    assert fake_supabase.requests[1][1]['id'] == ['in.(2,3,4)']
+
+def test_lookup_does_not_block_event_loop(fake_supabase):
+    fake_supabase.latency = 0.2
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker_task = asyncio.ensure_future(ticker())
+        await supabase_service.get_project_settings(1)
+        ticker_task.cancel()
+        return ticks
+
+    # 查詢期間 event loop 仍持續運作
+    assert asyncio.run(scenario()) >= 10
@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.handlers.call_handler import finish_call_session
+from app.services import realtime_prewarm as prewarm_module
+from app.services.realtime_prewarm import RealtimePrewarmPool
+from app.services.session_store import CallRecord, InMemorySessionBackend, SessionStore
+
+class FakeRealtimeSocket:
+    def __init__(self):
+        self.open = True
+        self.session_updates = 0
+
+    async def close(self):
+        await asyncio.sleep(0)
+        self.open = False
+
+class FakeOpenAI:
+    """模擬 openai_service：connect 需要 latency 秒，fail 為 True 時連線失敗"""
+
+    def __init__(self, latency: float = 0.0, fail: bool = False):
+        self.latency = latency
+        self.fail = fail
+        self.sockets = []
+
+    async def connect_realtime(self):
+        await asyncio.sleep(self.latency)
+        if self.fail:
+            raise ConnectionError("handshake failed")
+        socket = FakeRealtimeSocket()
+        self.sockets.append(socket)
+        return socket
+
+    async def send_session_update(self, websocket_openai, call_record):
+        websocket_openai.session_updates += 1
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    fake = FakeOpenAI()
+    monkeypatch.setattr(prewarm_module.openai_service, "connect_realtime", fake.connect_realtime)
+    monkeypatch.setattr(prewarm_module.openai_service, "send_session_update", fake.send_session_update)
+    monkeypatch.setattr(settings, "realtime_prewarm_enabled", True)
+    monkeypatch.setattr(settings, "realtime_prewarm_ttl_sec", 60)
+    return fake
+
+def test_adopt_returns_ready_and_still_connecting_sessions(fake_openai):
+    async def scenario():
+        pool = RealtimePrewarmPool()
+        pool.prewarm("ready", None)
+        await asyncio.sleep(0.01)
+        ready = await pool.adopt("ready")
+
+        fake_openai.latency = 0.05
+        pool.prewarm("connecting", None)
+        # 同一個 session_id 只建立一次
+        pool.prewarm("connecting", None)
+        connecting = await pool.adopt("connecting")
+        return pool, ready, connecting
+
+    pool, ready, connecting = asyncio.run(scenario())
+
+    assert ready is fake_openai.sockets[0] and ready.open and ready.session_updates == 1
+    assert connecting is fake_openai.sockets[1] and connecting.open
+    assert len(fake_openai.sockets) == 2
+    assert len(pool) == 0
+
+def test_connect_failure_or_unknown_session_adopts_none(fake_openai):
+    fake_openai.fail = True
+
+    async def scenario():
+        pool = RealtimePrewarmPool()
+        pool.prewarm("failing", None)
+        return await pool.adopt("failing"), await pool.adopt("unknown")
+
+    assert asyncio.run(scenario()) == (None, None)
+
+def test_unadopted_session_is_closed_after_ttl(fake_openai, monkeypatch):
+    monkeypatch.setattr(settings, "realtime_prewarm_ttl_sec", 0.02)
+
+    async def scenario():
+        pool = RealtimePrewarmPool()
+        pool.prewarm("expired", None)
+        await asyncio.sleep(0.05)
+        return pool, await pool.adopt("expired")
+
+    pool, adopted = asyncio.run(scenario())
+
+    assert adopted is None
+    assert len(pool) == 0
+    assert not fake_openai.sockets[0].open
+
+def test_close_all_closes_ready_and_cancels_connecting_sessions(fake_openai):
+    async def scenario():
+        pool = RealtimePrewarmPool()
+        pool.prewarm("ready", None)
+        await asyncio.sleep(0.01)
+        fake_openai.latency = 1
+        pool.prewarm("connecting", None)
+        await asyncio.sleep(0.01)
+        await pool.close_all()
+        return pool
+
+    pool = asyncio.run(scenario())
+
+    assert len(pool) == 0
+    assert len(fake_openai.sockets) == 1
+    assert not fake_openai.sockets[0].open
+
+def test_terminal_status_without_media_stream_releases_prewarmed_session(fake_openai, monkeypatch):
+    pool = RealtimePrewarmPool()
+    monkeypatch.setattr("app.handlers.call_handler.realtime_prewarm", pool)
+    previous = SessionStore.use_backend(InMemorySessionBackend(ttl_sec=7200))
+
+    async def scenario():
+        await SessionStore.set_session("session-1", "CA1", CallRecord(session_id="session-1"))
+        pool.prewarm("session-1", None)
+        await asyncio.sleep(0.01)
+        await finish_call_session("CA1", "no-answer")
+        await asyncio.sleep(0.01)
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        SessionStore.use_backend(previous)
+
+    assert len(pool) == 0
+    assert not fake_openai.sockets[0].open
@@ -0,0 +1,68 @@
+import asyncio
+
+from app.services.relay_queue import RelayQueue
+
+def drain(queue: RelayQueue) -> list:
+    async def scenario():
+        queue.close()
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        await queue.drain_to(send)
+        return sent
+
+    return asyncio.run(scenario())
+
+def test_overflow_drops_oldest_audio_and_keeps_control():
+    queue = RelayQueue("to_openai", max_audio=3)
+    queue.put_control("session.update")
+    for index in range(6):
+        queue.put_audio(f"audio-{index}")
+        if index == 2:
+            queue.put_control("commit")
+
+    assert queue.dropped_audio == 3
+    assert queue.depth == 5
+    assert drain(queue) == ["session.update", "commit", "audio-3", "audio-4", "audio-5"]
+
+def test_marks_are_dropped_with_their_audio():
+    queue = RelayQueue("to_twilio", max_audio=2)
+    for index in range(100):
+        queue.put_audio(f"audio-{index}")
+        queue.put_mark(f"mark-{index}")
+    queue.put_control("clear")
+
+    # Twilio 端卡住時佇列深度仍有上限，不會留下對應已丟棄音訊的 mark
+    assert queue.max_depth <= 2 * 2 + 1
+    assert queue.dropped_audio == 98
+    assert queue.dropped_marks == 98
+    assert drain(queue) == ["audio-98", "mark-98", "audio-99", "mark-99", "clear"]
+
+def test_mark_after_sent_audio_is_kept():
+    async def scenario():
+        queue = RelayQueue("to_twilio", max_audio=1)
+        queue.put_audio("audio-0")
+        assert await queue.get() == "audio-0"
+        # 音訊已送出，mark 不屬於任何佇列中的音訊，溢位時不丟棄
+        queue.put_mark("mark-0")
+        queue.put_audio("audio-1")
+        queue.put_mark("mark-1")
+        queue.put_audio("audio-2")
+        return queue
+
+    queue = asyncio.run(scenario())
+    assert queue.dropped_marks == 1
+    assert drain(queue) == ["mark-0", "audio-2"]
+
+def test_clear_audio_keeps_only_control_messages():
+    queue = RelayQueue("to_twilio", max_audio=2)
+    for index in range(4):
+        queue.put_audio(f"audio-{index}")
+        queue.put_mark(f"mark-{index}")
+    queue.put_control("truncate")
+
+    assert queue.clear_audio() == 4
+    queue.put_audio("audio-4")
+    assert drain(queue) == ["truncate", "audio-4"]
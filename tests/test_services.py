@@ -0,0 +1,121 @@
+import asyncio
+
+import httpx
+
+from app.config import settings
+from app.constants import TWILIO_VOICE_SETTINGS
+from app.dependencies.services import ServiceContainer
+from app.main import app
+from app.services import supabase_service, twilio_service
+from app.services.session_store import InMemorySessionBackend, SessionStore
+from app.services.settings_service import Settings_Init_FromDB
+from app.utils import http_client
+
+class FakeCallService:
+    def __init__(self):
+        self.incoming = []
+
+    async def handle_incoming_call(self, host: str, session_id: str) -> str:
+        self.incoming.append(host)
+        return "<Response/>"
+
+def test_routes_use_the_call_service_from_the_container():
+    services = ServiceContainer()
+    # 未指定 client 時使用 process 共用的 client
+    assert services.call_service.twilio_rest is twilio_service.twilio_rest
+    assert services.call_service.supabase_db is supabase_service.supabase_db
+    assert services.call_service.http_clients is http_client.http_clients
+
+    fake = FakeCallService()
+    services.call_service = fake
+    app.state.services = services
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://example.test") as client:
+            for _ in range(2):
+                response = await client.post("/incoming-call")
+                assert response.text == "<Response/>"
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        del app.state.services
+    assert fake.incoming == ["example.test", "example.test"]
+
+class FakeCall:
+    sid = "CA" + "7" * 32
+
+class FakeTwilioRest:
+    def __init__(self):
+        self.created = []
+        self.updated = []
+
+    async def create_call(self, **kwargs):
+        self.created.append(kwargs)
+        return FakeCall()
+
+    async def update_call(self, call_sid: str, **kwargs):
+        self.updated.append((call_sid, kwargs))
+
+class FakeQuery:
+    def __init__(self, table: str):
+        self.table = table
+        self.filters = []
+
+    def select(self, columns: str):
+        return self
+
+    def eq(self, column: str, value):
+        self.filters.append((column, value))
+        return self
+
+class FakeResponse:
+    def __init__(self, data: list):
+        self.data = data
+
+class FakeSupabaseDB:
+    def __init__(self, rows: dict):
+        self.rows = rows
+        self.queries = []
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(name)
+
+    async def execute(self, query: FakeQuery) -> FakeResponse:
+        self.queries.append((query.table, query.filters))
+        _, project_id = query.filters[0]
+        row = self.rows.get(str(project_id))
+        return FakeResponse([row] if row else [])
+
+def test_container_injects_its_clients_into_call_service(monkeypatch):
+    monkeypatch.setattr(settings, "realtime_prewarm_enabled", False)
+    monkeypatch.setattr(Settings_Init_FromDB, "twilio_voice_settings", TWILIO_VOICE_SETTINGS)
+    previous = SessionStore.use_backend(InMemorySessionBackend(ttl_sec=60))
+    twilio = FakeTwilioRest()
+    supabase = FakeSupabaseDB({"9023": {"id": 9023, "project_name": "demo", "project_prompts": "demo prompts"}})
+    services = ServiceContainer(twilio_rest=twilio, supabase_db=supabase)
+    app.state.services = services
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://example.test") as client:
+            response = await client.post("/makecall", json={"to_number": "0912345678", "project_id": "9023"})
+            assert response.status_code == 200, response.text
+            session_id = response.json()["temp_session_id"]
+        _, record = await SessionStore.get_session(session_id)
+        await services.call_service.close_call_by_agent(FakeCall.sid)
+        return record
+
+    try:
+        record = asyncio.run(scenario())
+    finally:
+        del app.state.services
+        SessionStore.use_backend(previous)
+        supabase_service.invalidate_project_settings("9023")
+        services.drain.call_finished(FakeCall.sid)
+
+    assert [call["to"] for call in twilio.created] == ["+886912345678"]
+    assert twilio.updated == [(FakeCall.sid, {"status": "completed"})]
+    assert supabase.queries == [("ProjectConfigs", [("id", "9023")])]
+    assert record.project_prompts == "demo prompts"
@@ -0,0 +1,224 @@
+import asyncio
+import time
+
+from app.services.session_store import GET_SESSION_SCRIPT, CallRecord, InMemorySessionBackend, RedisSessionBackend, SessionStore
+
+class FakeRedisServer:
+    """in-process 的 Redis：key -> (value, 過期時間)，記錄每次往返的指令"""
+
+    def __init__(self):
+        self.data = {}
+        self.round_trips = []
+
+    def execute(self, commands):
+        self.round_trips.append([command[0] for command in commands])
+        return [getattr(self, f"_{name}")(*args, **kwargs) for name, args, kwargs in commands]
+
+    def _get(self, key):
+        value, expires_at = self.data.get(key, (None, None))
+        if expires_at is not None and expires_at <= time.monotonic():
+            self.data.pop(key)
+            return None
+        return value
+
+    def _set(self, key, value, ex=None):
+        self.data[key] = (value, time.monotonic() + ex if ex else None)
+        return True
+
+    def _expire(self, key, seconds, lt=False):
+        if self._get(key) is None:
+            return 0
+        expires_at = time.monotonic() + seconds
+        if lt and self.data[key][1] is not None and self.data[key][1] <= expires_at:
+            return 0
+        self.data[key] = (self.data[key][0], expires_at)
+        return 1
+
+    def _delete(self, *keys):
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    def _evalsha(self, script, keys, args):
+        # 只支援 GET_SESSION_SCRIPT：以 Python 重現 script 的行為
+        assert script == GET_SESSION_SCRIPT
+        call_sid = self._get(keys[0])
+        return [call_sid, self._get(args[0] + call_sid)] if call_sid else []
+
+    def _multi(self):
+        return "OK"
+
+    def _exec(self):
+        return "OK"
+
+class FakePipeline:
+    def __init__(self, server, transaction):
+        self.server = server
+        self.transaction = transaction
+        self.commands = []
+
+    def get(self, key):
+        self.commands.append(("get", (key,), {}))
+
+    def set(self, key, value, ex=None):
+        self.commands.append(("set", (key, value), {"ex": ex}))
+
+    async def execute(self):
+        commands = self.commands
+        if self.transaction:
+            commands = [("multi", (), {})] + commands + [("exec", (), {})]
+        results = self.server.execute(commands)
+        return results[1:-1] if self.transaction else results
+
+class FakeScript:
+    def __init__(self, server, script):
+        self.server = server
+        self.script = script
+
+    async def __call__(self, keys=(), args=()):
+        return self.server.execute([("evalsha", (self.script, list(keys), list(args)), {})])[0]
+
+class FakeRedisClient:
+    """redis.asyncio.Redis 的子集合；多個 client 可共用同一個 server，模擬多個 worker"""
+
+    def __init__(self, server):
+        self.server = server
+        self.closed = False
+
+    async def get(self, key):
+        return self.server.execute([("get", (key,), {})])[0]
+
+    async def set(self, key, value, ex=None):
+        return self.server.execute([("set", (key, value), {"ex": ex})])[0]
+
+    async def expire(self, key, seconds, lt=False):
+        return self.server.execute([("expire", (key, seconds), {"lt": lt})])[0]
+
+    async def delete(self, *keys):
+        return self.server.execute([("delete", keys, {})])[0]
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self.server, transaction)
+
+    def register_script(self, script):
+        return FakeScript(self.server, script)
+
+    async def aclose(self):
+        self.closed = True
+
+def test_redis_backend_shares_sessions_across_workers_with_ttl():
+    server = FakeRedisServer()
+    makecall_worker = RedisSessionBackend("redis://fake", ttl_sec=60, key_prefix="t:", client=FakeRedisClient(server))
+    stream_worker = RedisSessionBackend("redis://fake", ttl_sec=60, key_prefix="t:", client=FakeRedisClient(server))
+
+    async def scenario():
+        record = CallRecord(to_number="+886900000000", project_id="p1", session_id="session-1")
+        await makecall_worker.set_session("session-1", "CA1", record)
+        await makecall_worker.set_call_record("CA2", CallRecord(project_id="p2"))
+
+        # session 對應與通話記錄在同一個 MULTI/EXEC 內寫入，且都帶 TTL
+        assert server.round_trips[0] == ["multi", "set", "set", "exec"]
+        assert all(expires_at is not None for _, expires_at in server.data.values())
+
+        call_sid = await stream_worker.get_call_sid("session-1")
+        assert call_sid == "CA1"
+        assert (await stream_worker.get_call_record(call_sid)).to_dict() == record.to_dict()
+
+        # /twiml 與 /media-stream：session 對應與通話記錄在一次往返內取得
+        call_sid, session_record = await stream_worker.get_session("session-1")
+        assert call_sid == "CA1" and session_record.to_dict() == record.to_dict()
+        assert await stream_worker.get_session("session-unknown") == (None, None)
+        await makecall_worker.set_call_sid("session-2", "CA-no-record")
+        server.round_trips.clear()
+        assert await stream_worker.get_session("session-2") == ("CA-no-record", None)
+        assert server.round_trips == [["evalsha"]]
+
+        # EXPIRE ... LT 只會縮短 TTL
+        assert await stream_worker.expire_call_record("CA2", 5) is True
+        assert await stream_worker.expire_call_record("CA2", 30) is False
+        assert await stream_worker.expire_call_record("CA3", 5) is False
+
+        assert await stream_worker.clear_call_record("CA1") is True
+        assert await makecall_worker.clear_call_record("CA1") is False
+        assert await makecall_worker.get_call_record("CA1") is None
+
+        await stream_worker.close()
+        assert stream_worker.client.closed
+
+    asyncio.run(scenario())
+
+def test_redis_backend_keys_expire():
+    server = FakeRedisServer()
+    backend = RedisSessionBackend("redis://fake", ttl_sec=0.05, client=FakeRedisClient(server))
+
+    async def scenario():
+        await backend.set_call_sid("session-1", "CA1")
+        assert await backend.get_call_sid("session-1") == "CA1"
+        await asyncio.sleep(0.06)
+        assert await backend.get_call_sid("session-1") is None
+
+    asyncio.run(scenario())
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def test_in_memory_backend_expires_and_caps_entries():
+    clock = FakeClock()
+    backend = InMemorySessionBackend(ttl_sec=60, max_entries=4, clock=clock)
+
+    async def scenario():
+        await backend.set_session("session-1", "CA1", CallRecord(project_id="p1"))
+        clock.now += 30
+        await backend.set_session("session-2", "CA2", CallRecord(project_id="p2"))
+        # 重新寫入會延長 TTL，舊的 heap 項目被略過
+        await backend.set_call_record("CA1", CallRecord(project_id="p1"))
+
+        clock.now += 31
+        assert await backend.get_call_sid("session-1") is None
+        assert (await backend.get_call_record("CA1")).project_id == "p1"
+        assert await backend.get_call_sid("session-2") == "CA2"
+        assert backend.expired == 1
+
+        # 超過上限時先移除最快到期的 key
+        await backend.set_session("session-3", "CA3", CallRecord(project_id="p3"))
+        await backend.set_call_sid("session-4", "CA4")
+        assert backend.evicted == 2
+        assert await backend.get_call_sid("session-2") is None
+        assert await backend.get_call_record("CA2") is None
+
+        clock.now += 3600
+        stats = backend.stats()
+        assert stats["sessions"] == 0 and stats["call_records"] == 0
+        assert stats["expired"] == 5 and stats["evicted"] == 2 and stats["index_size"] == 0
+
+    asyncio.run(scenario())
+
+def test_finish_call_clears_session_and_keeps_completed_record_for_extraction():
+    clock = FakeClock()
+    backend = InMemorySessionBackend(ttl_sec=7200, clock=clock)
+    previous = SessionStore.use_backend(backend)
+
+    async def scenario():
+        await SessionStore.set_session("session-1", "CA1", CallRecord(project_id="p1", session_id="session-1"))
+        await SessionStore.set_session("session-2", "CA2", CallRecord(project_id="p2", session_id="session-2"))
+
+        await SessionStore.finish_call("CA1", keep_record_sec=600)
+        await SessionStore.finish_call("CA2")
+        await SessionStore.finish_call("CA-unknown")
+
+        assert await SessionStore.get_session("session-1") == (None, None)
+        assert (await SessionStore.get_call_record("CA1")).project_id == "p1"
+        assert await SessionStore.get_call_sid("session-2") is None
+        assert await SessionStore.get_call_record("CA2") is None
+
+        clock.now += 601
+        assert await SessionStore.get_call_record("CA1") is None
+        assert SessionStore.stats()["expired"] == 1
+
+    try:
+        asyncio.run(scenario())
+        assert backend.temp_session_map == {} and backend.call_records == {}
+    finally:
+        SessionStore.use_backend(previous)
@@ -0,0 +1,94 @@
+import json
+from datetime import date, datetime
+
+import pytest
+
+from app.services import session_update_cache as cache_module
+from app.services.session_update_cache import SessionUpdateCache
+from app.services.settings_service import Settings_Init_FromDB
+
+class FakeToday:
+    """固定 session_update_cache 看到的當地日期與 [今日日期] 提示"""
+
+    def __init__(self, today: date):
+        self.today = today
+
+    def now(self, tz=None):
+        return tz.localize(datetime.combine(self.today, datetime.min.time()).replace(hour=12))
+
+    def time(self) -> float:
+        return self.now(cache_module.TIMEZONE).timestamp()
+
+    def formatted(self) -> str:
+        return self.today.isoformat()
+
+@pytest.fixture
+def today(monkeypatch):
+    fake = FakeToday(date(2026, 10, 17))
+    fake_datetime = type("FakeDatetime", (datetime,), {"now": staticmethod(fake.now)})
+    monkeypatch.setattr(cache_module, "datetime", fake_datetime)
+    monkeypatch.setattr(cache_module, "get_today_formatted_string", fake.formatted)
+    monkeypatch.setattr(cache_module, "time", fake)
+    monkeypatch.setattr(Settings_Init_FromDB, "SESSION_UPDATE_CONFIG", {"type": "session.update", "session": {"voice": "alloy"}})
+    monkeypatch.setattr(Settings_Init_FromDB, "OpenAI_Init_SYSTEM_MESSAGE", "system")
+    monkeypatch.setattr(Settings_Init_FromDB, "settings_version", 1)
+    return fake
+
+def instructions(payload: str) -> str:
+    return json.loads(payload)["session"]["instructions"]
+
+def test_same_project_prompts_and_day_hit_the_cache(today):
+    cache = SessionUpdateCache()
+    first = cache.get("p1", "prompts")
+    assert cache.get("p1", "prompts") is first
+    assert instructions(first) == "system\nprompts\n[今日日期]\n2026-10-17"
+    # 共用的設定不會被修改
+    assert "instructions" not in Settings_Init_FromDB.SESSION_UPDATE_CONFIG["session"]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_settings_version_bump_rebuilds(today, monkeypatch):
+    cache = SessionUpdateCache()
+    first = cache.get("p1", "prompts")
+    monkeypatch.setattr(Settings_Init_FromDB, "OpenAI_Init_SYSTEM_MESSAGE", "new system")
+    monkeypatch.setattr(Settings_Init_FromDB, "settings_version", 2)
+
+    rebuilt = cache.get("p1", "prompts")
+
+    assert rebuilt != first
+    assert instructions(rebuilt).startswith("new system\n")
+    assert cache.misses == 2
+
+def test_date_rollover_rebuilds(today):
+    cache = SessionUpdateCache()
+    cache.get("p1", "prompts")
+    assert cache.get("p1", "prompts") and cache.hits == 1
+    # 跨過午夜
+    today.today = date(2026, 10, 18)
+
+    rebuilt = cache.get("p1", "prompts")
+
+    assert instructions(rebuilt).endswith("[今日日期]\n2026-10-18")
+    assert cache.misses == 2
+
+def test_prompt_change_rebuilds_only_that_project(today):
+    cache = SessionUpdateCache()
+    other = cache.get("p2", "other prompts")
+    cache.get("p1", "prompts")
+
+    changed = cache.get("p1", "edited prompts")
+
+    assert "edited prompts" in instructions(changed)
+    assert cache.get("p2", "other prompts") is other
+    assert (cache.hits, cache.misses) == (1, 3)
+
+def test_least_recently_used_project_is_evicted(today):
+    cache = SessionUpdateCache(max_entries=2)
+    cache.get("p1", "a")
+    cache.get("p2", "b")
+    cache.get("p1", "a")
+    cache.get("p3", "c")
+
+    cache.get("p1", "a")
+    cache.get("p2", "b")
+
+    assert (cache.hits, cache.misses) == (2, 4)
@@ -0,0 +1,70 @@
+import asyncio
+import json
+
+from app.services.transcript import AGENT, USER, Transcript
+from app.services.websocket_service import WebSocketManager
+
+class FakeTwilioPeer:
+    async def send_text(self, message: str) -> None:
+        pass
+
+class FakeOpenAIPeer:
+    open = True
+    closed = False
+
+    async def send(self, message: str) -> None:
+        pass
+
+def test_render_is_lazy_and_supports_offset():
+    transcript = Transcript()
+    assert not transcript and transcript.render() == ""
+
+    transcript.add(USER, "你好", "item_u1", started_at=1.0, ended_at=2.0)
+    transcript.add(AGENT, "您好，請問有什麼需要？", "item_a1", started_at=2.5, ended_at=4.0)
+    transcript.add(USER, "我想預約", "item_u2", started_at=5.0, ended_at=6.0)
+
+    assert len(transcript) == 3
+    assert transcript.render() == "User: 你好\nAgent: 您好，請問有什麼需要？\nUser: 我想預約\n"
+    assert transcript.render(start=2) == "User: 我想預約\n"
+
+def test_latency_stats_match_turns_by_time_not_arrival_order():
+    transcript = Transcript()
+    transcript.add(USER, "a", started_at=0.0, ended_at=1.0)
+    # agent 回應先完成，使用者的轉錄較晚才送達
+    transcript.add(AGENT, "b", started_at=1.4, ended_at=3.0)
+    transcript.add(AGENT, "d", started_at=4.2, ended_at=5.0)
+    transcript.add(USER, "c", started_at=3.5, ended_at=4.0)
+
+    stats = transcript.latency_stats()
+
+    assert stats["turns"] == 4 and stats["user_turns"] == 2 and stats["agent_turns"] == 2
+    assert stats["response_latency_ms"]["count"] == 2
+    assert abs(stats["response_latency_ms"]["max"] - 400) < 1
+    assert abs(stats["agent_turn_duration_ms"]["max"] - 1600) < 1
+
+def test_manager_records_turns_with_item_ids():
+    async def scenario():
+        manager = WebSocketManager()
+        twilio, openai = FakeTwilioPeer(), FakeOpenAIPeer()
+        await manager.handle_twilio_message(json.dumps({
+            "event": "start", "start": {"streamSid": "MZ1", "callSid": "CA1"}
+        }), openai)
+        for event in (
+            {"type": "input_audio_buffer.speech_started", "item_id": "item_u1"},
+            {"type": "input_audio_buffer.speech_stopped", "item_id": "item_u1"},
+            {"type": "conversation.item.input_audio_transcription.completed", "item_id": "item_u1", "transcript": " 你好 "},
+            {"type": "response.audio.delta", "item_id": "item_a1", "delta": "/w=="},
+            {"type": "response.done", "response": {"output": [
+                {"id": "item_a1", "content": [{"type": "audio", "transcript": "您好"}]}
+            ]}},
+        ):
+            await manager.handle_openai_message(json.dumps(event), twilio, openai)
+        return manager
+
+    manager = asyncio.run(scenario())
+
+    assert manager.transcript.render() == "User: 你好\nAgent: 您好\n"
+    assert [turn.item_id for turn in manager.transcript.turns] == ["item_u1", "item_a1"]
+    user, agent = manager.transcript.turns
+    assert user.started_at <= user.ended_at <= agent.started_at <= agent.ended_at
+    assert manager.relay_stats()["transcript"]["response_latency_ms"]["count"] == 1
@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from app.config import settings
+from app.services import twilio_service
+from app.services.twilio_service import AsyncTwilioRest
+
+class FakeTwilioAPI:
+    """本機的假 Twilio API，記錄收到的請求與同時處理中的最大請求數"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._runner = None
+        self.url = None
+
+    async def _handle(self, request):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            form = dict(await request.post()) if request.method == 'POST' else {}
+            self.requests.append((request.method, request.path, form))
+            await asyncio.sleep(self.latency)
+            sid = request.match_info.get('sid', 'CA' + str(len(self.requests)).zfill(32))
+            return web.json_response({"sid": sid, "status": form.get('Status', 'queued')})
+        finally:
+            self.in_flight -= 1
+
+    async def start(self) -> "FakeTwilioAPI":
+        app = web.Application()
+        app.router.add_post('/2010-04-01/Accounts/{account_sid}/Calls.json', self._handle)
+        app.router.add_route('*', '/2010-04-01/Accounts/{account_sid}/Calls/{sid}.json', self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        self.url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+        return self
+
+    async def stop(self) -> None:
+        await self._runner.cleanup()
+
+@pytest.fixture
+def rest_factory(monkeypatch):
+    def create(fake: FakeTwilioAPI, max_concurrency: int = 20) -> AsyncTwilioRest:
+        twilio_rest = AsyncTwilioRest(
+            settings.twilio_account_sid,
+            settings.twilio_auth_token,
+            timeout=5,
+            max_concurrency=max_concurrency,
+            api_base_url=fake.url
+        )
+        monkeypatch.setattr(twilio_service, 'twilio_rest', twilio_rest)
+        return twilio_rest
+    return create
+
+def test_make_call_and_close_use_async_client(rest_factory):
+    voice_settings = {'CALL_TIMEOUT_SEC': 20}
+
+    async def scenario():
+        fake = await FakeTwilioAPI().start()
+        twilio_rest = rest_factory(fake)
+        try:
+            call_sid = await twilio_service.make_call('+886900000000', 'https://example.com/twiml', 'example.com', voice_settings)
+            await twilio_service.close_call_by_agent(call_sid)
+            fetched = await twilio_rest.fetch_call(call_sid)
+        finally:
+            await twilio_rest.close()
+            await fake.stop()
+        return fake, call_sid, fetched
+
+    fake, call_sid, fetched = asyncio.run(scenario())
+
+    assert call_sid.startswith('CA')
+    (create_method, _, create_form), (update_method, update_path, update_form), (fetch_method, _, _) = fake.requests
+    assert create_method == 'POST'
+    assert create_form['To'] == '+886900000000'
+    assert create_form['StatusCallback'] == 'https://example.com/call-status'
+    assert create_form['Timeout'] == '20'
+    assert update_path.endswith(f'/Calls/{call_sid}.json')
+    assert update_form == {'Status': 'completed'}
+    assert fetch_method == 'GET'
+    assert fetched.sid == call_sid
+
+def test_requests_are_bounded_by_max_concurrency(rest_factory):
+    async def scenario():
+        fake = await FakeTwilioAPI(latency=0.05).start()
+        twilio_rest = rest_factory(fake, max_concurrency=3)
+        try:
+            await asyncio.gather(*(twilio_rest.fetch_call(f'CA{i:032d}') for i in range(12)))
+        finally:
+            await twilio_rest.close()
+            await fake.stop()
+        return fake
+
+    fake = asyncio.run(scenario())
+
+    assert len(fake.requests) == 12
+    assert fake.max_in_flight == 3
@@ -0,0 +1,135 @@
+import asyncio
+import json
+import time
+
+from app.services.webhook_outbox import WebhookOutbox
+
+class FakeReceiver:
+    """模擬 webhook 接收端：依序回傳 responses 中的狀態碼（用完後回 200），可設定延遲"""
+
+    def __init__(self, responses=(), latency: float = 0.0):
+        self.responses = list(responses)
+        self.latency = latency
+        self.received = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def deliver(self, url: str, body: str, idempotency_key: str) -> int:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+            self.received.append((url, json.loads(body), idempotency_key))
+            status = self.responses.pop(0) if self.responses else 200
+            if isinstance(status, Exception):
+                raise status
+            return status
+        finally:
+            self.in_flight -= 1
+
+def make_outbox(path, receiver: FakeReceiver, workers: int = 2) -> WebhookOutbox:
+    return WebhookOutbox(str(path), receiver.deliver, workers=workers, max_attempts=3, backoff_base=0.01, backoff_max=0.05)
+
+async def wait_until(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        await asyncio.sleep(0.005)
+
+def test_enqueue_returns_before_slow_delivery(tmp_path):
+    receiver = FakeReceiver(latency=0.3)
+
+    async def scenario():
+        outbox = make_outbox(tmp_path / 'outbox.db', receiver)
+        await outbox.start()
+        started = time.monotonic()
+        await outbox.enqueue('http://hooks/call-result', {"call_id": "CA1"}, 'call-result:CA1')
+        enqueue_elapsed = time.monotonic() - started
+        await wait_until(lambda: outbox.delivered == 1)
+        stats = await outbox.stats()
+        await outbox.close()
+        return enqueue_elapsed, stats
+
+    enqueue_elapsed, stats = asyncio.run(scenario())
+
+    assert enqueue_elapsed < 0.1
+    assert receiver.received == [('http://hooks/call-result', {"call_id": "CA1"}, 'call-result:CA1')]
+    assert stats['depth'] == 0
+    assert stats['delivery_latency_sec']['count'] >= 1
+
+def test_failures_are_retried_with_backoff_and_permanent_errors_are_dead(tmp_path):
+    receiver = FakeReceiver(responses=[503, ConnectionError("refused"), 200, 400])
+
+    async def scenario():
+        outbox = make_outbox(tmp_path / 'outbox.db', receiver, workers=1)
+        await outbox.enqueue('http://hooks/a', {"n": 1}, 'a')
+        await wait_until(lambda: outbox.delivered == 1)
+        await outbox.enqueue('http://hooks/b', {"n": 2}, 'b')
+        await wait_until(lambda: outbox.dead == 1)
+        stats = await outbox.stats()
+        await outbox.close()
+        return stats
+
+    stats = asyncio.run(scenario())
+
+    assert [key for _, _, key in receiver.received] == ['a', 'a', 'a', 'b']
+    assert stats['failed_attempts'] == 3
+    assert stats['depth'] == 0
+
+def test_duplicate_idempotency_key_is_delivered_once(tmp_path):
+    receiver = FakeReceiver()
+
+    async def scenario():
+        outbox = make_outbox(tmp_path / 'outbox.db', receiver)
+        first = await outbox.enqueue('http://hooks/status', {"status": "completed"}, 'call-status:CA1:completed')
+        second = await outbox.enqueue('http://hooks/status', {"status": "completed"}, 'call-status:CA1:completed')
+        await wait_until(lambda: outbox.delivered == 1)
+        await asyncio.sleep(0.05)
+        await outbox.close()
+        return first, second
+
+    assert asyncio.run(scenario()) == (True, False)
+    assert len(receiver.received) == 1
+
+def test_delivery_concurrency_is_bounded_by_workers(tmp_path):
+    receiver = FakeReceiver(latency=0.02)
+
+    async def scenario():
+        outbox = make_outbox(tmp_path / 'outbox.db', receiver, workers=3)
+        await outbox.start()
+        for i in range(15):
+            await outbox.enqueue('http://hooks/status', {"n": i}, f'key-{i}')
+        await wait_until(lambda: outbox.delivered == 15)
+        await outbox.close()
+
+    asyncio.run(scenario())
+
+    assert len(receiver.received) == 15
+    assert receiver.max_in_flight == 3
+
+def test_pending_webhooks_survive_restart(tmp_path):
+    path = tmp_path / 'outbox.db'
+    down = FakeReceiver(responses=[503] * 3)
+
+    async def enqueue_while_receiver_is_down():
+        outbox = WebhookOutbox(str(path), down.deliver, workers=1, max_attempts=10, backoff_base=10, backoff_max=10)
+        await outbox.enqueue('http://hooks/call-result', {"call_id": "CA1"}, 'call-result:CA1')
+        await wait_until(lambda: outbox.failed_attempts == 1)
+        await outbox.close()
+
+    asyncio.run(enqueue_while_receiver_is_down())
+
+    up = FakeReceiver()
+
+    async def restart():
+        outbox = WebhookOutbox(str(path), up.deliver, workers=1, max_attempts=10, backoff_base=0.01, backoff_max=0.01)
+        await outbox.start()
+        pending_at_start = outbox.depth
+        # 上一次排定的重試時間還沒到，手動提前
+        await outbox._run(outbox._conn.execute, "UPDATE webhook_outbox SET next_attempt_at = 0")
+        await wait_until(lambda: outbox.delivered == 1)
+        await outbox.close()
+        return pending_at_start
+
+    assert asyncio.run(restart()) == 1
+    assert [key for _, _, key in up.received] == ['call-result:CA1']
@@ -1,9 +1,9 @@
-from twilio.rest import Client
 from twilio.twiml.voice_response import VoiceResponse
 import os
 from dotenv import load_dotenv
 from constants import TWILIO_CALLBACK_EVENT_STATUS, TWILIO_VOICE_SETTINGS
 from log_utils import setup_logger
+from app.services.twilio_service import AsyncTwilioRest
 
 # Load environment variables
 load_dotenv()
@@ -16,10 +16,15 @@ account_sid = os.getenv('TWILIO_ACCOUNT_SID')
 auth_token = os.getenv('TWILIO_AUTH_TOKEN')
 twilio_phone_number = os.getenv('TWILIO_PHONE_NUMBER')
 
-# Create Twilio client
-client = Client(account_sid, auth_token)
+# Create Twilio client (async, pooled connections)
+client = AsyncTwilioRest(
+    account_sid,
+    auth_token,
+    timeout=float(os.getenv('TWILIO_TIMEOUT_SEC', '10')),
+    max_concurrency=int(os.getenv('TWILIO_MAX_CONCURRENCY', '20'))
+)
 
-def make_call(to_number: str, twiml_url: str, hostname: str, twilio_voice_settings: dict = None):
+async def make_call(to_number: str, twiml_url: str, hostname: str, twilio_voice_settings: dict = None):
     """
     Initiate a call using Twilio API
     :param to_number: The phone number to call
@@ -37,7 +42,7 @@ def make_call(to_number: str, twiml_url: str, hostname: str, twilio_voice_settin
     logger.info(f"Twilio Voice Settings: {twilio_voice_settings}")
 
     try:
-        call = client.calls.create(
+        call = await client.create_call(
             to=to_number,
             from_=twilio_phone_number,
             url=twiml_url,
@@ -75,7 +80,7 @@ async def close_call_by_agent(session_id: str) -> None:
         session_id: session ID (Call SID)
     """
     try:
-        call = client.calls(session_id).update(status='completed')
+        call = await client.update_call(session_id, status='completed')
         logger.info(f"Closed call {session_id}")
         return call.sid
     except Exception as e: